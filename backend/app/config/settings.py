@@ -1,4 +1,5 @@
 import os
+from typing import Dict
 from pydantic_settings import BaseSettings # type: ignore
 
 class Settings(BaseSettings):
@@ -8,9 +9,125 @@ class Settings(BaseSettings):
     # Elasticsearch settings - use environment variable with fallback
     ELASTICSEARCH_URL: str = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
     ELASTICSEARCH_INDEX_CANDIDATES: str = "candidates"
+    # Previous physical versions (candidates_v{n}) kept after an alias swap, for rollback
+    ELASTICSEARCH_INDEX_VERSIONS_TO_KEEP: int = 1
+    ELASTICSEARCH_USERNAME: str = os.getenv("ELASTICSEARCH_USERNAME", "tgs5qdc5ph")
+    ELASTICSEARCH_PASSWORD: str = os.getenv("ELASTICSEARCH_PASSWORD", "j5qcp06xrl")
+    # Connection pool shared by every request of a worker process
+    ELASTICSEARCH_POOL_MAXSIZE: int = 10
+    ELASTICSEARCH_TIMEOUT: int = 30
+    # Cluster health is probed in the background and cached for this many seconds
+    ELASTICSEARCH_HEALTH_TTL: int = 30
+    ELASTICSEARCH_HEALTH_TIMEOUT: int = 5
+    # Bulk indexing: documents and bytes per _bulk request, concurrent requests, retry rounds
+    BULK_INDEX_CHUNK_SIZE: int = 500
+    BULK_INDEX_MAX_CHUNK_BYTES: int = 5 * 1024 * 1024
+    BULK_INDEX_MAX_IN_FLIGHT: int = 4
+    BULK_INDEX_MAX_RETRIES: int = 3
+    # Index outbox: polling interval (seconds), rows per batch, attempts before a row is parked
+    INDEX_OUTBOX_POLL_INTERVAL: float = 1.0
+    INDEX_OUTBOX_BATCH_SIZE: int = 500
+    INDEX_OUTBOX_MAX_ATTEMPTS: int = 5
+    # Delta reindex of candidates modified since the last watermark (interval in seconds, 0 = disabled)
+    DELTA_SYNC_INTERVAL: int = 3600
+    DELTA_SYNC_OVERLAP_SECONDS: int = 300
+    DELTA_SYNC_CHUNK_SIZE: int = 1000
+    # Job → candidates search result cache (LRU + TTL); shared mode stores results in Postgres
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_MAX_ENTRIES: int = 512
+    SEARCH_CACHE_TTL: int = 300
+    SEARCH_CACHE_SHARED: bool = False
+    SEARCH_CACHE_GENERATION_POLL: float = 1.0
+    # Recherche de candidats (/api/candidates/search)
+    CANDIDATE_SEARCH_MAX_PAGE_SIZE: int = 100
+    CANDIDATE_SEARCH_TRACK_TOTAL_HITS: int = 10000
+    CANDIDATE_SEARCH_FACET_SIZE: int = 20
+    # Health subsystem: dependencies polled in the background, probes served from memory
+    HEALTH_CHECK_INTERVAL: float = 15.0
+    HEALTH_CHECK_TIMEOUT: float = 3.0
+    # A snapshot older than this makes /api/ready fail (the poller itself is stuck)
+    HEALTH_MAX_AGE: float = 60.0
+    HEALTH_OPENAI_HOST: str = "api.openai.com"
+    # In-process BM25 index used for job matching when OpenSearch is down
+    # ("opensearch" = fallback only, "local" = always use it, e.g. dev / benchmarks)
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "opensearch")
+    LOCAL_SEARCH_ENABLED: bool = True
+    # Pending local writes are applied every poll; other workers' writes every sync interval
+    LOCAL_SEARCH_POLL_INTERVAL: float = 2.0
+    LOCAL_SEARCH_SYNC_INTERVAL: float = 60.0
+    # Semantic retrieval: local hashed embeddings in a memory-mapped matrix, fused with
+    # the lexical results by reciprocal rank (RRF)
+    SEMANTIC_SEARCH_ENABLED: bool = True
+    VECTOR_INDEX_PATH: str = os.getenv("VECTOR_INDEX_PATH", "data/vector_index")
+    VECTOR_INDEX_DIM: int = 384
+    SEMANTIC_SEARCH_CANDIDATES: int = 50
+    RRF_K: int = 60
+    # Search / indexing calls slower than this (ms) are kept in the slow-query ring buffer
+    SLOW_QUERY_THRESHOLD_MS: float = 500.0
+    SLOW_QUERY_LOG_SIZE: int = 200
+    # Bearer token accepted by /api/metrics for Prometheus scrapes (empty: admin login only)
+    METRICS_SCRAPE_TOKEN: str = ""
+    # CV parse cache (sha256 of the file + prompt/model version → extracted text and parsed JSON)
+    PARSE_CACHE_ENABLED: bool = True
+    # CV upload pipeline: extraction processes (0 = min(4, CPUs)), concurrent LLM calls,
+    # candidates created per transaction
+    CV_EXTRACTION_WORKERS: int = 0
+    CV_PARSE_LLM_CONCURRENCY: int = 8
+    CV_INGEST_COMMIT_BATCH: int = 25
+    # Background upload batches: progress flush / DB polling interval, stream and worker
+    # heartbeat, how long a batch waits for its candidates to be indexed, and after how
+    # long without a worker heartbeat a batch is considered lost (seconds)
+    CV_BATCH_FLUSH_INTERVAL: float = 1.0
+    CV_BATCH_HEARTBEAT_INTERVAL: float = 15.0
+    CV_BATCH_INDEX_WAIT: float = 60.0
+    CV_BATCH_STALE_AFTER: float = 120.0
+    # Multipart uploads: per-file cap, files per request, in-memory spooling (per file and
+    # for all the files of a request) before parts go to temporary files
+    CV_UPLOAD_MAX_FILE_SIZE: int = 20 * 1024 * 1024
+    CV_UPLOAD_MAX_FILES: int = 200
+    CV_UPLOAD_SPOOL_SIZE: int = 1024 * 1024
+    CV_UPLOAD_MEMORY_BUDGET: int = 8 * 1024 * 1024
+    CV_UPLOAD_TMP_DIR: str = os.getenv("CV_UPLOAD_TMP_DIR", "")
+    # PDF text extraction: fast engine ("pdfium", "pymupdf" if installed, "pdfplumber"),
+    # fallback engine when the text looks incomplete (chars per page), page cap,
+    # pages per pool task for long documents, timeout per document (seconds)
+    CV_PDF_ENGINE: str = "pdfium"
+    CV_PDF_FALLBACK_ENGINE: str = "pdfplumber"
+    CV_PDF_MIN_CHARS_PER_PAGE: int = 40
+    CV_PDF_MAX_PAGES: int = 10
+    CV_PDF_PAGES_PER_TASK: int = 4
+    CV_PDF_EXTRACTION_TIMEOUT: float = 30.0
+    # PDF rendition of DOCX resumes (headless LibreOffice, on first view): concurrent
+    # converters (one warm profile each), timeout per file (seconds), soffice binary
+    # (default: found on PATH), profiles directory (default: system temp dir)
+    CV_DOCX_RENDER_WORKERS: int = 2
+    CV_DOCX_RENDER_TIMEOUT: float = 60.0
+    CV_DOCX_RENDER_BINARY: str = os.getenv("CV_DOCX_RENDER_BINARY", "")
+    CV_DOCX_RENDER_PROFILE_DIR: str = os.getenv("CV_DOCX_RENDER_PROFILE_DIR", "")
+    # CV text sent to the parsing LLM: input budget after condensation (tokens), bounds of
+    # the completion budget computed from it, context window of the parsing model
+    CV_PARSE_INPUT_TOKEN_BUDGET: int = 6000
+    CV_PARSE_MIN_OUTPUT_TOKENS: int = 1000
+    CV_PARSE_MAX_OUTPUT_TOKENS: int = 4000
+    CV_PARSE_CONTEXT_WINDOW: int = 16385
+    # Skip the LLM for uploads whose email already belongs to a candidate (unless forced)
+    CV_PRE_PARSE_DUPLICATE_CHECK: bool = True
     
     # OpenAI settings
     OPENAI_API_KEY: str = ""
+    # LLM gateway (every OpenAI call): HTTP connections per process, request timeout and
+    # retries with exponential backoff (seconds), then per model: concurrent calls,
+    # requests and tokens per minute (0 = unlimited). LLM_MODEL_LIMITS overrides them per
+    # model, e.g. {"gpt-4o": {"concurrency": 4, "rpm": 500, "tpm": 30000}}
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_REQUEST_TIMEOUT: float = 60.0
+    LLM_MAX_RETRIES: int = 4
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 30.0
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_MODEL_LIMITS: Dict[str, Dict[str, float]] = {}
     
     class Config:
         env_file = ".env"
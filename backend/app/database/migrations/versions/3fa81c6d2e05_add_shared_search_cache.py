@@ -0,0 +1,48 @@
+"""Add the shared search cache and the index generation counter
+
+Revision ID: 3fa81c6d2e05
+Revises: 9e2c5f17b3a8
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3fa81c6d2e05'
+down_revision = '9e2c5f17b3a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables déjà créées par Base.metadata.create_all au démarrage : rien à faire
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('search_cache_entries'):
+        op.create_table(
+            'search_cache_entries',
+            sa.Column('key', sa.String(length=64), nullable=False),
+            sa.Column('job_id', sa.Integer(), nullable=True),
+            sa.Column('result_json', sa.Text(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('key')
+        )
+        op.create_index('idx_search_cache_job', 'search_cache_entries', ['job_id'])
+        op.create_index('idx_search_cache_expires', 'search_cache_entries', ['expires_at'])
+    if not inspector.has_table('search_index_generation'):
+        op.create_table(
+            'search_index_generation',
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('generation', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade():
+    op.drop_table('search_index_generation')
+    op.drop_index('idx_search_cache_expires', table_name='search_cache_entries')
+    op.drop_index('idx_search_cache_job', table_name='search_cache_entries')
+    op.drop_table('search_cache_entries')
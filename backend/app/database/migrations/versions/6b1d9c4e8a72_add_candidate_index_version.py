@@ -0,0 +1,26 @@
+"""Add the search document version counter to candidates
+
+Revision ID: 6b1d9c4e8a72
+Revises: 3fa81c6d2e05
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1d9c4e8a72'
+down_revision = '3fa81c6d2e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('candidates', sa.Column('index_version', sa.BigInteger(), server_default='0', nullable=False))
+    # Documents déjà indexés portent updated_at en millisecondes : le compteur repart au-dessus
+    op.execute("UPDATE candidates SET index_version = COALESCE(FLOOR(EXTRACT(EPOCH FROM updated_at) * 1000), 0)::bigint")
+
+
+def downgrade():
+    op.drop_column('candidates', 'index_version')
@@ -0,0 +1,43 @@
+"""Add updated_at change tracking to candidates and their child tables
+
+Revision ID: 7c41d2e9a8b3
+Revises: 5092cd16e06d
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41d2e9a8b3'
+down_revision = '5092cd16e06d'
+branch_labels = None
+depends_on = None
+
+
+TRACKED_TABLES = [
+    'candidates',
+    'resumes',
+    'phone_numbers',
+    'degrees',
+    'certifications',
+    'experiences',
+    'projects',
+    'awards_publications',
+    'suggested_jobs',
+]
+
+
+def upgrade():
+    for table in TRACKED_TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+        # Existing rows: last known change is their creation
+        op.execute(f"UPDATE {table} SET updated_at = COALESCE(created_at, now())")
+    op.create_index('ix_candidates_updated_at', 'candidates', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_candidates_updated_at', table_name='candidates')
+    for table in reversed(TRACKED_TABLES):
+        op.drop_column(table, 'updated_at')
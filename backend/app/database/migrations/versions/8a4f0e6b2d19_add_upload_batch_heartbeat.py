@@ -0,0 +1,24 @@
+"""Add the worker heartbeat of upload batches
+
+Revision ID: 8a4f0e6b2d19
+Revises: 6b1d9c4e8a72
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4f0e6b2d19'
+down_revision = '6b1d9c4e8a72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('upload_batches', sa.Column('heartbeat_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('upload_batches', 'heartbeat_at')
@@ -0,0 +1,35 @@
+"""Add the delta sync watermarks
+
+Revision ID: 9e2c5f17b3a8
+Revises: d4b7e2a90f31
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e2c5f17b3a8'
+down_revision = 'd4b7e2a90f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables déjà créées par Base.metadata.create_all au démarrage : rien à faire
+    if sa.inspect(op.get_bind()).has_table('sync_watermarks'):
+        return
+    op.create_table(
+        'sync_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_run_stats', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_watermarks')
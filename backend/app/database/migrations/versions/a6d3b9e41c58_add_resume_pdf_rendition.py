@@ -0,0 +1,29 @@
+"""Keep DOCX resumes as uploaded, with a lazily rendered PDF
+
+Revision ID: a6d3b9e41c58
+Revises: f3c8d27a9b14
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3b9e41c58'
+down_revision = 'f3c8d27a9b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('resumes', sa.Column('file_type', sa.String(length=255), nullable=True))
+    op.add_column('resumes', sa.Column('pdf_file', sa.LargeBinary(), nullable=True))
+    # Les PDF ne sont plus produits à l'upload
+    op.drop_column('parse_cache_entries', 'pdf_data')
+
+
+def downgrade():
+    op.add_column('parse_cache_entries', sa.Column('pdf_data', sa.LargeBinary(), nullable=True))
+    op.drop_column('resumes', 'pdf_file')
+    op.drop_column('resumes', 'file_type')
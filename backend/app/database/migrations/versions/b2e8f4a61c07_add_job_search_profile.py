@@ -0,0 +1,26 @@
+"""Add precompiled search profile to jobs
+
+Revision ID: b2e8f4a61c07
+Revises: 7c41d2e9a8b3
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8f4a61c07'
+down_revision = '7c41d2e9a8b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by scripts/build_job_search_profiles.py, then on every job save
+    op.add_column('jobs', sa.Column('search_profile', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column('jobs', 'search_profile')
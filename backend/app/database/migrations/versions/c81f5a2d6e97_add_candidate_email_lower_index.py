@@ -0,0 +1,24 @@
+"""Index candidates on lower(email) for the duplicate checks
+
+Revision ID: c81f5a2d6e97
+Revises: a6d3b9e41c58
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f5a2d6e97'
+down_revision = 'a6d3b9e41c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_candidates_email_lower', 'candidates', [sa.text('lower(email)')])
+
+
+def downgrade():
+    op.drop_index('idx_candidates_email_lower', table_name='candidates')
@@ -0,0 +1,41 @@
+"""Add the search index outbox
+
+Revision ID: d4b7e2a90f31
+Revises: c81f5a2d6e97
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7e2a90f31'
+down_revision = 'c81f5a2d6e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables déjà créées par Base.metadata.create_all au démarrage : rien à faire
+    if sa.inspect(op.get_bind()).has_table('index_outbox'):
+        return
+    op.create_table(
+        'index_outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('candidate_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(length=10), nullable=False),
+        sa.Column('wait_for_refresh', sa.Boolean(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_index_outbox_candidate', 'index_outbox', ['candidate_id'])
+    op.create_index('idx_index_outbox_pending', 'index_outbox', ['attempts', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_index_outbox_pending', table_name='index_outbox')
+    op.drop_index('idx_index_outbox_candidate', table_name='index_outbox')
+    op.drop_table('index_outbox')
@@ -0,0 +1,37 @@
+"""Add content-addressed CV parse cache
+
+Revision ID: e5a19c3f7d20
+Revises: b2e8f4a61c07
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a19c3f7d20'
+down_revision = 'b2e8f4a61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'parse_cache_entries',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('prompt_version', sa.String(length=32), nullable=False),
+        sa.Column('model', sa.String(length=64), nullable=False),
+        sa.Column('file_type', sa.String(length=255), nullable=False),
+        sa.Column('extracted_text', sa.Text(), nullable=False),
+        sa.Column('pdf_data', sa.LargeBinary(), nullable=True),
+        sa.Column('parsed_json', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        # The primary key index serves both the exact lookup and the sha256-only text lookup
+        sa.PrimaryKeyConstraint('sha256', 'prompt_version', 'model')
+    )
+
+
+def downgrade():
+    op.drop_table('parse_cache_entries')
@@ -0,0 +1,57 @@
+"""Add background CV upload batches
+
+Revision ID: f3c8d27a9b14
+Revises: e5a19c3f7d20
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d27a9b14'
+down_revision = 'e5a19c3f7d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_batches',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=True),
+        sa.Column('total_files', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'idempotency_key', name='uix_upload_batch_idempotency')
+    )
+    op.create_index('idx_upload_batches_user', 'upload_batches', ['user_id', 'created_at'])
+
+    op.create_table(
+        'upload_batch_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('batch_id', sa.String(length=32), nullable=False),
+        sa.Column('file_index', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('file_type', sa.String(length=255), nullable=True),
+        sa.Column('parse_cache', sa.String(length=20), nullable=True),
+        sa.Column('candidate_id', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['batch_id'], ['upload_batches.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('batch_id', 'file_index', name='uix_upload_batch_file')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_batch_files')
+    op.drop_index('idx_upload_batches_user', table_name='upload_batches')
+    op.drop_table('upload_batches')
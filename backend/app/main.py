@@ -7,7 +7,7 @@ import logging
 import time
 import traceback
 import asyncio
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from app.config.settings import settings  # Add this import
 
@@ -101,12 +101,31 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application...")
     
+    # Dependencies are polled in the background; probes read the last snapshot
+    asyncio.create_task(health_monitor.start())
+    
     # Create admin user on startup
     create_admin_user()
     
     # Initialize Elasticsearch and create index if needed
     await ensure_elasticsearch_ready()
     
+    # Upload batches left unfinished by a crashed or killed worker
+    try:
+        await asyncio.to_thread(upload_batch_manager.interrupt_stale_batches)
+    except Exception as e:
+        logger.error(f"❌ Could not check stale upload batches: {str(e)}")
+    
+    # Ship committed candidate changes from the outbox to OpenSearch
+    asyncio.create_task(outbox_indexer.start())
+    
+    # Periodic repair of the index from candidates.updated_at
+    asyncio.create_task(delta_sync_scheduler.start_auto_sync())
+    
+    # In-process matching index, used while OpenSearch is unreachable
+    if settings.LOCAL_SEARCH_ENABLED or settings.SEARCH_BACKEND == "local":
+        asyncio.create_task(local_search_updater.start())
+    
     # 🚀 NEW: Start Zoho auto-sync if integration is available
     if ZOHO_INTEGRATION_AVAILABLE:
         logger.info("🔄 Starting Zoho CRM auto-synchronization...")
@@ -114,12 +133,22 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Zoho integration not available - skipping auto-sync")
     
+    health_monitor.mark_started()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
     # Stop auto-sync on shutdown
     zoho_scheduler.stop_auto_sync()
+    outbox_indexer.stop()
+    delta_sync_scheduler.stop_auto_sync()
+    health_monitor.stop()
+    local_search_updater.stop()
+    upload_batch_manager.stop()
+    docx_renderer.stop()
+    shutdown_extraction_pool()
+    await llm_gateway.aclose()
 
 # Function to create admin user
 def create_admin_user():
@@ -160,29 +189,33 @@ def create_admin_user():
         logger.error(f"Error importing modules for admin creation: {str(e)}")
 
 async def ensure_elasticsearch_ready():
-    """Ensure Elasticsearch is ready and create index if it doesn't exist."""
+    """Ensure Elasticsearch is ready and create the candidates alias if it doesn't exist."""
     max_retries = 5
     retry_delay = 2
     
     for attempt in range(max_retries):
         try:
             from app.services.elasticsearch_service import ElasticsearchService
+            from app.services.opensearch_client import get_cluster_health_monitor
             
-            # Use the URL from settings instead of hardcoded localhost
+            # Probe now so each retry sees the real cluster state, then reuse the shared client
+            health = get_cluster_health_monitor(settings.ELASTICSEARCH_URL).refresh(request_timeout=10)
+            if not health['available']:
+                raise ConnectionError(health['error'])
             es_service = ElasticsearchService(host=settings.ELASTICSEARCH_URL)
             
-            # Check if index exists
-            if not es_service.es.indices.exists(index=es_service.index_name):
+            # Only create the alias (and its first version) when missing, never drop data
+            current_index = es_service.current_index()
+            if current_index is None:
                 logger.info(f"Index {es_service.index_name} doesn't exist. Creating...")
                 if es_service.create_index():
                     logger.info(f"Index {es_service.index_name} created successfully")
                 else:
                     logger.error(f"Failed to create index {es_service.index_name}")
             else:
-                logger.info(f"Index {es_service.index_name} already exists")
+                logger.info(f"Index {es_service.index_name} already exists ({current_index})")
             
             # Check cluster health
-            health = es_service.es.cluster.health(request_timeout=10)
             logger.info(f"Elasticsearch cluster health: {health['status']}")
             
             if health['status'] in ['yellow', 'green']:
@@ -226,8 +259,16 @@ async def add_process_time_header(request: Request, call_next):
 # Import dependencies after CORS is configured
 from app.database.postgresql import get_db, engine, Base
 from app.models.user import User, UserActivity
-from app.utils.auth import authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.utils.auth import authenticate_user, create_access_token, get_metrics_reader, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.routes import users , candidate ,dashboards,job
+from app.services.index_outbox import outbox_indexer
+from app.services.delta_sync import delta_sync_scheduler
+from app.services.health_monitor import health_monitor
+from app.services.local_search import local_search_updater
+from app.services.cv_ingestion import shutdown_extraction_pool
+from app.services.upload_batches import upload_batch_manager
+from app.services.docx_renderer import docx_renderer
+from app.services.llm_gateway import llm_gateway
 from app.models.user import UserActivity
 
 # Import Zoho CRM routes
@@ -400,35 +441,18 @@ async def init_admin():
 # Health check endpoint with Elasticsearch and Zoho status
 @app.get("/api/health", tags=["system"])
 async def health_check():
-    """Health check endpoint with Elasticsearch and Zoho CRM status"""
-    try:
-        from app.services.elasticsearch_service import ElasticsearchService
-        
-        # Use the URL from settings instead of hardcoded localhost
-        es_service = ElasticsearchService(host=settings.ELASTICSEARCH_URL)
-        health = es_service.es.cluster.health(request_timeout=5)
-        es_status = health['status']
-    except:
-        es_status = "unavailable"
-    
-    # Check Zoho CRM connection status
-    zoho_status = "not_configured"
-    if ZOHO_INTEGRATION_AVAILABLE:
-        try:
-            from app.services.zoho_auth_service import zoho_service
-            # Try to check if we have valid tokens
-            if zoho_service.access_token:
-                zoho_status = "connected"
-            else:
-                zoho_status = "not_authenticated"
-        except:
-            zoho_status = "error"
+    """Health of the API and its dependencies, from the background monitor (never probes)"""
+    snapshot = health_monitor.snapshot()
+    checks = snapshot["checks"]
     
     return {
-        "status": "healthy", 
+        "status": snapshot["status"],
         "version": "1.0.0",
-        "elasticsearch": es_status,
-        "zoho_crm": zoho_status,
+        "elasticsearch": checks.get("opensearch", {}).get("status", "unknown"),
+        "zoho_crm": checks.get("zoho", {}).get("status", "unknown"),
+        "checks": checks,
+        "age_seconds": snapshot["age_seconds"],
+        "check_interval_seconds": snapshot["interval_seconds"],
         "zoho_auto_sync": {
             "running": zoho_scheduler.is_running if ZOHO_INTEGRATION_AVAILABLE else False,
             "last_sync": zoho_scheduler.last_sync.isoformat() if zoho_scheduler.last_sync else None
@@ -438,6 +462,20 @@ async def health_check():
         }
     }
 
+# Readiness probe for the load balancer
+@app.get("/api/ready", tags=["system"])
+async def readiness_check():
+    """200 once startup is done and Postgres answered in a recent health round, else 503"""
+    readiness = health_monitor.readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+# Prometheus scrape endpoint for the search and LLM metrics
+@app.get("/api/metrics", tags=["system"], response_class=PlainTextResponse)
+async def prometheus_metrics(_: User = Depends(get_metrics_reader)):
+    """Search/indexing and LLM call metrics in Prometheus text format (admin or scrape token)"""
+    from app.services.search_metrics import search_metrics
+    return PlainTextResponse(search_metrics.prometheus() + llm_gateway.prometheus(), media_type="text/plain; version=0.0.4")
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
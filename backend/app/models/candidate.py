@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Text, Boolean, Table, ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, LargeBinary, Text, Boolean, Table, ARRAY, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
 from app.database.postgresql import Base
@@ -46,6 +46,16 @@ class Candidate(Base):
     gender = Column(String(50), nullable=True)
     marital_status = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped on every change of the candidate or of one of its child rows (delta reindex)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    # Incremented with every indexed change, under the row lock: external version of the
+    # search document, ordered like the commits (unlike now(), the transaction start time)
+    index_version = Column(BigInteger, nullable=False, server_default="0")
+
+    __table_args__ = (
+        # Recherche de doublons par email (insensible à la casse) avant et après le parsing
+        Index('idx_candidates_email_lower', func.lower(email)),
+    )
     
     # Relations
     phone_numbers = relationship("PhoneNumber", back_populates="candidate", cascade="all, delete-orphan")
@@ -73,9 +83,14 @@ class Resume(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     candidate_id = Column(Integer, ForeignKey("candidates.id", ondelete="CASCADE"), nullable=False)
-    resume_file = Column(LargeBinary, nullable=True)  # Stocke le PDF original
+    resume_file = Column(LargeBinary, nullable=True)  # Stocke le fichier original (PDF ou DOCX)
+    # MIME type of resume_file, NULL for resumes stored before DOCX files were kept as uploaded (PDF)
+    file_type = Column(String(255), nullable=True)
+    # PDF rendition of a non-PDF resume_file, rendered on first view (only loaded by the resume route)
+    pdf_file = deferred(Column(LargeBinary, nullable=True))
     resume_json = Column(Text, nullable=True)  # Stocke la version JSON complète
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="resumes")
 
@@ -92,6 +107,7 @@ class PhoneNumber(Base):
     phone_type = Column(String(20), nullable=True)  # mobile, landline
     location = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="phone_numbers")
 
@@ -124,6 +140,7 @@ class Degree(Base):
     date = Column(String(100), nullable=True)
     country_or_institute = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="degrees")
 
@@ -137,6 +154,7 @@ class Certification(Base):
     issuing_organization = Column(String(255), nullable=True)
     issue_date = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="certifications")
 
@@ -158,6 +176,7 @@ class Experience(Base):
     team_size = Column(String(50), nullable=True)
     relevance_score = Column(String(20), nullable=True)  # High, Medium, Low, Skip
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="experiences")
 
@@ -174,6 +193,7 @@ class Project(Base):
     period = Column(String(100), nullable=True)
     url = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="projects")
 
@@ -190,6 +210,7 @@ class AwardPublication(Base):
     publisher_issuer = Column(String(255), nullable=True)
     url = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="awards_publications")
 
@@ -201,5 +222,6 @@ class SuggestedJob(Base):
     candidate_id = Column(Integer, ForeignKey("candidates.id", ondelete="CASCADE"), nullable=False)
     job_title = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     candidate = relationship("Candidate", back_populates="suggested_jobs")
\ No newline at end of file
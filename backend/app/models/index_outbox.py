@@ -0,0 +1,21 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, Boolean, DateTime, Index
+from sqlalchemy.sql import func
+from app.database.postgresql import Base
+
+class IndexOutbox(Base):
+    """Pending search index changes, written in the same transaction as the candidate data."""
+    __tablename__ = "index_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    # Pas de clé étrangère : la ligne doit survivre à la suppression du candidat
+    candidate_id = Column(Integer, nullable=False)
+    operation = Column(String(10), nullable=False, default="upsert")  # upsert / delete
+    wait_for_refresh = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_index_outbox_candidate', 'candidate_id'),
+        Index('idx_index_outbox_pending', 'attempts', 'id'),
+    )
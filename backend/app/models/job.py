@@ -1,4 +1,5 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.postgresql import Base
@@ -14,6 +15,8 @@ class Job(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by_id = Column(Integer, ForeignKey("users.id"))
+    # Profil de recherche précompilé (termes, compétences, requête OpenSearch), recalculé à chaque sauvegarde
+    search_profile = Column(JSONB, nullable=True)
     
     # Relationship back to User
     #created_by = relationship("User")  # Supprimez back_populates="created_jobs"
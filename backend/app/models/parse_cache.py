@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy.sql import func
+from app.database.postgresql import Base
+
+class ParseCacheEntry(Base):
+    """Extracted text and parsed JSON of an uploaded CV file, keyed by its content."""
+    __tablename__ = "parse_cache_entries"
+
+    # sha256 of the uploaded bytes + version of the parsing prompt and model
+    sha256 = Column(String(64), primary_key=True)
+    prompt_version = Column(String(32), primary_key=True)
+    model = Column(String(64), primary_key=True)
+    file_type = Column(String(255), nullable=False)
+    extracted_text = Column(Text, nullable=False)
+    # NULL when the LLM call failed: the next upload only redoes that step
+    parsed_json = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
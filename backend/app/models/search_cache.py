@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+from app.database.postgresql import Base
+
+class SearchCacheEntry(Base):
+    """Search results shared between workers (SEARCH_CACHE_SHARED mode)."""
+    __tablename__ = "search_cache_entries"
+
+    key = Column(String(64), primary_key=True)  # sha256 of the query inputs + index generation
+    job_id = Column(Integer, nullable=True)
+    result_json = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_search_cache_job', 'job_id'),
+        Index('idx_search_cache_expires', 'expires_at'),
+    )
+
+class SearchIndexGeneration(Base):
+    """Counter bumped whenever the candidates index changes (SEARCH_CACHE_SHARED mode)."""
+    __tablename__ = "search_index_generation"
+
+    name = Column(String(100), primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
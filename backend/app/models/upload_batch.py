@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database.postgresql import Base
+
+class UploadBatch(Base):
+    """A CV upload processed in the background (POST /api/candidates/cv/batches)."""
+    __tablename__ = "upload_batches"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued / processing / completed / interrupted
+    # Client-supplied Idempotency-Key: a retried request returns the same batch
+    idempotency_key = Column(String(255), nullable=True)
+    total_files = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Refreshed by the worker running the batch; a stale heartbeat means the worker died
+    heartbeat_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    files = relationship("UploadBatchFile", back_populates="batch", cascade="all, delete-orphan",
+                         order_by="UploadBatchFile.file_index")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'idempotency_key', name='uix_upload_batch_idempotency'),
+        Index('idx_upload_batches_user', 'user_id', 'created_at'),
+    )
+
+class UploadBatchFile(Base):
+    """Progress of one file of an upload batch."""
+    __tablename__ = "upload_batch_files"
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String(32), ForeignKey("upload_batches.id", ondelete="CASCADE"), nullable=False)
+    file_index = Column(Integer, nullable=False)
+    # queued → extracted → parsed → persisted → indexed, or duplicate / failed
+    status = Column(String(20), nullable=False, default="queued")
+    sha256 = Column(String(64), nullable=True)
+    file_type = Column(String(255), nullable=True)
+    parse_cache = Column(String(20), nullable=True)
+    candidate_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    batch = relationship("UploadBatch", back_populates="files")
+
+    __table_args__ = (
+        UniqueConstraint('batch_id', 'file_index', name='uix_upload_batch_file'),
+    )
@@ -20,7 +20,8 @@ import aiohttp
 import asyncio
 from sqlalchemy.orm import Session
 
-from app.services.elasticsearch_service import ElasticsearchService
+from app.services.elasticsearch_service import ElasticsearchService, build_job_search_profile, current_search_profile
+from app.services.search_cache import search_result_cache
 from app.services.analysis_cache_service import AnalysisCacheService
 from app.config.settings import settings
 from app.utils.job_utils import extract_comprehensive_job_data, extract_job_fields  # Import the new utility function
@@ -104,7 +105,8 @@ def create_job_auto(
             description=job_data.description,
             job_type_etiquette=job_type_etiquette,  # Use the extracted job type
             created_by_id=current_user.id,
-            competence_phare=competence_phare
+            competence_phare=competence_phare,
+            search_profile=build_job_search_profile(title, competence_phare, comprehensive_data.get("technical_skills"))
         )
         
         # Add, commit and refresh to get an ID first
@@ -244,7 +246,8 @@ def create_job(
             job_type_etiquette=job_type_etiquette,
             created_by_id=current_user.id,
             # competence_phare can be NULL, so only define it if present
-            competence_phare=job_competence_phare
+            competence_phare=job_competence_phare,
+            search_profile=build_job_search_profile(job_title, job_competence_phare)
         )
         
         # Add, commit and refresh the object
@@ -362,6 +365,55 @@ def get_jobs(
         # Retourner une liste vide au lieu de lever une erreur 500
         return []
 
+@router.get("/search-cache/stats", response_model=Dict[str, Any])
+def get_search_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Statistiques du cache des suggestions de candidats (worker courant)"""
+    return search_result_cache.stats()
+
+@router.get("/{job_id}/search-profile", response_model=Dict[str, Any])
+def get_job_search_profile(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Profil de recherche précompilé de l'offre (requête exacte envoyée à OpenSearch).
+    Lecture seule : un profil absent ou périmé est calculé sans être enregistré
+    (`stored` à False) ; POST sur la même route le recompile et l'enregistre.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Offre d'emploi non trouvée")
+    
+    profile = current_search_profile(job.search_profile, job.title, job.competence_phare)
+    if profile is None:
+        profile = build_job_search_profile(
+            job.title, job.competence_phare, (job.search_profile or {}).get("skills")
+        )
+        return {**profile, "stored": False}
+    return {**profile, "stored": True}
+
+@router.post("/{job_id}/search-profile", response_model=Dict[str, Any])
+def rebuild_job_search_profile(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recompiler et enregistrer le profil de recherche de l'offre"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Offre d'emploi non trouvée")
+    
+    # Les compétences extraites à la création sont conservées
+    job.search_profile = build_job_search_profile(
+        job.title, job.competence_phare, (job.search_profile or {}).get("skills")
+    )
+    db.commit()
+    search_result_cache.invalidate_job(job_id)
+    return {**job.search_profile, "stored": True}
+
 @router.get("/{job_id}", response_model=Dict[str, Any])
 def get_job(
     job_id: int,
@@ -474,10 +526,18 @@ def update_job(
         update_data = job_data.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(job, key, value)
+        
+        # Recompiler le profil de recherche (les compétences extraites à la création sont conservées)
+        job.search_profile = build_job_search_profile(
+            job.title, job.competence_phare, (job.search_profile or {}).get("skills")
+        )
             
         db.commit()
         db.refresh(job)
         
+        # Les suggestions calculées pour l'ancienne version de l'offre ne sont plus valides
+        search_result_cache.invalidate_job(job_id)
+        
         # Construire manuellement le dictionnaire de réponse
         job_dict = {
             "id": job.id,
@@ -520,6 +580,7 @@ def delete_job(
             
         db.delete(job)
         db.commit()
+        search_result_cache.invalidate_job(job_id)
         
         return None
     except HTTPException:
@@ -642,7 +703,8 @@ def analyze_candidate_cv_with_job(job_id: int, candidate_ids: List[int], current
             "title": job.title,
             "description": job.description,
             "competence_phare": job.competence_phare if hasattr(job, "competence_phare") else None,
-            "job_type_etiquette": job.job_type_etiquette if hasattr(job, "job_type_etiquette") else "technique"
+            "job_type_etiquette": job.job_type_etiquette if hasattr(job, "job_type_etiquette") else "technique",
+            "search_profile": job.search_profile
         }
 
         # Initialiser le service Elasticsearch
@@ -684,24 +746,15 @@ def analyze_candidate_cv_with_job(job_id: int, candidate_ids: List[int], current
 
         # Si des candidats spécifiques sont demandés (pas mode auto), obtenir leurs scores Elasticsearch
         elif candidate_ids and candidate_ids[0] != "auto":
-            # Pour chaque candidat spécifié, obtenir son score Elasticsearch
+            # Une seule requête filtrée sur les IDs demandés pour obtenir leurs scores Elasticsearch
+            es_scores = es_service.score_candidates_for_job(job_id, candidate_ids, min_score=0.1, job_info=job_info)
+            
             for candidate_id in candidate_ids:
-                # Appel individuel pour obtenir le score pour ce candidat spécifique
-                es_single_result = es_service.filter_candidates_by_job(
-                    job_id, 
-                    min_score=0.1, 
-                    limit=1, 
-                    job_info={"title": job.title, "id": job.id}
-                )
-                
-                if es_single_result and es_single_result.get("suggested_candidates"):
-                    for c in es_single_result.get("suggested_candidates", []):
-                        if int(c["id"]) == int(candidate_id):
-                            es_candidates_map[int(candidate_id)] = {
-                                "es_score": c.get("es_score", 0.1),
-                                "match_reason": c.get("match_reason", "Correspondance par Elasticsearch")
-                            }
-                            break
+                if int(candidate_id) in es_scores:
+                    es_candidates_map[int(candidate_id)] = {
+                        "es_score": es_scores[int(candidate_id)]["es_score"],
+                        "match_reason": es_scores[int(candidate_id)]["match_reason"]
+                    }
                 
                 # Si le candidat n'est pas trouvé par Elasticsearch, lui donner un score minimum
                 if int(candidate_id) not in es_candidates_map:
@@ -900,6 +953,8 @@ async def suggest_candidates(
             job_info = {
                 'title': job.title,
                 'description': job.description,
+                'competence_phare': job.competence_phare,
+                'search_profile': job.search_profile,
                 'skills': []
             }
             
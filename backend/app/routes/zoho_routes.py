@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session
 from app.database.postgresql import get_db
 from app.models.job import Job
 from app.models.user import User
+from app.services.elasticsearch_service import build_job_search_profile
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -450,7 +451,8 @@ async def sync_jobs_from_crm(
                     description=deal.get('Job_Description', ''),
                     competence_phare=deal.get('Requirements', ''),
                     job_type_etiquette=deal.get('Job_Type', 'technique'),
-                    created_by_id=admin_user.id
+                    created_by_id=admin_user.id,
+                    search_profile=build_job_search_profile(title, deal.get('Requirements', ''))
                 )
                 
                 db.add(new_job)
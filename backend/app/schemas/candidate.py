@@ -233,6 +233,8 @@ class CandidateResponse(CandidateBase):
 # Schema for CV upload
 class CVUpload(BaseModel):
     fileContents: List[str]
+    # Parse files even when their email matches an existing candidate
+    force: bool = False
     
     class Config:
         from_attributes = True
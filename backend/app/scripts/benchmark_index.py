@@ -0,0 +1,131 @@
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+
+# Importations pour résoudre les relations
+from app.models.user import User  # Importez User AVANT Job
+from app.models.job import Job
+
+from app.database.postgresql import SessionLocal
+from app.services.elasticsearch_service import (
+    ElasticsearchService, JOB_MATCH_RESULT_SOURCE, JOB_MATCH_HIGHLIGHT, extract_domain_terms
+)
+
+# Configuration du logger
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Used when the database has no jobs
+DEFAULT_TITLES = [
+    ("Consultant en cybersécurité", "SIEM"),
+    ("Développeur Java", "Spring Boot"),
+    ("Data Engineer", "Python"),
+    ("Chef de projet IT", "Agile"),
+    ("Ingénieur réseau", "Cisco"),
+]
+
+def legacy_job_match_query(job_title, competence_phare):
+    """Job query of the v1 mapping (nested skills, text must_not), to benchmark old indices."""
+    _, domain_terms = extract_domain_terms(job_title)
+    _, competence_domain_terms = extract_domain_terms(competence_phare)
+    all_domain_terms = list(set(domain_terms + competence_domain_terms))
+    return {
+        "should": [
+            {"match_phrase": {"job_title": {"query": job_title, "boost": 3.0}}},
+            {"match": {"job_title": {"query": " ".join(all_domain_terms), "boost": 5.0, "minimum_should_match": "30%"}}},
+            {"nested": {"path": "experiences", "score_mode": "max", "boost": 2.0, "query": {
+                "match": {"experiences.job_title": {"query": " ".join(all_domain_terms), "boost": 4.0, "minimum_should_match": "30%"}}
+            }}},
+            {"multi_match": {"query": competence_phare, "fields": ["job_title^1.5", "hard_skills.name^2.0"],
+                             "boost": 2.5, "minimum_should_match": "30%"}},
+            {"nested": {"path": "hard_skills", "query": {"terms": {"hard_skills.name": all_domain_terms, "boost": 2.0}}}},
+        ],
+        "minimum_should_match": 1,
+        "must_not": [{"match": {"job_title": {"query": "stagiaire stage intern étudiant student alternance alternant Élève"}}}],
+    }
+
+def load_job_titles(limit):
+    db = SessionLocal()
+    try:
+        jobs = db.query(Job.title, Job.competence_phare).filter(Job.title.isnot(None)).limit(limit).all()
+        return [(job.title, job.competence_phare or "") for job in jobs] or DEFAULT_TITLES
+    except Exception as e:
+        logger.warning(f"Could not load jobs ({str(e)}), using default titles")
+        return DEFAULT_TITLES
+    finally:
+        db.close()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def benchmark_index(es_service, index, titles, runs, size):
+    es = es_service.es
+    stats = es.indices.stats(index=index, metric="docs,store,segments")["_all"]["primaries"]
+    mapping = next(iter(es.indices.get_mapping(index=index).values()))["mappings"]
+    lean = "is_intern" in mapping.get("properties", {})
+
+    took, wall, response_bytes = [], [], []
+    for _ in range(runs):
+        for job_title, competence_phare in titles:
+            if lean:
+                bool_query = es_service.build_job_match_query(job_title, competence_phare)[0]
+                body = {"query": {"bool": bool_query}, "size": size,
+                        "_source": JOB_MATCH_RESULT_SOURCE, "highlight": JOB_MATCH_HIGHLIGHT}
+            else:
+                bool_query = legacy_job_match_query(job_title, competence_phare)
+                body = {"query": {"bool": bool_query}, "size": size,
+                        "_source": ["id", "name", "email", "job_title", "hard_skills", "experiences"]}
+            start = time.perf_counter()
+            result = es.search(index=index, body=body, request_cache=False)
+            wall.append((time.perf_counter() - start) * 1000)
+            took.append(result["took"])
+            response_bytes.append(len(json.dumps(result)))
+
+    return {
+        "index": index,
+        "mapping": "v2 (lean)" if lean else "v1 (nested)",
+        "candidates": es.count(index=index)["count"],
+        "lucene_docs": stats["docs"]["count"],
+        "store_bytes": stats["store"]["size_in_bytes"],
+        "segments": stats["segments"]["count"],
+        "queries": len(took),
+        "took_p50_ms": percentile(took, 50),
+        "took_p95_ms": percentile(took, 95),
+        "wall_p50_ms": round(percentile(wall, 50), 2),
+        "wall_p95_ms": round(percentile(wall, 95), 2),
+        "avg_response_bytes": round(statistics.mean(response_bytes)),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare size and job query latency of candidate indices")
+    parser.add_argument("--index", action="append", help="physical index to measure (repeatable, default: every candidates_v*)")
+    parser.add_argument("--jobs", type=int, default=50, help="number of job titles used as queries")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    es_service = ElasticsearchService()
+    if not es_service.es_available:
+        logger.error("OpenSearch is not available")
+        sys.exit(1)
+
+    indices = args.index or [name for _, name in es_service.list_index_versions()]
+    titles = load_job_titles(args.jobs)
+    results = [benchmark_index(es_service, index, titles, args.runs, args.size) for index in indices]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"\n{result['index']} [{result['mapping']}]")
+            for key, value in result.items():
+                if key not in ("index", "mapping"):
+                    print(f"  {key:<20} {value}")
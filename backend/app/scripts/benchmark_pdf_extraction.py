@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from app.services.pdf_engines import (
+    PDF_ENGINES, extract_pdf_pages, extract_pdf_text_parallel, get_pdf_engine, needs_fallback, page_limit
+)
+
+# Configuration du logger
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def load_corpus(directory):
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names if name.lower().endswith(".pdf")
+    )
+    return paths
+
+def benchmark_engine(engine, paths, max_pages, repeat):
+    """Sequential extraction of the corpus with one engine, without fallback."""
+    pages = chars = failures = incomplete = 0
+    elapsed = 0.0
+    for path in paths:
+        try:
+            page_count = page_limit(engine.page_count(path), max_pages)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                text = extract_pdf_pages(path, 0, page_count, engine.name)
+                elapsed += time.perf_counter() - start
+            pages += page_count * repeat
+            chars += len(text)
+            incomplete += needs_fallback(text, page_count)
+        except Exception as e:
+            failures += 1
+            logger.warning(f"{engine.name} failed on {path}: {str(e)}")
+    return {
+        "engine": engine.name,
+        "files": len(paths),
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 1) if elapsed else None,
+        "chars": chars,
+        "failures": failures,
+        # Part des fichiers qui déclencheraient le moteur de secours
+        "fallback_rate": round(incomplete / len(paths), 3) if paths else 0.0,
+    }
+
+async def benchmark_parallel(paths, max_pages, workers):
+    """Configured engine + fallback, page ranges spread over a process pool (as cv_ingestion does)."""
+    engine = get_pdf_engine()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pages = failures = 0
+    try:
+        start = time.perf_counter()
+        for path in paths:
+            try:
+                page_count = engine.page_count(path)
+                await extract_pdf_text_parallel(path, executor, page_count, max_pages)
+                pages += page_limit(page_count, max_pages)
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Parallel extraction failed on {path}: {str(e)}")
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+    return {
+        "engine": f"parallel ({workers} workers)",
+        "files": len(paths),
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 1) if elapsed else None,
+        "failures": failures,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure PDF text extraction throughput (pages/sec) per engine")
+    parser.add_argument("corpus", help="directory of PDF files (searched recursively)")
+    parser.add_argument("--engine", action="append", choices=sorted(PDF_ENGINES),
+                        help="engine to measure (repeatable, default: every installed engine)")
+    parser.add_argument("--max-pages", type=int, default=0, help="pages per document (0: all pages)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="also measure parallel page-range extraction with this many processes")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    paths = load_corpus(args.corpus)
+    if not paths:
+        logger.error(f"No PDF found in {args.corpus}")
+        sys.exit(1)
+
+    engines = [PDF_ENGINES[name] for name in args.engine] if args.engine else list(PDF_ENGINES.values())
+    results = []
+    for engine in engines:
+        if not engine.available:
+            logger.warning(f"Engine {engine.name} is not installed, skipped")
+            continue
+        results.append(benchmark_engine(engine, paths, args.max_pages, args.repeat))
+    if args.workers > 0:
+        results.append(asyncio.run(benchmark_parallel(paths, args.max_pages, args.workers)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"\n{result['engine']}")
+            for key, value in result.items():
+                if key != "engine":
+                    print(f"  {key:<16} {value}")
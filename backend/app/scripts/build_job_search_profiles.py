@@ -0,0 +1,47 @@
+import argparse
+import logging
+import sys
+
+# Importations pour résoudre les relations
+from app.models.user import User  # Importez User AVANT Job
+from app.models.job import Job
+
+from app.database.postgresql import SessionLocal
+from app.services.elasticsearch_service import build_job_search_profile, current_search_profile
+
+# Configuration du logger
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def build_profiles(force=False):
+    """Compute and store the search profile of every job missing an up-to-date one"""
+    db = SessionLocal()
+    try:
+        built = 0
+        jobs = db.query(Job).order_by(Job.id).all()
+        for job in jobs:
+            if not force and current_search_profile(job.search_profile, job.title, job.competence_phare):
+                continue
+            job.search_profile = build_job_search_profile(
+                job.title, job.competence_phare, (job.search_profile or {}).get("skills")
+            )
+            built += 1
+        db.commit()
+        logger.info(f"Search profiles built for {built}/{len(jobs)} jobs")
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error building job search profiles: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompile the OpenSearch profile of every job")
+    parser.add_argument("--force", action="store_true", help="rebuild profiles that are already current")
+    args = parser.parse_args()
+    if not build_profiles(force=args.force):
+        sys.exit(1)
@@ -0,0 +1,65 @@
+import argparse
+import logging
+import sys
+import time
+
+# Importations pour résoudre les relations
+from app.models.user import User  # Importez User AVANT Candidate
+from app.models.candidate import Candidate
+from app.models.job import Job
+
+from app.database.postgresql import SessionLocal
+from app.services.elasticsearch_service import iter_candidate_chunks
+from app.services.vector_index import vector_index, embed_candidate, embed_job
+
+# Configuration du logger
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def build_vector_index(chunk_size=1000):
+    """Embed every candidate and rewrite the memory-mapped vector index"""
+    if not vector_index.available:
+        logger.error("Semantic search is disabled or numpy is not installed")
+        return False
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        vector_index.reset()
+        total = 0
+        for chunk in iter_candidate_chunks(db, chunk_size=chunk_size):
+            vector_index.upsert({candidate.id: embed_candidate(candidate) for candidate in chunk})
+            total += len(chunk)
+            logger.info(f"{total} candidates embedded")
+        logger.info(f"✅ Vector index built: {vector_index.stats()['vectors']} vectors "
+                    f"in {time.perf_counter() - start:.1f}s")
+        return True
+    except Exception as e:
+        logger.error(f"Error building vector index: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+def query_vector_index(text, k=10):
+    """Print the candidates closest to a job title (manual relevance check / benchmark)"""
+    start = time.perf_counter()
+    results = vector_index.search(embed_job(text, ""), k=k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for candidate_id, similarity in results:
+        print(f"{candidate_id}\t{similarity:.3f}")
+    print(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the semantic candidate index")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--query", help="only run a query for this job title")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.query:
+        query_vector_index(args.query, args.k)
+    elif not build_vector_index(args.chunk_size):
+        sys.exit(1)
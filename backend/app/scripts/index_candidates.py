@@ -1,17 +1,27 @@
+import argparse
+import json
 import logging
+import queue
 import sys
+import threading
 import time
-from datetime import datetime
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 import os
 import subprocess
 
+from sqlalchemy import func
+
 # Importations pour résoudre les relations
 from app.models.user import User  # Importez User AVANT Candidate
 from app.models.candidate import Candidate
 from app.models.job import Job
 
 from app.database.postgresql import SessionLocal
-from app.services.elasticsearch_service import ElasticsearchService
+from app.config.settings import settings
+from app.services.bulk_indexer import BulkIndexer
+from app.services.elasticsearch_service import ElasticsearchService, candidate_index_query, iter_candidate_chunks
+from app.services.delta_sync import run_delta_sync, advance_watermark
 
 # Configuration du logger
 logging.basicConfig(
@@ -87,9 +97,154 @@ def fix_elasticsearch_cluster():
         logger.error(f"Error connecting to Elasticsearch: {str(e)}")
         return None, "unknown"
 
-def index_all_candidates():
-    """Index all candidates from the database to Elasticsearch"""
-    logger.info("Starting indexing of all candidates...")
+def load_checkpoint(path):
+    """Read the checkpoint of a previous run, if any."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable checkpoint {path}: {str(e)}")
+        return None
+
+def save_checkpoint(path, state):
+    """Write the checkpoint atomically so an interrupted run never leaves a truncated file."""
+    state["updated_at"] = datetime.now().isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def document_chunks(es_service, target_index, chunk_size, after_id, since=None, ids=None):
+    """
+    Yield (last id, candidate count, bulk actions) per chunk. Meant to run in the reader
+    thread: it opens its own session (a Session cannot be shared between threads) and
+    builds the documents there, so only plain dicts leave the thread.
+    """
+    db = SessionLocal()
+    try:
+        for chunk in iter_candidate_chunks(db, chunk_size=chunk_size, after_id=after_id, since=since, ids=ids):
+            actions = list(es_service.candidate_actions(chunk, target_index))
+            yield chunk[-1].id, len(chunk), actions
+    finally:
+        db.close()
+
+def read_ahead(chunks, depth=2):
+    """
+    Run the chunk generator in a background thread so the next chunk is read from
+    Postgres and turned into documents while the current one is being sent. At most
+    `depth` chunks wait in memory. The generator must not share state with the caller.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                while not stop.is_set():
+                    try:
+                        buffer.put(chunk, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(done)
+        except Exception as e:
+            buffer.put(e)
+        finally:
+            # Ferme la session du lecteur dans son propre thread
+            chunks.close()
+
+    producer = threading.Thread(target=produce, name="candidate-reader", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+class ProgressReporter:
+    """Log throughput and ETA of a long indexing run."""
+
+    def __init__(self, total):
+        self.total = total
+        self.processed = 0
+        self.start = time.perf_counter()
+
+    def update(self, count, last_id):
+        self.processed += count
+        elapsed = time.perf_counter() - self.start
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed, 0)
+        eta = timedelta(seconds=int(remaining / rate)) if rate > 0 else "?"
+        percent = (self.processed / self.total * 100) if self.total else 100.0
+        logger.info(f"📊 {self.processed}/{self.total} candidates ({percent:.1f}%) - "
+                    f"{rate:.0f} docs/s - ETA {eta} - last id {last_id}")
+
+def parse_ids(value):
+    try:
+        return sorted({int(part) for part in value.split(",") if part.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("--ids expects a comma separated list of integers")
+
+def parse_since(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("--since expects an ISO date, e.g. 2024-05-01 or 2024-05-01T08:00:00")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Index candidates from PostgreSQL into OpenSearch")
+    parser.add_argument("--delta", action="store_true",
+                        help="reindex only candidates modified since the last successful watermark")
+    parser.add_argument("--since", type=parse_since, help="only candidates modified at or after this ISO date")
+    parser.add_argument("--ids", type=parse_ids, help="comma separated candidate ids to (re)index")
+    parser.add_argument("--resume", action="store_true", help="continue after the last id of the checkpoint file")
+    parser.add_argument("--checkpoint", default="index_candidates.checkpoint.json", help="checkpoint file path")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="candidates read from Postgres per chunk")
+    parser.add_argument("--workers", type=int, default=settings.BULK_INDEX_MAX_IN_FLIGHT,
+                        help="bulk requests in flight")
+    parser.add_argument("--bulk-size", type=int, default=settings.BULK_INDEX_CHUNK_SIZE,
+                        help="documents per bulk request")
+    parser.add_argument("--keep-index", action="store_true",
+                        help="full run into the live index instead of building a new version")
+    parser.add_argument("--force-swap", action="store_true",
+                        help="swap the alias even if the document count does not match Postgres")
+    return parser.parse_args(argv)
+
+def index_all_candidates(args=None):
+    """Stream candidates from the database into Elasticsearch"""
+    args = args or parse_args([])
+
+    if args.delta:
+        result = run_delta_sync(chunk_size=args.chunk_size)
+        return result is not None and not result["failed_ids"]
+
+    checkpoint = load_checkpoint(args.checkpoint) if args.resume else None
+    if checkpoint and checkpoint.get("completed"):
+        logger.info(f"Checkpoint {args.checkpoint} belongs to a finished run, starting a new one")
+        checkpoint = None
+    elif args.resume and checkpoint is None:
+        logger.warning(f"No checkpoint found at {args.checkpoint}, starting from the beginning")
+    if checkpoint:
+        # Un run repris garde les filtres du run initial sauf s'ils sont redonnés
+        if args.since is None and checkpoint.get("since"):
+            args.since = datetime.fromisoformat(checkpoint["since"])
+        if args.ids is None and checkpoint.get("ids"):
+            args.ids = checkpoint["ids"]
+
+    after_id = checkpoint.get("last_id", 0) if checkpoint else 0
+    full_reindex = not (args.since or args.ids or checkpoint)
+    mode = "ids" if args.ids else "since" if args.since else "full"
+    logger.info(f"Starting candidate indexing (mode={mode}, after id {after_id})...")
     
     # First try to fix the cluster
     es_service, health_status = fix_elasticsearch_cluster()
@@ -105,52 +260,93 @@ def index_all_candidates():
         logger.error("Then try running this script again.")
         return False
     
-    # Create or recreate the index
-    logger.info("Creating or recreating the index with proper settings...")
-    if not es_service.create_index():
+    # A full run builds a new version next to the live one; the alias is swapped at the end
+    target_index = checkpoint.get("target_index") if checkpoint else None
+    if full_reindex and not args.keep_index:
+        logger.info("Creating a new index version with proper settings...")
+        try:
+            target_index = es_service.create_versioned_index()
+        except Exception as e:
+            logger.error(f"Failed to create index: {str(e)}. Aborting.")
+            return False
+    elif not es_service.create_index():
         logger.error("Failed to create index. Aborting.")
         return False
     
+    state = {
+        "mode": mode,
+        "since": args.since.isoformat() if args.since else None,
+        "ids": args.ids,
+        "last_id": after_id,
+        "indexed": checkpoint.get("indexed", 0) if checkpoint else 0,
+        "failed_ids": checkpoint.get("failed_ids", []) if checkpoint else [],
+        "started_at": checkpoint.get("started_at") if checkpoint else datetime.now().isoformat(),
+        "target_index": target_index,
+        "db_started_at": checkpoint.get("db_started_at") if checkpoint else None,
+    }
+    
     # Create a database session
     db = SessionLocal()
     
     try:
-        # Load all candidates with their relationships
-        candidates = db.query(Candidate).all()
-        total_candidates = len(candidates)
-        logger.info(f"Found {total_candidates} candidates to index")
+        # Database time of the first run start: the delta watermark after a full run
+        if not state["db_started_at"]:
+            state["db_started_at"] = db.query(func.now()).scalar().isoformat()
         
-        # Index candidates individually which is more reliable
-        success_count = 0
-        failed_ids = []
+        total = (candidate_index_query(db, since=args.since, ids=args.ids)
+                 .filter(Candidate.id > after_id)
+                 .with_entities(func.count(Candidate.id))
+                 .scalar())
+        logger.info(f"Found {total} candidates to index")
         
-        for candidate in candidates:
-            try:
-                if es_service.index_candidate_from_model(candidate):
-                    success_count += 1
-                    if success_count % 5 == 0 or success_count == total_candidates:
-                        logger.info(f"Progress: {success_count}/{total_candidates} candidates indexed")
-                else:
-                    failed_ids.append(candidate.id)
-                    logger.warning(f"Failed to index candidate ID {candidate.id}")
-                
-                # Add a small delay between each request
-                time.sleep(1)
-            
-            except Exception as e:
-                failed_ids.append(candidate.id)
-                logger.error(f"Error indexing candidate ID {candidate.id}: {str(e)}")
-                time.sleep(1)
+        indexer = BulkIndexer(es_service.es, target_index or es_service.index_name,
+                              chunk_size=args.bulk_size, max_in_flight=args.workers)
+        progress = ProgressReporter(total)
+        chunks = document_chunks(es_service, target_index, args.chunk_size, after_id,
+                                 since=args.since, ids=args.ids)
+        
+        # Refresh stays off for the whole load of a new version (nothing searches it yet);
+        # runs into the live alias keep it. Each chunk is acknowledged before its checkpoint
+        with indexer.refresh_suspended() if target_index else nullcontext():
+            for last_id, count, actions in read_ahead(chunks):
+                stats = indexer.index(actions, disable_refresh=False)
+                state["last_id"] = last_id
+                state["indexed"] += stats["indexed"]
+                state["failed_ids"].extend(stats["failed_ids"])
+                save_checkpoint(args.checkpoint, state)
+                progress.update(count, state["last_id"])
+        
+        logger.info(f"Indexing completed: {state['indexed']} candidates indexed, {len(state['failed_ids'])} failed "
+                    f"({progress.processed} processed in {timedelta(seconds=int(time.perf_counter() - progress.start))})")
         
-        logger.info(f"Indexing completed: {success_count}/{total_candidates} candidates indexed successfully")
+        if state['failed_ids']:
+            logger.warning(f"Failed to index {len(state['failed_ids'])} candidates: {state['failed_ids']}")
+            logger.warning(f"Retry them with: --ids {','.join(str(i) for i in state['failed_ids'])}")
         
-        if failed_ids:
-            logger.warning(f"Failed to index {len(failed_ids)} candidates: {failed_ids}")
+        if target_index:
+            expected = db.query(func.count(Candidate.id)).scalar()
+            if not es_service.finalize_rebuild(target_index, expected, force=args.force_swap):
+                logger.error(f"Rebuild of {target_index} not published; fix the failures and run with --force-swap "
+                             f"or start a new rebuild")
+                return False
+        
+        if mode == "full" and not state["failed_ids"]:
+            advance_watermark(db, datetime.fromisoformat(state["db_started_at"]),
+                              {"full_reindex": True, "indexed": state["indexed"]})
+            db.commit()
+        
+        state["completed"] = True
+        save_checkpoint(args.checkpoint, state)
+    
+    except KeyboardInterrupt:
+        logger.warning(f"Interrupted after id {state['last_id']}; run again with --resume to continue")
+        return False
     
     except Exception as e:
         logger.error(f"Error during indexing process: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
+        logger.error(f"Last checkpointed id: {state['last_id']}; run again with --resume to continue")
         return False
     
     finally:
@@ -161,7 +357,7 @@ def index_all_candidates():
 
 if __name__ == "__main__":
     try:
-        success = index_all_candidates()
+        success = index_all_candidates(parse_args())
         if not success:
             sys.exit(1)
     except Exception as e:
@@ -0,0 +1,271 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from opensearchpy import TransportError, ConnectionError as OSConnectionError
+from app.config.settings import settings
+from app.services.search_metrics import search_metrics
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Bulk item / request statuses worth sending again (throttling, overloaded or restarting node)
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# A serialized bulk entry: (document id, NDJSON lines for that document)
+BulkEntry = Tuple[str, str]
+
+
+class BulkIndexer:
+    """
+    Streaming bulk indexing engine.
+
+    Actions are consumed lazily from any iterable, serialized once, grouped into
+    chunks bounded by document count and payload size, and sent with several
+    `_bulk` requests in flight. Index refresh can be disabled during the load of
+    a fresh index that nothing searches yet, and is restored afterwards.
+    Documents rejected with a retryable status go to a retry queue that is
+    replayed with exponential backoff; everything else is recorded as a failure.
+    `index()` returns throughput and error statistics.
+
+    Actions use the opensearch-py helpers format:
+        {"_id": 42, "_source": {...}}                 # index (default)
+        {"_op_type": "delete", "_id": 42}             # delete
+
+    An action may carry `"_version"` (sent with version_type=external_gte): the
+    cluster then keeps whichever copy of the document is the most recent, and a
+    version conflict means a newer copy is already indexed, which counts as done.
+    """
+
+    def __init__(
+        self,
+        es,
+        index_name: str,
+        chunk_size: Optional[int] = None,
+        max_chunk_bytes: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        initial_backoff: float = 2.0,
+        request_timeout: Optional[int] = None,
+    ):
+        self.es = es
+        self.index_name = index_name
+        self.chunk_size = chunk_size or settings.BULK_INDEX_CHUNK_SIZE
+        self.max_chunk_bytes = max_chunk_bytes or settings.BULK_INDEX_MAX_CHUNK_BYTES
+        self.max_in_flight = max_in_flight or settings.BULK_INDEX_MAX_IN_FLIGHT
+        self.max_retries = settings.BULK_INDEX_MAX_RETRIES if max_retries is None else max_retries
+        self.initial_backoff = initial_backoff
+        self.request_timeout = request_timeout or settings.ELASTICSEARCH_TIMEOUT
+        self._serializer = es.transport.serializer
+
+    # ------------------------------------------------------------------ #
+    # Serialization / chunking
+    # ------------------------------------------------------------------ #
+    def _serialize(self, action: Dict[str, Any]) -> BulkEntry:
+        op_type = action.get("_op_type", "index")
+        doc_id = str(action["_id"])
+        meta = {op_type: {"_index": action.get("_index", self.index_name), "_id": doc_id}}
+        if action.get("_version") is not None:
+            meta[op_type]["version"] = action["_version"]
+            meta[op_type]["version_type"] = "external_gte"
+        lines = self._serializer.dumps(meta) + "\n"
+        if op_type != "delete":
+            lines += self._serializer.dumps(action["_source"]) + "\n"
+        return doc_id, lines
+
+    def _chunks(self, entries: Iterable[BulkEntry]) -> Iterable[List[BulkEntry]]:
+        chunk: List[BulkEntry] = []
+        chunk_bytes = 0
+        for entry in entries:
+            entry_bytes = len(entry[1].encode("utf-8"))
+            if chunk and (len(chunk) >= self.chunk_size or chunk_bytes + entry_bytes > self.max_chunk_bytes):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(entry)
+            chunk_bytes += entry_bytes
+        if chunk:
+            yield chunk
+
+    # ------------------------------------------------------------------ #
+    # Sending
+    # ------------------------------------------------------------------ #
+    def _send_chunk(self, chunk: List[BulkEntry], refresh: Optional[str] = None) -> Dict[str, Any]:
+        """Send one `_bulk` request and classify every document of the chunk."""
+        payload = "".join(lines for _, lines in chunk)
+        outcome = {"ok": 0, "retry": [], "failed": [], "bytes": len(payload.encode("utf-8"))}
+        params = {"request_timeout": self.request_timeout}
+        if refresh:
+            params["refresh"] = refresh
+
+        try:
+            with search_metrics.timed("bulk", index=self.index_name, documents=len(chunk)) as probe:
+                response = self.es.bulk(body=payload, **params)
+                probe.response = response
+        except (OSConnectionError, TransportError) as e:
+            status = getattr(e, "status_code", None)
+            if status is None or status == "N/A" or status in RETRYABLE_STATUSES:
+                logger.warning(f"Bulk request of {len(chunk)} documents failed ({status}), queued for retry: {str(e)}")
+                outcome["retry"] = chunk
+            else:
+                logger.error(f"Bulk request of {len(chunk)} documents rejected ({status}): {str(e)}")
+                outcome["failed"] = [(doc_id, type(e).__name__, str(e)) for doc_id, _ in chunk]
+            return outcome
+
+        for entry, item in zip(chunk, response.get("items", [])):
+            _, result = next(iter(item.items()))
+            status = result.get("status", 500)
+            if 200 <= status < 300 or (status == 404 and "delete" in item):
+                outcome["ok"] += 1
+            elif status == 409:
+                # Version externe : l'index a déjà une copie plus récente du document
+                outcome["ok"] += 1
+            elif status in RETRYABLE_STATUSES:
+                outcome["retry"].append(entry)
+            else:
+                error = result.get("error") or {}
+                error_type = error.get("type", str(status)) if isinstance(error, dict) else str(status)
+                reason = error.get("reason", "") if isinstance(error, dict) else str(error)
+                outcome["failed"].append((entry[0], error_type, reason))
+        return outcome
+
+    def _run_chunks(self, chunks: Iterable[List[BulkEntry]], stats: Dict[str, Any], refresh: Optional[str]) -> List[BulkEntry]:
+        """Send chunks with up to `max_in_flight` concurrent requests; return entries to retry."""
+        retry_queue: List[BulkEntry] = []
+        errors: Counter = stats["errors_by_type"]
+
+        def collect(future):
+            outcome = future.result()
+            stats["indexed"] += outcome["ok"]
+            stats["bytes_sent"] += outcome["bytes"]
+            stats["chunks"] += 1
+            retry_queue.extend(outcome["retry"])
+            for doc_id, error_type, reason in outcome["failed"]:
+                errors[error_type] += 1
+                stats["failed_ids"].append(doc_id)
+                logger.error(f"Document ID {doc_id} failed: {error_type} - {reason}")
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="bulk-index") as pool:
+            in_flight = set()
+            for chunk in chunks:
+                stats["docs_total"] += len(chunk)
+                in_flight.add(pool.submit(self._send_chunk, chunk, refresh))
+                if len(in_flight) >= self.max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+            for future in in_flight:
+                collect(future)
+        return retry_queue
+
+    # ------------------------------------------------------------------ #
+    # Refresh management
+    # ------------------------------------------------------------------ #
+    def _disable_refresh(self):
+        """Turn periodic refresh off and return the previous setting (None = cluster default)."""
+        current = self.es.indices.get_settings(index=self.index_name, name="index.refresh_interval")
+        previous = None
+        for index_settings in current.values():
+            previous = index_settings.get("settings", {}).get("index", {}).get("refresh_interval")
+            break
+        self.es.indices.put_settings(index=self.index_name, body={"index": {"refresh_interval": "-1"}})
+        logger.info(f"Refresh disabled on {self.index_name} (previous: {previous or 'default'})")
+        return previous
+
+    def _restore_refresh(self, previous):
+        if previous == "-1":
+            # Lu pendant le chargement d'un autre run : revenir au défaut plutôt que rester sans refresh
+            previous = None
+        self.es.indices.put_settings(index=self.index_name, body={"index": {"refresh_interval": previous}})
+        self.es.indices.refresh(index=self.index_name)
+        logger.info(f"Refresh interval restored on {self.index_name} ({previous or 'default'})")
+
+    @contextmanager
+    def refresh_suspended(self):
+        """
+        Keep refresh off for a whole block, e.g. several `index()` calls of one reindex run.
+        Only for a fresh index version: on the live alias, searches would stop seeing
+        changes, and overlapping runs would restore each other's "-1".
+        """
+        previous_refresh = None
+        refresh_disabled = False
+        try:
+            previous_refresh = self._disable_refresh()
+            refresh_disabled = True
+        except Exception as e:
+            logger.warning(f"Could not disable refresh on {self.index_name}: {str(e)}")
+
+        try:
+            yield
+        finally:
+            if refresh_disabled:
+                try:
+                    self._restore_refresh(previous_refresh)
+                except Exception as e:
+                    logger.error(f"Failed to restore refresh interval on {self.index_name}: {str(e)}")
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    def index(self, actions: Iterable[Dict[str, Any]], disable_refresh: bool = False, refresh: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream `actions` into the index.
+
+        Args:
+            actions: iterable (ideally a generator) of bulk actions
+            disable_refresh: turn refresh off for the duration of the load
+                             (fresh index versions only, see refresh_suspended)
+            refresh: per-request refresh parameter ("wait_for", "true"), only
+                     meaningful when disable_refresh is False
+
+        Returns:
+            dict: docs_total, indexed, failed, retried, chunks, bytes_sent,
+                  elapsed_seconds, docs_per_second, mb_per_second,
+                  errors_by_type, failed_ids
+        """
+        stats: Dict[str, Any] = {
+            "docs_total": 0,
+            "indexed": 0,
+            "failed": 0,
+            "retried": 0,
+            "chunks": 0,
+            "bytes_sent": 0,
+            "errors_by_type": Counter(),
+            "failed_ids": [],
+        }
+        start = time.perf_counter()
+
+        with self.refresh_suspended() if disable_refresh else nullcontext():
+            entries = (self._serialize(action) for action in actions)
+            retry_queue = self._run_chunks(self._chunks(entries), stats, refresh)
+
+            backoff = self.initial_backoff
+            for attempt in range(1, self.max_retries + 1):
+                if not retry_queue:
+                    break
+                logger.info(f"Retrying {len(retry_queue)} documents (round {attempt}/{self.max_retries}) in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff *= 2
+                stats["retried"] += len(retry_queue)
+                # Retried documents were already counted in docs_total
+                stats["docs_total"] -= len(retry_queue)
+                retry_queue = self._run_chunks(self._chunks(retry_queue), stats, refresh)
+
+            for doc_id, _ in retry_queue:
+                stats["errors_by_type"]["retries_exhausted"] += 1
+                stats["failed_ids"].append(doc_id)
+
+        elapsed = time.perf_counter() - start
+        stats["failed"] = len(stats["failed_ids"])
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["docs_per_second"] = round(stats["indexed"] / elapsed, 1) if elapsed > 0 else 0.0
+        stats["mb_per_second"] = round(stats["bytes_sent"] / (1024 ** 2) / elapsed, 2) if elapsed > 0 else 0.0
+        stats["errors_by_type"] = dict(stats["errors_by_type"])
+
+        logger.info(
+            f"Bulk indexing into {self.index_name}: {stats['indexed']}/{stats['docs_total']} documents in "
+            f"{stats['elapsed_seconds']}s ({stats['docs_per_second']} docs/s, {stats['chunks']} chunks, "
+            f"{stats['retried']} retried, {stats['failed']} failed)"
+        )
+        return stats
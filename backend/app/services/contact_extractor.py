@@ -0,0 +1,141 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Bumped when the hints given to the parsing LLM change (part of the parse cache key)
+CONTACT_EXTRACTOR_VERSION = "2"
+
+# Only the top of the CV is searched for the candidate's own email and phone
+# (references and former employers come later)
+CONTACT_HEADER_CHARS = 2000
+
+EMAIL = re.compile(r"(?<![\w.+-])[A-Za-z0-9][A-Za-z0-9._%+-]*@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+LINKEDIN = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/in/([A-Za-z0-9_%-]+)", re.IGNORECASE)
+GITHUB = re.compile(r"(?:https?://)?(?:www\.)?github\.com/([A-Za-z0-9-]+)", re.IGNORECASE)
+PHONE = re.compile(r"(?<![\w+])(?:\+|00)?\(?\d[\d \t.()-]{6,}\d(?!\w)")
+# Numbers without "+"/"00" are only taken in a known national format (French 0X XX XX XX XX),
+# so identifiers such as SIRET or student numbers are not mistaken for phones
+NATIONAL_PHONE = re.compile(r"^0[1-9]\d{8}$")
+DATE_LIKE = re.compile(r"^\d{1,4}\s*[./-]\s*\d{1,2}\s*[./-]\s*\d{1,4}$|^(19|20)\d{2}\s*[-/]\s*(19|20)\d{2}$")
+GITHUB_RESERVED = {"features", "about", "orgs", "topics", "login", "pricing", "sponsors"}
+
+# Country calling codes matched on the digits following "+" or "00" (longest first)
+ISD_CODES = {
+    "1", "7", "20", "27", "30", "31", "32", "33", "34", "36", "39", "40", "41", "43", "44", "45", "46",
+    "47", "48", "49", "51", "52", "54", "55", "57", "60", "61", "62", "63", "64", "65", "66", "81", "82",
+    "84", "86", "90", "91", "92", "94", "212", "213", "216", "218", "221", "222", "223", "224", "225",
+    "226", "227", "228", "229", "230", "235", "236", "237", "241", "242", "243", "250", "261", "351",
+    "352", "353", "354", "356", "357", "358", "359", "370", "371", "372", "377", "380", "381", "385",
+    "386", "420", "421", "961", "962", "966", "971", "972", "974",
+}
+
+
+def _split_isd(digits: str) -> Tuple[str, str]:
+    for length in (3, 2, 1):
+        if digits[:length] in ISD_CODES:
+            return digits[:length], digits[length:]
+    return "", digits
+
+
+def _parse_phone(raw: str) -> Optional[Dict[str, str]]:
+    raw = raw.strip()
+    if DATE_LIKE.match(raw):
+        return None
+    international = raw.startswith("+") or raw.startswith("00")
+    digits = re.sub(r"\D", "", raw)
+    if raw.startswith("00"):
+        digits = digits[2:]
+    if not 8 <= len(digits) <= 15:
+        return None
+
+    if not international and not NATIONAL_PHONE.match(digits):
+        return None
+
+    isd, national = _split_isd(digits) if international else ("", digits)
+    # « +33 (0)6 ... » : le 0 national entre parenthèses n'est pas composé
+    if isd and national.startswith("0") and "(0)" in raw.replace(" ", ""):
+        national = national[1:]
+    if not 6 <= len(national) <= 14:
+        return None
+    return {
+        "Number": national,
+        "ISDCode": f"+{isd}" if isd else "",
+        "OriginalNumber": raw,
+        "FormattedNumber": f"+{isd} {national}" if isd else national,
+    }
+
+
+def extract_contacts(text: str) -> Dict[str, Any]:
+    """
+    Contact fields found by pattern in a CV text: emails and phone numbers (from the
+    top of the CV first), LinkedIn and GitHub profiles. Deterministic and cheap, so it
+    runs before the LLM for the duplicate check, the hints and the fallback values.
+    """
+    header = text[:CONTACT_HEADER_CHARS]
+    emails: List[str] = []
+    for email in EMAIL.findall(header) + EMAIL.findall(text[CONTACT_HEADER_CHARS:]):
+        email = email.rstrip(".").lower()
+        if email not in emails:
+            emails.append(email)
+
+    phones: List[Dict[str, str]] = []
+    for match in PHONE.finditer(header):
+        phone = _parse_phone(match.group())
+        if phone and all(phone["Number"] != known["Number"] for known in phones):
+            phones.append(phone)
+
+    linkedin = LINKEDIN.search(text)
+    github = next((m for m in GITHUB.finditer(text) if m.group(1).lower() not in GITHUB_RESERVED), None)
+    return {
+        "emails": emails,
+        "phones": phones,
+        "linkedin": f"https://www.linkedin.com/in/{linkedin.group(1).rstrip('/')}" if linkedin else "",
+        "github": f"https://github.com/{github.group(1)}" if github else "",
+    }
+
+
+def contact_hints(contacts: Dict[str, Any]) -> str:
+    """Extracted contact fields, as a note appended to the CV text sent to the LLM."""
+    lines = []
+    if contacts["emails"]:
+        lines.append(f"Email: {', '.join(contacts['emails'][:3])}")
+    if contacts["phones"]:
+        lines.append(f"Phone: {', '.join(phone['FormattedNumber'] for phone in contacts['phones'][:2])}")
+    if contacts["linkedin"]:
+        lines.append(f"LinkedIn: {contacts['linkedin']}")
+    if contacts["github"]:
+        lines.append(f"GitHub: {contacts['github']}")
+    if not lines:
+        return ""
+    return "Contact fields detected in the resume (use them if they belong to the candidate):\n" + "\n".join(lines)
+
+
+def _missing(value) -> bool:
+    return not value or (isinstance(value, str) and value.strip().lower() in ("", "not provided", "n/a"))
+
+
+def apply_contact_fallback(parsed_data: dict, contacts: Optional[Dict[str, Any]]) -> dict:
+    """Fill the contact fields the parser left empty (or "Not Provided") from the extracted ones."""
+    if not contacts:
+        return parsed_data
+    info = parsed_data.setdefault("CandidateInfo", {})
+    filled = []
+    if _missing(info.get("Email")) and contacts["emails"]:
+        info["Email"] = contacts["emails"][0]
+        filled.append("Email")
+    phone = info.get("PhoneNumber")
+    if contacts["phones"] and (not isinstance(phone, dict) or _missing(phone.get("Number"))):
+        info["PhoneNumber"] = {**(phone if isinstance(phone, dict) else {}), **contacts["phones"][0]}
+        filled.append("PhoneNumber")
+    if _missing(info.get("Linkedin")) and contacts["linkedin"]:
+        info["Linkedin"] = contacts["linkedin"]
+        filled.append("Linkedin")
+    if _missing(info.get("Github")) and contacts["github"]:
+        info["Github"] = contacts["github"]
+        filled.append("Github")
+    if filled:
+        logger.info(f"Contact fields filled from the CV text: {', '.join(filled)}")
+    return parsed_data
@@ -0,0 +1,444 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.candidate import Candidate, Resume, Experience
+from app.models.user import UserActivity
+from app.database.postgresql import SessionLocal
+from app.services.contact_extractor import apply_contact_fallback, contact_hints, extract_contacts
+from app.services.cv_parser import create_fallback_response, extract_cv_text, probe_cv_file, process_text_with_openai_async
+from app.services.pdf_engines import extract_pdf_text_parallel
+from app.services.parse_cache import parse_cache
+from app.services.upload_stream import SpooledUpload
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Extraction workers (pdfplumber / python-docx are CPU-bound and hold the GIL)
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+# Bounds the concurrent resume parsing calls of this worker
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        workers = settings.CV_EXTRACTION_WORKERS or min(4, os.cpu_count() or 1)
+        # spawn : pas de fork d'un process qui a déjà des threads et des connexions ouvertes
+        _extraction_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"🚀 CV extraction pool started with {workers} processes")
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+        logger.info("🛑 CV extraction pool stopped")
+
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(settings.CV_PARSE_LLM_CONCURRENCY)
+    return _llm_semaphore
+
+
+def _decode_upload(base64_data: str):
+    binary_data = base64.b64decode(base64_data)
+    return binary_data, hashlib.sha256(binary_data).hexdigest()
+
+
+async def extract_in_pool(source) -> tuple:
+    """
+    `extract_cv_text` in the extraction pool. PDFs longer than CV_PDF_PAGES_PER_TASK
+    pages are split into page ranges extracted by several processes at once.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_extraction_pool()
+    file_type, page_count = await loop.run_in_executor(pool, probe_cv_file, source)
+    if file_type == 'application/pdf' and page_count > settings.CV_PDF_PAGES_PER_TASK:
+        text = (await extract_pdf_text_parallel(source, pool, page_count)).strip()
+        if not text:
+            raise ValueError("No text could be extracted from the PDF")
+        return file_type, text
+    return await loop.run_in_executor(pool, extract_cv_text, source, file_type)
+
+
+def find_duplicate_candidate(contacts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Existing candidate with the first email of the CV (the candidate's own, found at the
+    top), looked up through the lower(email) index. None when there is no confident match.
+    """
+    if not contacts["emails"]:
+        return None
+    try:
+        db = SessionLocal()
+        try:
+            match = db.query(Candidate.id, Candidate.name, Candidate.email).filter(
+                func.lower(Candidate.email) == contacts["emails"][0]
+            ).first()
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"Pre-parse duplicate check failed: {str(e)}")
+        return None
+    return {"candidate_id": match.id, "name": match.name, "email": match.email} if match else None
+
+
+async def parse_upload(idx: int, upload: Union[str, SpooledUpload],
+                       on_extracted: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       check_duplicates: bool = True) -> Dict[str, Any]:
+    """
+    Parse one uploaded file (base64 string of a JSON upload, or multipart SpooledUpload
+    already hashed): parse cache lookup, extraction in the process pool, then the LLM
+    call behind the concurrency semaphore.
+    `on_extracted` is called with the partial result once the text is available.
+
+    With `check_duplicates`, a file whose email already belongs to a candidate is not
+    sent to the LLM: its status is "duplicate" and `duplicate` describes the candidate.
+
+    Returns the `parse_cache.parse_cv` result dict plus `file_index`, `status`
+    ("parsed", "duplicate" or "failed"), `error`, `elapsed_seconds` and `original`
+    (bytes or SpooledUpload), which is the file stored as the candidate resume.
+    """
+    start = time.perf_counter()
+    base = {"file_index": idx, "status": "failed", "error": None, "cache": None, "file_type": None}
+    if not upload or (isinstance(upload, SpooledUpload) and not upload.size):
+        return {**base, "error": "Empty file data", "elapsed_seconds": 0.0}
+
+    if isinstance(upload, SpooledUpload):
+        # Fichier reçu en multipart : déjà haché, passé par chemin s'il est sur disque
+        original, source, digest = upload, upload.source, upload.sha256
+    else:
+        try:
+            original, digest = await asyncio.to_thread(_decode_upload, upload)
+            source = original
+        except Exception as e:
+            logger.error(f"Could not decode file {idx}: {str(e)}")
+            return {**base, "error": f"Invalid file data: {str(e)}", "elapsed_seconds": round(time.perf_counter() - start, 3)}
+
+    entry, complete = await asyncio.to_thread(parse_cache.lookup, digest)
+    result = {**base, **parse_cache.cached_result(entry, complete, digest), "status": "parsed", "original": original}
+
+    if not complete:
+        if entry is not None:
+            extracted_text = entry.extracted_text
+        else:
+            try:
+                file_type, extracted_text = await extract_in_pool(source)
+                result["file_type"] = file_type
+            except Exception as extraction_error:
+                # Même comportement que parse_cv : le fichier donne la réponse par défaut
+                logger.error(f"CV extraction failed for file {idx}: {str(extraction_error)}")
+                result["parsed_data"] = create_fallback_response()
+                result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+                return result
+
+        contacts = extract_contacts(extracted_text)
+        if check_duplicates and settings.CV_PRE_PARSE_DUPLICATE_CHECK:
+            duplicate = await asyncio.to_thread(find_duplicate_candidate, contacts)
+            if duplicate is not None:
+                # Candidat déjà connu : pas d'appel LLM, le texte reste en cache pour un envoi forcé
+                logger.info(f"File {idx} matches candidate {duplicate['candidate_id']} ({contacts['emails'][0]}), not parsed")
+                if entry is None:
+                    await asyncio.to_thread(parse_cache.store, digest, result["file_type"], extracted_text, None)
+                result.update(status="duplicate", duplicate=duplicate, parsed_data=None,
+                              elapsed_seconds=round(time.perf_counter() - start, 3))
+                return result
+
+        if on_extracted:
+            on_extracted(result)
+        async with _get_llm_semaphore():
+            try:
+                parsed_data = await process_text_with_openai_async(extracted_text, contact_hints(contacts))
+                parsed_data = apply_contact_fallback(parsed_data, contacts)
+            except ValueError as openai_error:
+                logger.error(f"OpenAI processing failed for file {idx}: {str(openai_error)}")
+                parsed_data = None
+
+        await asyncio.to_thread(
+            parse_cache.store, digest, result["file_type"], extracted_text, parsed_data
+        )
+        if parsed_data is None:
+            parsed_data = apply_contact_fallback(create_fallback_response(), contacts)
+        result["parsed_data"] = parsed_data
+    elif on_extracted:
+        on_extracted(result)
+
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(f"File {idx} parsed in {result['elapsed_seconds']}s (parse cache: {result['cache']})")
+    return result
+
+
+async def parse_uploads(files: List[Union[str, SpooledUpload]], check_duplicates: bool = True) -> List[Dict[str, Any]]:
+    """Parse all uploaded files concurrently; results keep the order of `files`."""
+    start = time.perf_counter()
+    parsed = await asyncio.gather(*(
+        parse_upload(idx, base64_data, check_duplicates=check_duplicates) for idx, base64_data in enumerate(files)
+    ))
+    logger.info(f"Parsed {len(files)} files in {time.perf_counter() - start:.2f}s "
+                f"(slowest file {max((item['elapsed_seconds'] for item in parsed), default=0):.2f}s)")
+    return parsed
+
+
+def build_candidate_experiences(candidate_id: Optional[int], parsed_data: dict) -> List[Experience]:
+    """
+    Experience rows of the ProfessionalExperience section (not added to the session).
+    `candidate_id` may be None when the rows are attached through `candidate.experiences`.
+    """
+    experiences = []
+    experiences_data = parsed_data.get("ProfessionalExperience", [])
+    
+    logger.info(f"Professional Experience count for candidate_id {candidate_id}: {len(experiences_data)}")
+    if experiences_data:
+        logger.debug(f"First experience: {experiences_data[0]}")
+    else:
+        logger.debug(f"No ProfessionalExperience data found for candidate_id {candidate_id}")
+
+    # Current date for PRESENT calculations
+    current_date = datetime(2025, 5, 16, 14, 6)  # Updated to match current time (02:06 PM CET, May 16, 2025)
+
+    # French month names and abbreviations
+    french_months = {
+        "janvier": 1, "février": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6,
+        "juillet": 7, "août": 8, "septembre": 9, "octobre": 10, "novembre": 11, "décembre": 12,
+        "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+        "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+    }
+
+    for exp_data in experiences_data:
+        if not exp_data.get("JobTitle"):
+            logger.warning(f"Skipping experience with missing JobTitle for candidate_id {candidate_id}: {exp_data}")
+            continue
+
+        # Extract and normalize dates
+        start_date = exp_data.get("StartDate", "").strip()
+        end_date = exp_data.get("EndDate", "").strip()
+        duration = exp_data.get("Duration", "").strip()
+
+        # Normalize end_date to "PRESENT" if it matches common variations
+        if end_date.upper() in ["PRESENT", "EN COURS"]:
+            end_date = "PRESENT"
+
+        # Calculate duration if not provided or if end_date is PRESENT
+        duration_years = 0.0
+        if not duration or end_date == "PRESENT":
+            try:
+                # Try different date formats
+                date_formats = [
+                    "%B %Y",      # e.g., "March 2024"
+                    "%m/%Y",      # e.g., "05/2018"
+                    "%Y",         # e.g., "2021"
+                    "%B",         # e.g., "Février"
+                    "%d/%m/%Y",   # e.g., "07/2022"
+                    "%m/%d/%Y"    # Alternative MM/DD/YYYY
+                ]
+                start = None
+                end = None
+
+                # Handle "De mai 2022" format
+                start_cleaned = start_date.lower().replace("de ", "").strip()
+                end_cleaned = end_date.lower().replace("de ", "").strip() if end_date != "PRESENT" else None
+
+                for fmt in date_formats:
+                    try:
+                        start = datetime.strptime(start_cleaned, fmt) if start_cleaned else None
+                        if end_date != "PRESENT":
+                            end = datetime.strptime(end_cleaned, fmt) if end_cleaned else None
+                        break
+                    except ValueError:
+                        continue
+
+                # Try French month names
+                if not start:
+                    start_parts = start_cleaned.split()
+                    if len(start_parts) >= 2:  # e.g., "mai 2022"
+                        start_month = french_months.get(start_parts[0], 1)
+                        start_year = int(start_parts[1])
+                        start = datetime(start_year, start_month, 1)
+                    elif len(start_parts) == 1 and start_parts[0].isdigit():  # e.g., "2021"
+                        start = datetime(int(start_parts[0]), 1, 1)
+
+                if end_date != "PRESENT" and not end:
+                    end_parts = end_cleaned.split()
+                    if len(end_parts) >= 2:  # e.g., "août 2023"
+                        end_month = french_months.get(end_parts[0], 1)
+                        end_year = int(end_parts[1])
+                        end = datetime(end_year, end_month, 1)
+                    elif len(end_parts) == 1 and end_parts[0].isdigit():  # e.g., "2023"
+                        end = datetime(int(end_parts[0]), 12, 31)
+
+                # Calculate duration in years
+                if start and end_date == "PRESENT":
+                    months = (current_date.year - start.year) * 12 + current_date.month - start.month
+                    if current_date.day < start.day:
+                        months -= 1
+                    duration_years = round(months / 12.0, 2)
+                elif start and end:
+                    months = (end.year - start.year) * 12 + end.month - start.month
+                    if end.day < start.day:
+                        months -= 1
+                    duration_years = round(months / 12.0, 2)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Error parsing dates for {start_date} to {end_date}: {str(e)}")
+                duration_years = 0.0
+
+        # Parse duration if provided (e.g., "4 ans", "6 mois")
+        if duration and duration_years == 0.0:
+            duration_match = re.search(r'(\d+)\s*(years|ans|months|mois)', duration.lower())
+            if duration_match:
+                num = int(duration_match.group(1))
+                unit = duration_match.group(2)
+                if unit in ["years", "ans"]:
+                    duration_years = float(num)
+                elif unit in ["months", "mois"]:
+                    duration_years = round(num / 12.0, 2)
+
+        experience = Experience(
+            candidate_id=candidate_id,
+            job_title=exp_data.get("JobTitle", ""),
+            company=exp_data.get("Company", ""),
+            location=exp_data.get("Location", ""),
+            start_date=start_date,
+            end_date=end_date,
+            duration=duration_years,  # Store as float (years)
+            responsibilities=exp_data.get("Responsibilities", []),
+            achievements=exp_data.get("Achievements", []),
+            tools_technologies=exp_data.get("ToolsAndTechnologies", []),
+            team_size=exp_data.get("TeamSize", ""),
+            relevance_score=exp_data.get("RelevanceScore", "")
+        )
+        experiences.append(experience)
+        logger.info(f"Saved experience: {exp_data.get('JobTitle')} with duration {duration_years} years for candidate_id {candidate_id}")
+    
+    return experiences
+
+
+def _resume_file(item: dict) -> bytes:
+    """File stored for a parsed upload: the original file, PDF or DOCX."""
+    original = item["original"]
+    return original.read_bytes() if isinstance(original, SpooledUpload) else original
+
+
+class CandidatePersister:
+    """
+    Creates the candidates of parsed uploads in batched transactions (CV_INGEST_COMMIT_BATCH
+    files per commit) and logs the UPLOAD_CV activity. Duplicates are checked against the
+    database with one query per batch, and against the files already persisted by this
+    persister (the same upload). When a batch fails its files are retried one by one,
+    so a bad file only fails itself.
+    """
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = max(1, settings.CV_INGEST_COMMIT_BATCH)
+        self.seen_emails = set()
+        self.seen_names = set()
+
+    def persist(self, parsed_files: List[dict]) -> Dict[int, dict]:
+        """
+        Returns {file_index: outcome} where outcome has a `status` of "success",
+        "duplicate" or "failed".
+        """
+        outcomes = {}
+        items = [
+            {
+                **item,
+                "email": item["parsed_data"].get("CandidateInfo", {}).get("Email", "").lower(),
+                "name": item["parsed_data"].get("CandidateInfo", {}).get("FullName", "").lower(),
+            }
+            for item in parsed_files
+        ]
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                outcomes.update(self._add_batch(batch))
+            except Exception as batch_error:
+                self.db.rollback()
+                logger.warning(f"Batch of {len(batch)} CVs failed ({str(batch_error)}), retrying files one by one")
+                for item in batch:
+                    try:
+                        outcomes.update(self._add_batch([item]))
+                    except Exception as db_error:
+                        logger.error(f"Database error for file {item['file_index']}: {str(db_error)}")
+                        self.db.rollback()
+                        outcomes[item["file_index"]] = {"status": "failed", "error": f"Database error: {str(db_error)}"}
+        return outcomes
+
+    def _add_batch(self, batch: List[dict]) -> Dict[int, dict]:
+        db = self.db
+        emails = {item["email"] for item in batch}
+        names = {item["name"] for item in batch}
+        existing = db.query(func.lower(Candidate.email), func.lower(Candidate.name)).filter(
+            func.lower(Candidate.email).in_(emails) | func.lower(Candidate.name).in_(names)
+        ).all()
+        existing_emails = self.seen_emails | {email for email, _ in existing}
+        existing_names = self.seen_names | {name for _, name in existing}
+
+        created, outcomes = [], {}
+        for item in batch:
+            if item["email"] in existing_emails or item["name"] in existing_names:
+                logger.info(f"Duplicate candidate found: {item['name']}")
+                outcomes[item["file_index"]] = {"status": "duplicate"}
+                continue
+            existing_emails.add(item["email"])
+            existing_names.add(item["name"])
+
+            parsed_data = item["parsed_data"]
+            candidate_info = parsed_data.get("CandidateInfo", {})
+            candidate = Candidate(
+                name=candidate_info.get("FullName", "Not Provided"),
+                email=candidate_info.get("Email", "Not Provided"),
+                job_title=candidate_info.get("CurrentJobTitle", "Not Provided"),
+                added_by_id=self.user_id
+            )
+            candidate.resumes.append(Resume(
+                resume_file=_resume_file(item),  # DOCX rendu en PDF à la première consultation
+                file_type=item.get("file_type"),
+                resume_json=json.dumps(parsed_data, ensure_ascii=False)
+            ))
+            candidate.experiences.extend(build_candidate_experiences(None, parsed_data))
+            db.add(candidate)
+            created.append((item["file_index"], candidate))
+
+        if created:
+            db.add_all([
+                UserActivity(
+                    user_id=self.user_id,
+                    activity_type="UPLOAD_CV",
+                    description=f"User uploaded CV for candidate: {candidate.name}"
+                )
+                for _, candidate in created
+            ])
+        db.commit()
+
+        for file_index, candidate in created:
+            logger.info(f"Created candidate ID {candidate.id}: {candidate.name}")
+            outcomes[file_index] = {
+                "status": "success",
+                "candidate_id": candidate.id,
+                "name": candidate.name,
+                "email": candidate.email,
+            }
+        self.seen_emails = existing_emails
+        self.seen_names = existing_names
+        return outcomes
+
+
+def persist_parsed_cvs(db: Session, parsed_files: List[dict], user_id: int) -> Dict[int, dict]:
+    """Create the candidates of one upload (see CandidatePersister)."""
+    return CandidatePersister(db, user_id).persist(parsed_files)
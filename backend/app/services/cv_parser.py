@@ -1,22 +1,21 @@
-import pdfplumber
 import io
 import base64
-from openai import OpenAI
 from app.config.settings import settings
 import json
 from docx import Document  # For reading DOCX files
 import magic  # For file type detection
-from docx2pdf import convert  # For converting DOCX to PDF
-import tempfile
-import os
+from app.services.pdf_engines import extract_pdf_text, pdf_page_count
+from app.services.cv_text import NORMALIZER_VERSION, completion_token_budget, condense_cv_text, estimate_tokens
+from app.services.contact_extractor import CONTACT_EXTRACTOR_VERSION
+from app.services.llm_gateway import llm_gateway
+import hashlib
 import logging
+from typing import Optional, Union
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 # Define the comprehensive resume parsing prompt
 resume_prompt = """
 You are an HR assistant designed to extract structured candidate information from resumes and format it in JSON. 
@@ -177,23 +176,57 @@ Return the result in the following JSON structure:
 }
 """
 
-def detect_file_type(binary_data: bytes) -> str:
+# Model used for resume parsing; together with the hash of the prompt and of what the
+# model receives (text normalisation, input budget) it versions the parse cache
+RESUME_PARSER_MODEL = "gpt-3.5-turbo"
+RESUME_PROMPT_VERSION = hashlib.sha256(
+    f"{resume_prompt}\n{NORMALIZER_VERSION}:{CONTACT_EXTRACTOR_VERSION}:{settings.CV_PARSE_INPUT_TOKEN_BUDGET}".encode("utf-8")
+).hexdigest()[:12]
+RESUME_PROMPT_TOKENS = estimate_tokens(resume_prompt, RESUME_PARSER_MODEL)
+
+# A CV file: its content, or the path of an upload spooled to disk
+CVSource = Union[bytes, str]
+
+# Supported Word formats (stored as uploaded, rendered to PDF on first view)
+WORD_FILE_TYPES = [
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/msword'
+]
+
+def read_source_head(source: CVSource, size: int = 8192) -> bytes:
+    """First bytes of a CV file (enough for signature checks)."""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    return source[:size]
+
+def read_source(source: CVSource) -> bytes:
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source
+
+def detect_file_type(binary_data: CVSource) -> str:
     """
     Detect file type from binary data using multiple methods.
     
     Args:
-        binary_data (bytes): The binary data of the file
+        binary_data (bytes | str): The binary data of the file, or its path
         
     Returns:
         str: MIME type of the detected file
     """
     try:
         # Method 1: Use python-magic to detect file type
-        mime_type = magic.from_buffer(binary_data, mime=True)
+        if isinstance(binary_data, str):
+            mime_type = magic.from_file(binary_data, mime=True)
+        else:
+            mime_type = magic.from_buffer(binary_data, mime=True)
         logger.info(f"Magic detected file type: {mime_type}")
         return mime_type
     except Exception as e:
         logger.warning(f"Magic detection failed: {str(e)}, falling back to signature detection")
+        binary_data = read_source_head(binary_data)
         
         # Method 2: Fallback - check file signatures
         if binary_data.startswith(b'%PDF'):
@@ -215,12 +248,13 @@ def detect_file_type(binary_data: bytes) -> str:
             logger.warning("Unknown file type")
             return 'unknown'
 
-def extract_text_from_pdf(binary_data: bytes) -> str:
+def extract_text_from_pdf(binary_data: CVSource) -> str:
     """
-    Extract text from PDF file using pdfplumber.
+    Extract text from PDF file with the configured engine (CV_PDF_ENGINE, pdfplumber
+    as fallback), limited to CV_PDF_MAX_PAGES pages and CV_PDF_EXTRACTION_TIMEOUT.
     
     Args:
-        binary_data (bytes): PDF file binary data
+        binary_data (bytes | str): PDF file binary data, or its path
         
     Returns:
         str: Extracted text content
@@ -229,19 +263,7 @@ def extract_text_from_pdf(binary_data: bytes) -> str:
         ValueError: If PDF extraction fails
     """
     try:
-        pdf_text = ""
-        with pdfplumber.open(io.BytesIO(binary_data)) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        pdf_text += page_text + "\n"
-                    logger.debug(f"Extracted text from page {page_num + 1}")
-                except Exception as page_error:
-                    logger.warning(f"Failed to extract text from page {page_num + 1}: {str(page_error)}")
-                    continue
-        
-        pdf_text = pdf_text.strip()
+        pdf_text = extract_pdf_text(binary_data).strip()
         logger.info(f"Successfully extracted {len(pdf_text)} characters from PDF")
         
         if not pdf_text:
@@ -253,12 +275,12 @@ def extract_text_from_pdf(binary_data: bytes) -> str:
         logger.error(f"PDF text extraction failed: {str(e)}")
         raise ValueError(f"Error extracting text from PDF: {str(e)}")
 
-def extract_text_from_docx(binary_data: bytes) -> str:
+def extract_text_from_docx(binary_data: CVSource) -> str:
     """
     Extract text from DOCX file using python-docx.
     
     Args:
-        binary_data (bytes): DOCX file binary data
+        binary_data (bytes | str): DOCX file binary data, or its path
         
     Returns:
         str: Extracted text content
@@ -267,8 +289,8 @@ def extract_text_from_docx(binary_data: bytes) -> str:
         ValueError: If DOCX extraction fails
     """
     try:
-        # Create a BytesIO object from binary data
-        docx_file = io.BytesIO(binary_data)
+        # Create a BytesIO object from binary data (python-docx also opens paths)
+        docx_file = binary_data if isinstance(binary_data, str) else io.BytesIO(binary_data)
         
         # Load the document
         doc = Document(docx_file)
@@ -318,76 +340,80 @@ def extract_text_from_docx(binary_data: bytes) -> str:
         logger.error(f"DOCX text extraction failed: {str(e)}")
         raise ValueError(f"Error extracting text from DOCX: {str(e)}")
 
-def convert_docx_to_pdf(binary_data: bytes) -> bytes:
+def _resume_completion_args(extracted_text: str, hints: str = "") -> dict:
     """
-    Convert DOCX file to PDF format.
-    
-    Args:
-        binary_data (bytes): DOCX file binary data
-        
-    Returns:
-        bytes: PDF file binary data
-        
-    Raises:
-        ValueError: If conversion fails
+    Validate the input and build the chat completion arguments of the resume parsing call.
+    `hints` (contact fields found by `contact_extractor`) are appended to the CV text.
     """
-    docx_temp_path = None
-    pdf_temp_path = None
+    if not settings.OPENAI_API_KEY:
+        logger.error("OpenAI API key is not configured")
+        raise ValueError("OpenAI API key is not set")
+    
+    if not extracted_text.strip():
+        logger.error("No text provided for OpenAI processing")
+        raise ValueError("No text content to process")
+    
+    # Texte nettoyé et ramené au budget ; max_tokens suit la taille du CV envoyé
+    condensed = condense_cv_text(extracted_text, RESUME_PARSER_MODEL)
+    if not condensed["text"].strip():
+        raise ValueError("No text content to process")
+    user_content = f"{condensed['text']}\n\n{hints}" if hints else condensed["text"]
+    max_tokens = completion_token_budget(estimate_tokens(user_content, RESUME_PARSER_MODEL), RESUME_PROMPT_TOKENS)
+    logger.info(f"Processing {len(user_content)} characters with OpenAI (max_tokens={max_tokens})")
+    
+    # Comprehensive resume parsing prompt
+    return {
+        "model": RESUME_PARSER_MODEL,
+        "messages": [
+            {"role": "system", "content": resume_prompt},
+            {"role": "user", "content": user_content}
+        ],
+        "temperature": 0.1,
+        "max_tokens": max_tokens
+    }
+
+def _parse_resume_response(response) -> dict:
+    """Decode and validate the JSON returned by the resume parsing call."""
+    response_content = response.choices[0].message.content
+    
+    if not response_content:
+        raise ValueError("Empty response from OpenAI")
     
     try:
-        # Create temporary files
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as docx_temp:
-            docx_temp.write(binary_data)
-            docx_temp_path = docx_temp.name
-        
-        # Create temporary PDF file path
-        pdf_temp_path = docx_temp_path.replace('.docx', '.pdf')
-        
-        logger.info(f"Converting DOCX to PDF: {docx_temp_path} -> {pdf_temp_path}")
-        
-        # Convert DOCX to PDF using docx2pdf
-        convert(docx_temp_path, pdf_temp_path)
-        
-        # Check if conversion was successful
-        if not os.path.exists(pdf_temp_path):
-            raise ValueError("PDF conversion failed - output file not created")
-        
-        # Read the converted PDF
-        with open(pdf_temp_path, 'rb') as pdf_file:
-            pdf_binary = pdf_file.read()
-        
-        if not pdf_binary:
-            raise ValueError("PDF conversion failed - empty output file")
-        
-        logger.info(f"Successfully converted DOCX to PDF: {len(pdf_binary)} bytes")
-        return pdf_binary
-        
-    except Exception as e:
-        logger.error(f"DOCX to PDF conversion failed: {str(e)}")
-        raise ValueError(f"Error converting DOCX to PDF: {str(e)}")
-        
-    finally:
-        # Clean up temporary files
-        try:
-            if docx_temp_path and os.path.exists(docx_temp_path):
-                os.unlink(docx_temp_path)
-                logger.debug(f"Cleaned up temporary DOCX file: {docx_temp_path}")
-        except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up DOCX temp file: {cleanup_error}")
-            
-        try:
-            if pdf_temp_path and os.path.exists(pdf_temp_path):
-                os.unlink(pdf_temp_path)
-                logger.debug(f"Cleaned up temporary PDF file: {pdf_temp_path}")
-        except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up PDF temp file: {cleanup_error}")
+        result = json.loads(response_content)
+    except json.JSONDecodeError as json_error:
+        logger.error(f"Failed to parse OpenAI response as JSON: {json_error}")
+        logger.error(f"Response content: {response_content}")
+        raise ValueError(f"Invalid JSON response from OpenAI: {str(json_error)}")
+    
+    # Validate that we have the required structure
+    if not isinstance(result, dict) or "CandidateInfo" not in result:
+        logger.error(f"Invalid response structure: {result}")
+        raise ValueError("OpenAI response missing required CandidateInfo section")
+    
+    # Log successful parsing with statistics
+    logger.info("Successfully parsed CV using OpenAI")
+    logger.info(f"Professional Experience count: {len(result.get('ProfessionalExperience', []))}")
+    logger.info(f"Hard Skills count: {len(result.get('HardSkills', []))}")
+    logger.info(f"Soft Skills count: {len(result.get('SoftSkills', []))}")
+    logger.info(f"Degrees count: {len(result.get('Degrees', []))}")
+    logger.info(f"Certifications count: {len(result.get('Certifications', []))}")
+    
+    if result.get('ProfessionalExperience', []):
+        first_exp = result['ProfessionalExperience'][0]
+        logger.debug(f"First experience: {first_exp.get('JobTitle', 'N/A')} at {first_exp.get('Company', 'N/A')}")
+    else:
+        logger.warning("No ProfessionalExperience data found in the parsed result")
+    
+    return result
 
-def process_text_with_openai(extracted_text: str) -> dict:
+def process_text_with_openai(extracted_text: str, hints: str = "") -> dict:
     """
     Process extracted text using OpenAI API to parse CV information.
     
     Args:
         extracted_text (str): Text extracted from CV
+        hints (str): Contact fields found in the text, given to the model
         
     Returns:
         dict: Parsed CV data in structured format
@@ -396,60 +422,23 @@ def process_text_with_openai(extracted_text: str) -> dict:
         ValueError: If OpenAI processing fails
     """
     try:
-        if not settings.OPENAI_API_KEY:
-            logger.error("OpenAI API key is not configured")
-            raise ValueError("OpenAI API key is not set")
-        
-        if not extracted_text.strip():
-            logger.error("No text provided for OpenAI processing")
-            raise ValueError("No text content to process")
-        
-        logger.info(f"Processing {len(extracted_text)} characters with OpenAI")
-        
-        # Call OpenAI API with the comprehensive resume parsing prompt
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": resume_prompt},
-                {"role": "user", "content": extracted_text}
-            ],
-            temperature=0.1,
-            max_tokens=4000
-        )
-        
-        # Parse the JSON response
-        response_content = response.choices[0].message.content
-        
-        if not response_content:
-            raise ValueError("Empty response from OpenAI")
-        
-        try:
-            result = json.loads(response_content)
-        except json.JSONDecodeError as json_error:
-            logger.error(f"Failed to parse OpenAI response as JSON: {json_error}")
-            logger.error(f"Response content: {response_content}")
-            raise ValueError(f"Invalid JSON response from OpenAI: {str(json_error)}")
-        
-        # Validate that we have the required structure
-        if not isinstance(result, dict) or "CandidateInfo" not in result:
-            logger.error(f"Invalid response structure: {result}")
-            raise ValueError("OpenAI response missing required CandidateInfo section")
-        
-        # Log successful parsing with statistics
-        logger.info("Successfully parsed CV using OpenAI")
-        logger.info(f"Professional Experience count: {len(result.get('ProfessionalExperience', []))}")
-        logger.info(f"Hard Skills count: {len(result.get('HardSkills', []))}")
-        logger.info(f"Soft Skills count: {len(result.get('SoftSkills', []))}")
-        logger.info(f"Degrees count: {len(result.get('Degrees', []))}")
-        logger.info(f"Certifications count: {len(result.get('Certifications', []))}")
+        response = llm_gateway.chat("cv_parser", **_resume_completion_args(extracted_text, hints))
+        return _parse_resume_response(response)
         
-        if result.get('ProfessionalExperience', []):
-            first_exp = result['ProfessionalExperience'][0]
-            logger.debug(f"First experience: {first_exp.get('JobTitle', 'N/A')} at {first_exp.get('Company', 'N/A')}")
-        else:
-            logger.warning("No ProfessionalExperience data found in the parsed result")
-        
-        return result
+    except Exception as openai_error:
+        logger.error(f"OpenAI API processing failed: {str(openai_error)}")
+        raise ValueError(f"OpenAI processing error: {str(openai_error)}")
+
+async def process_text_with_openai_async(extracted_text: str, hints: str = "") -> dict:
+    """
+    Same as `process_text_with_openai`, without blocking the event loop.
+    
+    Raises:
+        ValueError: If OpenAI processing fails
+    """
+    try:
+        response = await llm_gateway.achat("cv_parser", **_resume_completion_args(extracted_text, hints))
+        return _parse_resume_response(response)
         
     except Exception as openai_error:
         logger.error(f"OpenAI API processing failed: {str(openai_error)}")
@@ -495,76 +484,91 @@ def create_fallback_response() -> dict:
         "AwardsAndPublications": []
     }
 
+def probe_cv_file(binary_data: CVSource) -> tuple[str, int]:
+    """
+    File type and, for PDFs, page count (0 otherwise), to plan the extraction.
+    """
+    file_type = detect_file_type(binary_data)
+    page_count = 0
+    if file_type == 'application/pdf':
+        try:
+            page_count = pdf_page_count(binary_data)
+        except Exception as e:
+            logger.warning(f"Could not count PDF pages: {str(e)}")
+    return file_type, page_count
+
+def extract_cv_text(binary_data: CVSource, file_type: Optional[str] = None) -> tuple[str, str]:
+    """
+    Extraction stage of the CV parsing: file type detection and text extraction.
+    DOCX files are stored as uploaded; their PDF rendition is produced on first
+    view by `docx_renderer`.
+    
+    Args:
+        binary_data (bytes | str): CV file binary data, or the path of a spooled upload
+        file_type (str): Already detected MIME type, if any
+        
+    Returns:
+        tuple[str, str]: (file_type, extracted_text)
+        
+    Raises:
+        ValueError: If the file type is unsupported or no text can be extracted
+    """
+    # Step 1: Detect file type
+    file_type = file_type or detect_file_type(binary_data)
+    logger.info(f"Detected file type: {file_type}")
+    
+    # Step 2: Extract text based on type
+    if file_type == 'application/pdf':
+        logger.info("Processing PDF file")
+        extracted_text = extract_text_from_pdf(binary_data)
+    
+    elif file_type in WORD_FILE_TYPES:
+        logger.info("Processing DOCX/Word file")
+        extracted_text = extract_text_from_docx(binary_data)
+    
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    
+    # Step 3: Validate extracted text
+    if not extracted_text.strip():
+        raise ValueError("No text was extracted from the file")
+    
+    logger.info(f"Successfully extracted {len(extracted_text)} characters")
+    return file_type, extracted_text
+
 def parse_cv(binary_data: bytes) -> tuple[dict, bytes]:
     """
     Main function to parse CV from binary data.
-    Supports both PDF and DOCX files. DOCX files are converted to PDF.
+    Supports both PDF and DOCX files. The file itself is returned for storage
+    (DOCX included, see `docx_renderer` for its PDF rendition).
+    Uploads should go through `parse_cache.parse_cv` to skip already parsed files.
     
     Args:
         binary_data (bytes): CV file binary data
         
     Returns:
-        tuple[dict, bytes]: (parsed_cv_data, pdf_binary_data)
+        tuple[dict, bytes]: (parsed_cv_data, resume_file)
         - parsed_cv_data: Structured CV information
-        - pdf_binary_data: PDF version of the CV (original PDF or converted from DOCX)
+        - resume_file: The uploaded file, to store as the candidate resume
     """
     logger.info(f"Starting CV parsing for {len(binary_data)} bytes of data")
     
     try:
-        # Step 1: Detect file type
-        file_type = detect_file_type(binary_data)
-        logger.info(f"Detected file type: {file_type}")
-        
-        extracted_text = ""
-        pdf_binary_data = binary_data  # Default to original data
-        
-        # Step 2: Extract text and handle file conversion based on type
-        if file_type == 'application/pdf':
-            logger.info("Processing PDF file")
-            try:
-                extracted_text = extract_text_from_pdf(binary_data)
-                pdf_binary_data = binary_data  # Original is already PDF
-            except ValueError as pdf_error:
-                logger.error(f"PDF processing failed: {str(pdf_error)}")
-                return create_fallback_response(), binary_data
-        
-        elif file_type in [
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'application/msword'
-        ]:
-            logger.info("Processing DOCX/Word file")
-            try:
-                # Extract text from DOCX
-                extracted_text = extract_text_from_docx(binary_data)
-                
-                # Convert DOCX to PDF for storage and viewing
-                pdf_binary_data = convert_docx_to_pdf(binary_data)
-                logger.info("Successfully converted DOCX to PDF for storage")
-                
-            except ValueError as docx_error:
-                logger.error(f"DOCX processing failed: {str(docx_error)}")
-                return create_fallback_response(), binary_data
-        
-        else:
-            logger.error(f"Unsupported file type: {file_type}")
+        try:
+            _, extracted_text = extract_cv_text(binary_data)
+        except ValueError as extraction_error:
+            logger.error(f"CV extraction failed: {str(extraction_error)}")
             return create_fallback_response(), binary_data
         
-        # Step 3: Validate extracted text
-        if not extracted_text.strip():
-            logger.error("No text was extracted from the file")
-            return create_fallback_response(), pdf_binary_data
-        
-        logger.info(f"Successfully extracted {len(extracted_text)} characters")
-        
         # Step 4: Process with OpenAI
         try:
             parsed_data = process_text_with_openai(extracted_text)
             logger.info("CV parsing completed successfully")
-            return parsed_data, pdf_binary_data
+            return parsed_data, binary_data
             
         except ValueError as openai_error:
             logger.error(f"OpenAI processing failed: {str(openai_error)}")
-            return create_fallback_response(), pdf_binary_data
+            return create_fallback_response(), binary_data
     
     except Exception as e:
         logger.error(f"Unexpected error in parse_cv: {str(e)}")
@@ -580,11 +584,7 @@ def get_supported_file_types() -> list:
     Returns:
         list: List of supported MIME types
     """
-    return [
-        'application/pdf',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        'application/msword'
-    ]
+    return ['application/pdf'] + WORD_FILE_TYPES
 
 def validate_file_type(binary_data: bytes) -> bool:
     """
@@ -0,0 +1,246 @@
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.settings import settings
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts are estimated from the length
+    tiktoken = None
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Bumped when the normalisation changes what the LLM receives (part of the parse cache key)
+NORMALIZER_VERSION = "1"
+
+# Page separator of the extracted PDF text
+PAGE_BREAK = "\f"
+
+# Characters per token when tiktoken is not installed (French/English CV text)
+CHARS_PER_TOKEN = 3.5
+
+# Lines at the top and bottom of each page where running headers/footers are looked for
+PAGE_EDGE_LINES = 3
+
+PAGE_NUMBER = re.compile(r"^(page|p\.)?\s*\d{1,3}(\s*(/|of|sur|de)\s*\d{1,3})?$", re.IGNORECASE)
+PAGE_COUNTER = re.compile(r"[\s,|-]*(page|p\.)\s*\d{1,3}(\s*(/|of|sur|de)\s*\d{1,3})?$", re.IGNORECASE)
+PDF_ARTIFACTS = re.compile(r"\(cid:\d+\)|[\u200b-\u200f\ufeff\u00ad]")
+BULLET = re.compile(r"^[•▪●◦■‣⁃∙➢✓✔*>·o-]+\s+")
+PIPES = re.compile(r"\s*\|\s*")
+BOILERPLATE = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"^(curriculum vitae|cv)$",
+    r"^(références|references)\s*(disponibles|available)?.*(demande|request)\.?$",
+    r".*(j'autorise|i hereby authori[sz]e|consent to the processing).*(données|data).*",
+    r".*(rgpd|gdpr).*(consent|autoris).*",
+)]
+
+# Section headings, by priority when the text has to be cut to fit the budget
+# (0 = never cut; higher = cut first)
+SECTION_PRIORITIES = [
+    (re.compile(r"^(expériences?|experiences?|parcours|work history|employment|professional experience|"
+                r"expériences? professionnelles?)\b", re.IGNORECASE), 1),
+    (re.compile(r"^(compétences|competences|skills|technical skills|savoir-faire|outils|technologies)\b",
+                re.IGNORECASE), 2),
+    (re.compile(r"^(formations?|education|diplômes?|études|academic)\b", re.IGNORECASE), 3),
+    (re.compile(r"^(certifications?|certificats?)\b", re.IGNORECASE), 3),
+    (re.compile(r"^(langues|languages)\b", re.IGNORECASE), 4),
+    (re.compile(r"^(projets?|projects?|réalisations)\b", re.IGNORECASE), 5),
+    (re.compile(r"^(publications?|bénévolat|volunteer|associations?)\b", re.IGNORECASE), 6),
+    (re.compile(r"^(centres? d'intérêts?|loisirs|hobbies|interests|divers)\b", re.IGNORECASE), 7),
+    (re.compile(r"^(références|references)\b", re.IGNORECASE), 8),
+]
+MAX_HEADING_WORDS = 4
+
+# Completion budget: the JSON output grows with the CV, roughly as much as its text
+OUTPUT_TOKENS_BASE = 600
+OUTPUT_TOKENS_PER_INPUT_TOKEN = 1.0
+# Tokens of the chat format around the messages
+MESSAGE_OVERHEAD_TOKENS = 16
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def estimate_tokens(text: str, model: str) -> int:
+    """Token count of `text` for `model` (tiktoken when installed, else from its length)."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _line_key(line: str) -> str:
+    # Le numéro de page (« - page 2/3 ») ne distingue pas deux en-têtes identiques
+    return PAGE_COUNTER.sub("", line.lower())
+
+
+def _clean_line(line: str) -> str:
+    line = unicodedata.normalize("NFKC", PDF_ARTIFACTS.sub("", line))
+    line = " ".join(line.split())
+    line = BULLET.sub("- ", line)
+    if "|" in line:
+        # Cellules de tableaux DOCX : les cellules fusionnées répètent le même texte
+        cells = [cell for cell in PIPES.split(line) if cell]
+        line = " | ".join(cell for i, cell in enumerate(cells) if i == 0 or cell != cells[i - 1])
+    return line
+
+
+def normalize_cv_text(text: str) -> str:
+    """
+    Remove what costs tokens without informing the parser: headers and footers repeated
+    on several pages, page numbers, boilerplate lines, extraction artifacts, whitespace
+    runs, repeated table cells and consecutive duplicate lines.
+    """
+    pages = [[_clean_line(line) for line in page.splitlines()] for page in text.split(PAGE_BREAK)]
+    pages = [[line for line in page if line] for page in pages]
+
+    running = set()
+    if len(pages) > 1:
+        edges = Counter()
+        for page in pages:
+            # Pages courtes : une fenêtre plus étroite, pour ne pas prendre le contenu pour un en-tête
+            edge = min(PAGE_EDGE_LINES, len(page) // 4)
+            if edge:
+                edges.update({_line_key(line) for line in page[:edge] + page[-edge:]})
+        running = {key for key, count in edges.items() if count > 1}
+
+    lines: List[str] = []
+    seen_running = set()
+    for page in pages:
+        for line in page:
+            if PAGE_NUMBER.match(line) or any(pattern.match(line) for pattern in BOILERPLATE):
+                continue
+            key = _line_key(line)
+            if key in running:
+                # En-tête/pied de page : seule la première occurrence est gardée
+                if key in seen_running:
+                    continue
+                seen_running.add(key)
+            if lines and lines[-1] == line:
+                continue
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _section_priority(line: str) -> Optional[int]:
+    heading = line.strip(" -:•").strip()
+    if len(heading.split()) > MAX_HEADING_WORDS:
+        return None
+    for pattern, priority in SECTION_PRIORITIES:
+        if pattern.match(heading):
+            return priority
+    return None
+
+
+def fit_to_budget(text: str, budget: int, model: str) -> Tuple[str, bool]:
+    """
+    Cut `text` to `budget` tokens, section by section: the lines before the first
+    heading (identity, contact, summary) are kept, then the ends of the least useful
+    sections (references, interests... down to experience) are dropped first.
+    Returns the text and whether it was cut.
+    """
+    if budget <= 0 or estimate_tokens(text, model) <= budget:
+        return text, False
+
+    sections: List[Tuple[int, List[str]]] = [(0, [])]
+    for line in text.split("\n"):
+        priority = _section_priority(line)
+        if priority is not None:
+            sections.append((priority, [line]))
+        else:
+            sections[-1][1].append(line)
+
+    # +1 : le saut de ligne
+    costs = [[estimate_tokens(line, model) + 1 for line in lines] for _, lines in sections]
+    total = sum(sum(section) for section in costs)
+    keep = [len(lines) for _, lines in sections]
+    order = sorted(range(1, len(sections)), key=lambda i: (-sections[i][0], -i))
+    for i in order + [0]:
+        while keep[i] and total > budget:
+            keep[i] -= 1
+            total -= costs[i][keep[i]]
+        if total <= budget:
+            break
+
+    kept = [line for (_, lines), count in zip(sections, keep) for line in lines[:count]]
+    return "\n".join(kept), True
+
+
+class CondensationMetrics:
+    """Tokens sent to the parsing LLM before/after condensation, for the admin endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.files = 0
+        self.truncated = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def record(self, tokens_before: int, tokens_after: int, truncated: bool):
+        with self._lock:
+            self.files += 1
+            self.truncated += truncated
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "tokenizer": "tiktoken" if tiktoken is not None else f"estimate ({CHARS_PER_TOKEN} chars/token)",
+                "input_token_budget": settings.CV_PARSE_INPUT_TOKEN_BUDGET,
+                "files": self.files,
+                "truncated_files": self.truncated,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "saved_ratio": round(saved / self.tokens_before, 3) if self.tokens_before else 0.0,
+            }
+
+
+# Global metrics instance (per worker process)
+condensation_metrics = CondensationMetrics()
+
+
+def condense_cv_text(text: str, model: str) -> Dict[str, Any]:
+    """
+    Normalised text of a CV cut to CV_PARSE_INPUT_TOKEN_BUDGET tokens, with its token
+    counts before and after (recorded in `condensation_metrics`).
+    """
+    tokens_before = estimate_tokens(text, model)
+    condensed, truncated = fit_to_budget(normalize_cv_text(text), settings.CV_PARSE_INPUT_TOKEN_BUDGET, model)
+    tokens_after = estimate_tokens(condensed, model)
+    condensation_metrics.record(tokens_before, tokens_after, truncated)
+    saved = tokens_before - tokens_after
+    logger.info(f"✂️ CV text condensed: {tokens_before} → {tokens_after} tokens "
+                f"({saved} saved, {saved / tokens_before:.0%}){' [truncated]' if truncated else ''}"
+                if tokens_before else "CV text is empty after condensation")
+    return {"text": condensed, "tokens_before": tokens_before, "tokens_after": tokens_after, "truncated": truncated}
+
+
+def completion_token_budget(input_tokens: int, prompt_tokens: int) -> int:
+    """
+    `max_tokens` of the parsing call: enough for the JSON of a CV of `input_tokens`
+    tokens, between CV_PARSE_MIN/MAX_OUTPUT_TOKENS and within the context window.
+    """
+    wanted = OUTPUT_TOKENS_BASE + int(input_tokens * OUTPUT_TOKENS_PER_INPUT_TOKEN)
+    wanted = max(settings.CV_PARSE_MIN_OUTPUT_TOKENS, min(settings.CV_PARSE_MAX_OUTPUT_TOKENS, wanted))
+    available = settings.CV_PARSE_CONTEXT_WINDOW - prompt_tokens - input_tokens - MESSAGE_OVERHEAD_TOKENS
+    return max(1, min(wanted, available))
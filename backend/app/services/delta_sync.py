@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.sync_watermark import SyncWatermark
+from app.services.bulk_indexer import BulkIndexer
+from app.services.elasticsearch_service import ElasticsearchService, iter_candidate_chunks
+from app.services.search_cache import bump_index_generation
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Watermark of the candidates search index
+CANDIDATES_INDEX_WATERMARK = "candidates_index"
+
+
+def get_watermark(db: Session, name: str = CANDIDATES_INDEX_WATERMARK) -> Optional[SyncWatermark]:
+    return db.query(SyncWatermark).filter(SyncWatermark.name == name).first()
+
+
+def advance_watermark(db: Session, value: datetime, stats: Optional[dict] = None, name: str = CANDIDATES_INDEX_WATERMARK):
+    """Record a successful sync point (the caller commits)."""
+    db.execute(pg_insert(SyncWatermark.__table__).values(name=name).on_conflict_do_nothing(index_elements=["name"]))
+    state = db.query(SyncWatermark).filter(SyncWatermark.name == name).with_for_update().one()
+    state.watermark = value
+    state.last_run_at = value
+    if stats is not None:
+        state.last_run_stats = json.dumps(stats)
+
+
+def run_delta_sync(chunk_size: Optional[int] = None, name: str = CANDIDATES_INDEX_WATERMARK) -> Optional[dict]:
+    """
+    Reindex only the candidates modified since the last successful watermark.
+
+    The watermark row is locked with SKIP LOCKED for the whole run, so when several
+    workers schedule the job only one of them does the work. The new watermark is the
+    database time at which the run started, and the next run looks back an extra
+    DELTA_SYNC_OVERLAP_SECONDS to cover transactions that committed late. A run with
+    failures keeps the previous watermark so nothing is skipped.
+
+    Returns the run statistics, or None when skipped.
+    """
+    es_service = ElasticsearchService()
+    if not es_service.es_available:
+        logger.info("OpenSearch is not available, skipping delta sync")
+        return None
+
+    chunk_size = chunk_size or settings.DELTA_SYNC_CHUNK_SIZE
+    lock_db = SessionLocal()
+    read_db = SessionLocal()
+    try:
+        lock_db.execute(pg_insert(SyncWatermark.__table__).values(name=name).on_conflict_do_nothing(index_elements=["name"]))
+        lock_db.commit()
+
+        state = lock_db.query(SyncWatermark).filter(SyncWatermark.name == name).with_for_update(skip_locked=True).first()
+        if state is None:
+            logger.info(f"Delta sync '{name}' already running in another worker, skipping")
+            lock_db.rollback()
+            return None
+
+        # now() = début de la transaction, donc antérieur à toutes les lectures qui suivent
+        run_started = lock_db.query(func.now()).scalar()
+        since = None
+        if state.watermark is not None:
+            since = state.watermark - timedelta(seconds=settings.DELTA_SYNC_OVERLAP_SECONDS)
+        logger.info(f"🔄 Delta sync '{name}': candidates modified since {since.isoformat() if since else 'the beginning'}")
+
+        start = time.perf_counter()
+        indexer = BulkIndexer(es_service.es, es_service.index_name)
+        result = {"since": since.isoformat() if since else None, "candidates": 0, "indexed": 0, "failed_ids": []}
+        for chunk in iter_candidate_chunks(read_db, chunk_size=chunk_size, since=since):
+            stats = indexer.index(es_service.candidate_actions(chunk), disable_refresh=False)
+            result["candidates"] += len(chunk)
+            result["indexed"] += stats["indexed"]
+            result["failed_ids"].extend(stats["failed_ids"])
+        result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        if result["indexed"]:
+            bump_index_generation()
+
+        state.last_run_at = run_started
+        state.last_run_stats = json.dumps(result)
+        if result["failed_ids"]:
+            logger.warning(f"Delta sync '{name}': {len(result['failed_ids'])} failures, watermark kept at {state.watermark}")
+        else:
+            state.watermark = run_started
+        lock_db.commit()
+
+        logger.info(f"✅ Delta sync '{name}': {result['indexed']}/{result['candidates']} candidates reindexed "
+                    f"in {result['elapsed_seconds']}s")
+        return result
+
+    except Exception:
+        lock_db.rollback()
+        raise
+    finally:
+        read_db.close()
+        lock_db.close()
+
+
+class DeltaSyncScheduler:
+    def __init__(self):
+        self.is_running = False
+        self.sync_interval = settings.DELTA_SYNC_INTERVAL
+        self.last_sync = None
+        self.last_result = None
+
+    async def start_auto_sync(self):
+        """Start the periodic delta reindex"""
+        if self.is_running:
+            logger.info("Delta sync scheduler already running")
+            return
+        if self.sync_interval <= 0:
+            logger.info("Delta sync scheduler disabled (DELTA_SYNC_INTERVAL=0)")
+            return
+
+        self.is_running = True
+        logger.info(f"🚀 Starting candidates delta sync scheduler (every {self.sync_interval}s)")
+
+        # Laisse l'application démarrer avant la première synchronisation
+        await asyncio.sleep(60)
+
+        while self.is_running:
+            try:
+                await self.perform_sync()
+                await asyncio.sleep(self.sync_interval)
+            except Exception as e:
+                logger.error(f"❌ Delta sync error: {e}")
+                await asyncio.sleep(60)
+
+    def stop_auto_sync(self):
+        """Stop the periodic delta reindex"""
+        self.is_running = False
+        logger.info("🛑 Stopping candidates delta sync scheduler")
+
+    async def perform_sync(self):
+        result = await asyncio.to_thread(run_delta_sync)
+        if result is not None:
+            self.last_sync = datetime.now()
+            self.last_result = result
+        return result
+
+
+# Global scheduler instance
+delta_sync_scheduler = DeltaSyncScheduler()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.candidate import Resume
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Extension given to the file handed to LibreOffice, which guesses the import filter from it
+RENDER_SUFFIXES = {
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'application/msword': '.doc',
+}
+
+
+class DocxRenderer:
+    """
+    PDF rendition of the resumes stored as Word files, produced the first time they are
+    viewed instead of at upload time.
+
+    Conversions run headless LibreOffice, at most CV_DOCX_RENDER_WORKERS at once. Each
+    worker slot owns its LibreOffice user profile: it is created by the first conversion
+    of the slot and reused afterwards (a warm profile skips the first-start setup, and
+    concurrent soffice processes cannot share one). The rendition is stored in
+    `Resume.pdf_file`; concurrent views of the same resume wait for a single conversion.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = max(1, workers or settings.CV_DOCX_RENDER_WORKERS)
+        self.binary = settings.CV_DOCX_RENDER_BINARY or shutil.which("soffice") or shutil.which("libreoffice")
+        self._slots: Optional[asyncio.Queue] = None
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._processes: Set[asyncio.subprocess.Process] = set()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.binary)
+
+    def _get_slots(self) -> asyncio.Queue:
+        # Créée à la première conversion, dans la boucle d'événements de l'application
+        if self._slots is None:
+            self._slots = asyncio.Queue()
+            for slot in range(self.workers):
+                self._slots.put_nowait(slot)
+        return self._slots
+
+    def _profile_dir(self, slot: int) -> str:
+        base = settings.CV_DOCX_RENDER_PROFILE_DIR or os.path.join(tempfile.gettempdir(), "cv-render-profiles")
+        return os.path.join(base, f"slot-{slot}")
+
+    async def render(self, data: bytes, file_type: str) -> bytes:
+        """Convert a Word file to PDF. Raises ValueError when it cannot be converted."""
+        if not self.available:
+            raise ValueError("LibreOffice (soffice) is not installed")
+        suffix = RENDER_SUFFIXES.get(file_type)
+        if suffix is None:
+            raise ValueError(f"Cannot render {file_type} to PDF")
+
+        slots = self._get_slots()
+        slot = await slots.get()
+        try:
+            return await self._convert(slot, data, suffix)
+        finally:
+            slots.put_nowait(slot)
+
+    async def _convert(self, slot: int, data: bytes, suffix: str) -> bytes:
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="cv-render-", dir=settings.CV_UPLOAD_TMP_DIR or None) as workdir:
+            source = os.path.join(workdir, f"resume{suffix}")
+            await asyncio.to_thread(Path(source).write_bytes, data)
+            process = await asyncio.create_subprocess_exec(
+                self.binary,
+                f"-env:UserInstallation={Path(self._profile_dir(slot)).as_uri()}",
+                "--headless", "--norestore", "--nolockcheck", "--nodefault",
+                "--convert-to", "pdf", "--outdir", workdir, source,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            self._processes.add(process)
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=settings.CV_DOCX_RENDER_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise ValueError(f"PDF rendition exceeded {settings.CV_DOCX_RENDER_TIMEOUT}s")
+            finally:
+                self._processes.discard(process)
+
+            target = os.path.join(workdir, "resume.pdf")
+            if process.returncode != 0 or not os.path.exists(target):
+                raise ValueError(f"LibreOffice conversion failed ({process.returncode}): "
+                                 f"{stderr.decode('utf-8', 'replace').strip()[-500:]}")
+            pdf = await asyncio.to_thread(Path(target).read_bytes)
+        if not pdf:
+            raise ValueError("LibreOffice conversion produced an empty PDF")
+        logger.info(f"📄 Rendered {suffix} resume to PDF ({len(pdf)} bytes) in {time.perf_counter() - start:.2f}s (slot {slot})")
+        return pdf
+
+    async def resume_pdf(self, resume_id: int, data: bytes, file_type: str) -> bytes:
+        """Render a stored resume and keep the rendition, once per resume even for concurrent views."""
+        task = self._inflight.get(resume_id)
+        if task is None:
+            task = asyncio.ensure_future(self._render_and_store(resume_id, data, file_type))
+            self._inflight[resume_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(resume_id, None))
+        # Une requête annulée n'interrompt pas la conversion attendue par les autres
+        return await asyncio.shield(task)
+
+    async def _render_and_store(self, resume_id: int, data: bytes, file_type: str) -> bytes:
+        pdf = await self.render(data, file_type)
+        await asyncio.to_thread(self._store, resume_id, pdf)
+        return pdf
+
+    def _store(self, resume_id: int, pdf: bytes):
+        try:
+            db = SessionLocal()
+            try:
+                db.query(Resume).filter(Resume.id == resume_id).update(
+                    {Resume.pdf_file: pdf}, synchronize_session=False
+                )
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Could not store PDF rendition of resume {resume_id}: {str(e)}")
+
+    def stop(self):
+        """Kill the conversions still running (application shutdown)."""
+        for process in list(self._processes):
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        self._processes.clear()
+
+
+# Global renderer instance
+docx_renderer = DocxRenderer()
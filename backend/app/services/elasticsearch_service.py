@@ -1,51 +1,228 @@
+import base64
+import copy
+import hashlib
+import json
 import logging
+import re
 import time
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from app.models.candidate import Candidate
 from app.models.job import Job
 from app.database.postgresql import SessionLocal
-import os
+from app.config.settings import settings
+from app.services.opensearch_client import get_opensearch_client, get_cluster_health_monitor
+from app.services.search_cache import search_result_cache, bump_index_generation
+from app.services.local_search import local_search_index, is_intern_title
+from app.services.vector_index import vector_index, embed_job, reciprocal_rank_fusion
+from app.services.search_metrics import search_metrics
 from opensearchpy import OpenSearch, RequestError, TransportError, ConnectionError as OSConnectionError
-from opensearchpy.helpers import bulk
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
+# Relationships serialized into the candidate document
+CANDIDATE_INDEX_RELATIONSHIPS = (
+    Candidate.phone_numbers,
+    Candidate.languages,
+    Candidate.hard_skills,
+    Candidate.soft_skills,
+    Candidate.degrees,
+    Candidate.certifications,
+    Candidate.experiences,
+    Candidate.projects,
+    Candidate.awards_publications,
+    Candidate.suggested_jobs,
+)
+
+# External version of delete actions: a deleted candidate never comes back (ids are not
+# reused), so its delete outranks every version of its document
+DELETED_DOCUMENT_VERSION = 2 ** 62
+
+def candidate_index_load_options():
+    """Query options loading every indexed relationship with one SELECT ... IN per relationship."""
+    return [selectinload(relationship) for relationship in CANDIDATE_INDEX_RELATIONSHIPS]
+
+def candidate_index_query(db, since=None, ids=None):
+    """Candidates selected for indexing, optionally restricted to those changed since a date or to an id list."""
+    query = db.query(Candidate)
+    if since is not None:
+        query = query.filter(Candidate.updated_at >= since)
+    if ids:
+        query = query.filter(Candidate.id.in_(ids))
+    return query
+
+def iter_candidate_chunks(db, chunk_size=1000, after_id=0, since=None, ids=None):
+    """
+    Yield candidates in id order, `chunk_size` rows at a time, with every indexed
+    relationship batch-loaded. Paging is keyset based (id > last id) so each chunk
+    is one short query whatever the table size, and the session is emptied between
+    chunks so memory stays bounded by a single chunk.
+    """
+    last_id = after_id or 0
+    while True:
+        chunk = (
+            candidate_index_query(db, since=since, ids=ids)
+            .options(*candidate_index_load_options())
+            .filter(Candidate.id > last_id)
+            .order_by(Candidate.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        yield chunk
+        # Objets détachés : l'appelant a fini avec ce chunk puisqu'il demande le suivant
+        db.expunge_all()
+
+def experience_years(duration):
+    """Years of one experience: stored as a float string, older rows as "4 ans" / "6 mois"."""
+    if not duration:
+        return 0.0
+    try:
+        return max(float(duration), 0.0)
+    except (TypeError, ValueError):
+        pass
+    match = re.search(r'(\d+(?:[.,]\d+)?)\s*(years?|ans?|months?|mois)', str(duration).lower())
+    if not match:
+        return 0.0
+    value = float(match.group(1).replace(",", "."))
+    return value if match.group(2).startswith(("year", "an")) else round(value / 12.0, 2)
+
+# Job titles excluded by the v1 job query (v2 indices carry a precomputed `is_intern`)
+LEGACY_INTERN_QUERY = "stagiaire stage intern étudiant student alternance alternant Élève"
+
+# Physical index → (checked_at, has the v1 nested mapping)
+_LEGACY_MAPPING_CACHE = {}
+LEGACY_MAPPING_CACHE_TTL = 60
+
+# Fields needed to build a job match result and its match reason
+JOB_MATCH_SOURCE = ["id", "name", "email", "job_title", "hard_skills", "experiences.job_title", "experiences.duration"]
+
+# Fields returned with job match results: explanations come from the query itself
+JOB_MATCH_RESULT_SOURCE = ["id", "name", "email", "job_title"]
+
+# Terms that matched, reported by OpenSearch (whole field values, matches wrapped in <em>)
+JOB_MATCH_HIGHLIGHT = {
+    "require_field_match": False,
+    "fields": {
+        "job_title": {"number_of_fragments": 0},
+        "hard_skills": {"number_of_fragments": 0},
+    }
+}
+
+_HIGHLIGHT_TERM_RE = re.compile(r"<em>(.*?)</em>")
+
+def highlighted_terms(fragments):
+    """Distinct matched terms of highlight fragments, in order."""
+    terms = []
+    for fragment in fragments or []:
+        for term in _HIGHLIGHT_TERM_RE.findall(fragment):
+            if term.lower() not in (t.lower() for t in terms):
+                terms.append(term)
+    return terms
+
+def _strip_highlight(fragment):
+    return fragment.replace("<em>", "").replace("</em>", "")
+
+# Fields returned by the candidate search listing
+CANDIDATE_SEARCH_SOURCE = ["id", "name", "email", "job_title", "country", "created_at", "total_experience_years"]
+
+def encode_search_cursor(sort_values):
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode("utf-8")).decode("ascii")
+
+def decode_search_cursor(cursor):
+    """Opaque cursor → search_after values (ValueError when malformed)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+COMMON_POSITION_TERMS = [
+    "senior", "junior", "consultant", "engineer", "manager", "director", 
+    "lead", "chief", "head", "expert", "specialist", "analyste", "analyst", 
+    "développeur", "developer", "architecte", "architect"
+]
+
+def extract_domain_terms(text):
+    """Split a job title into (position terms, domain terms)."""
+    if not text:
+        return [], []
+    
+    words = text.lower().split()
+    position_terms = [w for w in words if w in COMMON_POSITION_TERMS]
+    
+    domain_terms = []
+    for i in range(len(words)-1):
+        if words[i] == "en" and i < len(words)-1:
+            domain_phrase = " ".join(words[i+1:])
+            domain_terms.append(domain_phrase)
+            break
+    
+    if not domain_terms:
+        domain_terms = [w for w in words if w not in COMMON_POSITION_TERMS and w not in ["en", "de", "du", "des", "et", "a", "le", "la", "les"]]
+    
+    return position_terms, domain_terms
+
+# Bump when build_job_match_query changes: stored profiles are then rebuilt on use
+SEARCH_PROFILE_VERSION = 3
+
+def normalize_skills(skills):
+    """Lowercased, trimmed, de-duplicated skill names (order kept)."""
+    normalized = []
+    for skill in skills or []:
+        name = skill.get("name") if isinstance(skill, dict) else skill
+        name = str(name or "").strip().lower()
+        if name and name not in normalized:
+            normalized.append(name)
+    return normalized
+
+def build_job_search_profile(job_title, competence_phare, skills=None):
+    """
+    Precompiled search profile of a job: extracted terms, normalised skills and the
+    ready-to-send bool query. Stored on the job so suggestions skip query building
+    and the exact query of each job can be inspected and benchmarked.
+    """
+    job_title = job_title or ""
+    competence_phare = competence_phare or ""
+    bool_query, position_terms, domain_terms = ElasticsearchService.build_job_match_query(job_title, competence_phare)
+    return {
+        "version": SEARCH_PROFILE_VERSION,
+        "job_title": job_title,
+        "competence_phare": competence_phare,
+        "position_terms": position_terms,
+        "domain_terms": domain_terms,
+        "skills": normalize_skills(skills),
+        "query": bool_query,
+        "fingerprint": hashlib.sha256(json.dumps(bool_query, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest(),
+        "built_at": datetime.now().isoformat(),
+    }
+
+def current_search_profile(profile, job_title, competence_phare):
+    """The stored profile if it still matches the job fields and the query version, else None."""
+    if not profile or profile.get("version") != SEARCH_PROFILE_VERSION:
+        return None
+    if profile.get("job_title") != (job_title or "") or profile.get("competence_phare") != (competence_phare or ""):
+        return None
+    return profile
+
 class ElasticsearchService:
     def __init__(self, host=None):
-        self.index_name = "candidates"
-        self.es_available = True
+        self.index_name = settings.ELASTICSEARCH_INDEX_CANDIDATES
         
-        # Configuration OpenSearch/Bonsai
-        elasticsearch_url = host or os.getenv("ELASTICSEARCH_URL", "https://orelservices-search-7419791421.us-east-1.bonsaisearch.net:443")
-        username = os.getenv("ELASTICSEARCH_USERNAME", "tgs5qdc5ph")
-        password = os.getenv("ELASTICSEARCH_PASSWORD", "j5qcp06xrl")
+        # ✅ Client OpenSearch partagé (un pool de connexions keep-alive par worker)
+        self.es = get_opensearch_client(host)
         
-        try:
-            # ✅ Client OpenSearch natif
-            self.es = OpenSearch(
-                hosts=[elasticsearch_url],
-                http_auth=(username, password),
-                timeout=30,
-                max_retries=3,
-                retry_on_timeout=True,
-                use_ssl=True,
-                verify_certs=True,
-                ssl_show_warn=False,
-                headers={'Content-Type': 'application/json'},
-            )
-            
-            # Test de connexion
-            info = self.es.info()
-            logger.info(f"✅ Connected to OpenSearch: {info.get('version', {}).get('number', 'Unknown')} at {elasticsearch_url}")
-            
-            # Test de santé du cluster
-            health = self.es.cluster.health()
-            logger.info(f"Cluster health: {health['status']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to connect to OpenSearch: {str(e)}")
-            self.es_available = False
+        # Santé du cluster mise en cache, rafraîchie en arrière-plan
+        self.health = get_cluster_health_monitor(host)
+        self.es_available = self.health.is_available()
+        
+        if not self.es_available:
+            logger.warning(f"OpenSearch unavailable (cached health check): {self.health.snapshot().get('error')}")
             self.es = self._create_dummy_es()
     
     def _create_dummy_es(self):
@@ -111,146 +288,232 @@ class ElasticsearchService:
         except Exception as e:
             logger.error(f"Error during cluster recovery attempt: {str(e)}")
 
-    def create_index(self):
-        if not self.es_available:
-            logger.info("OpenSearch is not available, skipping index creation")
-            return False
-            
-        try:
-            index_body = {
-                "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0,
-                    "analysis": {
-                        "analyzer": {
-                            "custom_analyzer": {
-                                "type": "standard",
-                                "stopwords": "_english_"
-                            }
+    def candidate_index_body(self):
+        """
+        Settings and mapping of a physical candidates index.
+
+        Skills and languages are plain keyword arrays (lowercase normalized) copied into
+        one `skills_text` field for full text; only degrees and experiences stay nested,
+        where the fields of one item must match together. Display-only fields are
+        neither indexed nor given doc values, and `is_intern` is computed at indexing
+        time so the job query excludes interns with a term instead of a text match.
+        """
+        display_keyword = {"type": "keyword", "index": False, "doc_values": False}
+        display_text = {"type": "text", "index": False}
+        return {
+            "settings": {
+                "number_of_shards": 1,
+                "number_of_replicas": 0,
+                "analysis": {
+                    "analyzer": {
+                        "custom_analyzer": {
+                            "type": "standard",
+                            "stopwords": "_english_"
+                        }
+                    },
+                    "normalizer": {
+                        "lowercase_normalizer": {
+                            "type": "custom",
+                            "filter": ["lowercase"]
                         }
                     }
-                },
-                "mappings": {
-                    "properties": {
-                        "id": {"type": "integer"},
-                        "name": {"type": "text", "analyzer": "custom_analyzer"},
-                        "email": {"type": "keyword"},
-                        "job_title": {"type": "text"},
-                        "github": {"type": "keyword"},
-                        "linkedin": {"type": "keyword"},
-                        "other_links": {"type": "object"},
-                        "country": {"type": "keyword"},
-                        "nationalities": {"type": "keyword"},
-                        "date_of_birth": {"type": "keyword"},
-                        "gender": {"type": "keyword"},
-                        "marital_status": {"type": "keyword"},
-                        "created_at": {"type": "date"},
-                        "phone_numbers": {
-                            "type": "nested",
-                            "properties": {
-                                "number": {"type": "keyword"},
-                                "isd_code": {"type": "keyword"},
-                                "original_number": {"type": "keyword"},
-                                "formatted_number": {"type": "keyword"},
-                                "phone_type": {"type": "keyword"},
-                                "location": {"type": "keyword"}
-                            }
-                        },
-                        "languages": {
-                            "type": "nested",
-                            "properties": {
-                                "name": {"type": "keyword"}
-                            }
-                        },
-                        "hard_skills": {
-                            "type": "nested",
-                            "properties": {
-                                "name": {"type": "keyword"}
-                            }
-                        },
-                        "soft_skills": {
-                            "type": "nested",
-                            "properties": {
-                                "name": {"type": "keyword"}
-                            }
-                        },
-                        "degrees": {
-                            "type": "nested",
-                            "properties": {
-                                "degree_name": {"type": "text"},
-                                "normalize_degree": {"type": "text"},
-                                "specialization": {"type": "text"},
-                                "date": {"type": "keyword"},
-                                "country_or_institute": {"type": "keyword"}
-                            }
-                        },
-                        "certifications": {
-                            "type": "nested",
-                            "properties": {
-                                "certification_name": {"type": "text"},
-                                "issuing_organization": {"type": "text"},
-                                "issue_date": {"type": "keyword"}
-                            }
-                        },
-                        "experiences": {
-                            "type": "nested",
-                            "properties": {
-                                "job_title": {"type": "text"},
-                                "company": {"type": "text"},
-                                "location": {"type": "keyword"},
-                                "start_date": {"type": "keyword"},
-                                "end_date": {"type": "keyword"},
-                                "duration": {"type": "keyword"},
-                                "responsibilities": {"type": "text"},
-                                "achievements": {"type": "text"},
-                                "tools_technologies": {"type": "keyword"},
-                                "team_size": {"type": "keyword"},
-                                "relevance_score": {"type": "keyword"}
-                            }
-                        },
-                        "projects": {
-                            "type": "nested",
-                            "properties": {
-                                "project_name": {"type": "text"},
-                                "description": {"type": "text"},
-                                "technologies_used": {"type": "keyword"},
-                                "role": {"type": "text"},
-                                "period": {"type": "keyword"},
-                                "url": {"type": "keyword"}
-                            }
-                        },
-                        "awards_publications": {
-                            "type": "nested",
-                            "properties": {
-                                "type": {"type": "keyword"},
-                                "title": {"type": "text"},
-                                "description": {"type": "text"},
-                                "date": {"type": "keyword"},
-                                "publisher_issuer": {"type": "text"},
-                                "url": {"type": "keyword"}
-                            }
-                        },
-                        "suggested_jobs": {
-                            "type": "nested",
-                            "properties": {
-                                "job_title": {"type": "text"}
-                            }
+                }
+            },
+            "mappings": {
+                "properties": {
+                    "id": {"type": "integer"},
+                    "name": {"type": "text", "analyzer": "custom_analyzer"},
+                    "email": {"type": "keyword"},
+                    "job_title": {"type": "text"},
+                    "is_intern": {"type": "boolean"},
+                    "github": display_keyword,
+                    "linkedin": display_keyword,
+                    "other_links": {"type": "object", "enabled": False},
+                    "country": {"type": "keyword"},
+                    "nationalities": {"type": "keyword"},
+                    "date_of_birth": display_keyword,
+                    "gender": {"type": "keyword"},
+                    "marital_status": display_keyword,
+                    "created_at": {"type": "date"},
+                    "total_experience_years": {"type": "float"},
+                    "phone_numbers": {"type": "object", "enabled": False},
+                    "languages": {"type": "keyword", "normalizer": "lowercase_normalizer"},
+                    "hard_skills": {"type": "keyword", "normalizer": "lowercase_normalizer", "copy_to": "skills_text"},
+                    "soft_skills": {"type": "keyword", "normalizer": "lowercase_normalizer", "copy_to": "skills_text"},
+                    "skills_text": {"type": "text"},
+                    "degrees": {
+                        "type": "nested",
+                        "properties": {
+                            "degree_name": {"type": "text"},
+                            "normalize_degree": {"type": "text"},
+                            "specialization": {"type": "text"},
+                            "date": display_keyword,
+                            "country_or_institute": {"type": "keyword"}
+                        }
+                    },
+                    "certifications": {
+                        "properties": {
+                            "certification_name": {"type": "text"},
+                            "issuing_organization": {"type": "text"},
+                            "issue_date": display_keyword
+                        }
+                    },
+                    "experiences": {
+                        "type": "nested",
+                        "properties": {
+                            "job_title": {"type": "text"},
+                            "company": {"type": "text"},
+                            "location": display_keyword,
+                            "start_date": display_keyword,
+                            "end_date": display_keyword,
+                            "duration": display_keyword,
+                            "responsibilities": display_text,
+                            "achievements": display_text,
+                            "tools_technologies": {"type": "keyword"},
+                            "team_size": display_keyword,
+                            "relevance_score": display_keyword
+                        }
+                    },
+                    "projects": {
+                        "properties": {
+                            "project_name": {"type": "text"},
+                            "description": display_text,
+                            "technologies_used": {"type": "keyword"},
+                            "role": {"type": "text"},
+                            "period": display_keyword,
+                            "url": display_keyword
+                        }
+                    },
+                    "awards_publications": {
+                        "properties": {
+                            "type": {"type": "keyword"},
+                            "title": {"type": "text"},
+                            "description": display_text,
+                            "date": display_keyword,
+                            "publisher_issuer": display_text,
+                            "url": display_keyword
+                        }
+                    },
+                    "suggested_jobs": {
+                        "properties": {
+                            "job_title": {"type": "text"}
                         }
                     }
                 }
             }
+        }
 
-            if self.es.indices.exists(index=self.index_name):
-                logger.info(f"Index {self.index_name} exists, deleting to ensure proper settings.")
-                self.es.indices.delete(index=self.index_name)
-                logger.info(f"Index {self.index_name} deleted successfully.")
+    # ------------------------------------------------------------------ #
+    # Versioned indices behind the read alias
+    # ------------------------------------------------------------------ #
+    def versioned_index_name(self, version):
+        return f"{self.index_name}_v{version}"
+
+    def list_index_versions(self):
+        """Physical indices `{alias}_v{n}` sorted by version: [(n, name), ...]."""
+        prefix = f"{self.index_name}_v"
+        try:
+            indices = self.es.indices.get(index=f"{prefix}*", ignore_unavailable=True, allow_no_indices=True)
+        except Exception as e:
+            logger.error(f"Error listing index versions: {str(e)}")
+            return []
+        versions = []
+        for name in indices:
+            suffix = name[len(prefix):]
+            if suffix.isdigit():
+                versions.append((int(suffix), name))
+        return sorted(versions)
+
+    def current_index(self):
+        """Physical index currently served under the alias (None if nothing exists yet)."""
+        if self.es.indices.exists_alias(name=self.index_name):
+            targets = list(self.es.indices.get_alias(name=self.index_name).keys())
+            return targets[0] if targets else None
+        if self.es.indices.exists(index=self.index_name):
+            # Ancien index physique créé avant le passage aux alias
+            return self.index_name
+        return None
+
+    def create_versioned_index(self, version=None):
+        """Create the next `{alias}_v{n}` index with the current mapping, without touching the alias."""
+        if version is None:
+            versions = self.list_index_versions()
+            version = versions[-1][0] + 1 if versions else 1
+        name = self.versioned_index_name(version)
+        self.es.indices.create(index=name, body=self.candidate_index_body())
+        self.es.cluster.health(index=name, wait_for_status="yellow", timeout=60)
+        logger.info(f"Index {name} created and ready")
+        return name
+
+    def swap_alias(self, new_index):
+        """
+        Point the alias at `new_index` in a single update_aliases call, so readers go
+        straight from the old index to the new one. A legacy concrete index holding the
+        alias name is removed in the same atomic call.
+        """
+        actions = []
+        current = self.current_index()
+        if current == self.index_name:
+            actions.append({"remove_index": {"index": self.index_name}})
+        elif current:
+            actions.append({"remove": {"index": current, "alias": self.index_name}})
+        actions.append({"add": {"index": new_index, "alias": self.index_name}})
+        self.es.indices.update_aliases(body={"actions": actions})
+        bump_index_generation()
+        logger.info(f"✅ Alias {self.index_name} now points to {new_index} (was {current or 'nothing'})")
+        return current
+
+    def gc_index_versions(self, keep=None):
+        """Delete old versions that are not behind the alias, keeping the `keep` most recent ones for rollback."""
+        keep = settings.ELASTICSEARCH_INDEX_VERSIONS_TO_KEEP if keep is None else keep
+        current = self.current_index()
+        previous = [name for _, name in self.list_index_versions() if name != current]
+        to_delete = previous[:-keep] if keep > 0 else previous
+        for name in to_delete:
+            try:
+                self.es.indices.delete(index=name)
+                logger.info(f"Old index version {name} deleted")
+            except Exception as e:
+                logger.error(f"Error deleting old index version {name}: {str(e)}")
+        return to_delete
+
+    def verify_index_count(self, index, expected):
+        """Compare the document count of `index` with the number of candidates in Postgres."""
+        self.es.indices.refresh(index=index)
+        actual = self.es.count(index=index)["count"]
+        if actual != expected:
+            logger.error(f"Index {index} holds {actual} documents, Postgres has {expected} candidates")
+            return False
+        logger.info(f"Index {index} verified: {actual} documents")
+        return True
+
+    def finalize_rebuild(self, new_index, expected_count, force=False):
+        """Verify a freshly loaded index, swap the alias onto it and garbage-collect old versions."""
+        if not self.verify_index_count(new_index, expected_count) and not force:
+            logger.error(f"Alias {self.index_name} left unchanged; {new_index} kept for inspection")
+            return False
+        self.swap_alias(new_index)
+        self.gc_index_versions()
+        return True
+
+    def create_index(self):
+        """
+        Make sure the alias exists. When neither the alias nor a legacy index is
+        present, create `{alias}_v1` and point the alias at it. Never deletes data:
+        mapping changes go through a rebuild (see scripts/index_candidates.py).
+        """
+        if not self.es_available:
+            logger.info("OpenSearch is not available, skipping index creation")
+            return False
             
-            self.es.indices.create(index=self.index_name, body=index_body)
-            logger.info(f"Index {self.index_name} created successfully with 0 replicas")
+        try:
+            current = self.current_index()
+            if current:
+                logger.info(f"Index {self.index_name} already served by {current}")
+                return True
             
-            # ✅ CORRECTION: timeout en secondes (nombre), pas string
-            self.es.cluster.health(index=self.index_name, wait_for_status="yellow", timeout=60)
-            logger.info(f"Index {self.index_name} is ready for operations")
+            new_index = self.create_versioned_index()
+            self.swap_alias(new_index)
             return True
             
         except RequestError as e:
@@ -322,454 +585,522 @@ class ElasticsearchService:
             logger.error(f"Test document indexing failed: {str(e)}")
             return False
 
-    def index_candidate_from_model(self, candidate: Candidate):
-        if not self.es_available:
-            logger.info(f"OpenSearch is not available, skipping indexing for candidate {candidate.id}")
-            return False
-            
+    def uses_legacy_mapping(self, index=None):
+        """
+        True when `index` (default: the alias) still has the v1 nested mapping, which
+        rejects the flattened skill arrays until the index is rebuilt. Cached per process.
+        """
+        index = index or self.index_name
+        cached = _LEGACY_MAPPING_CACHE.get(index)
+        if cached is not None and time.monotonic() - cached[0] < LEGACY_MAPPING_CACHE_TTL:
+            return cached[1]
+        legacy = False
         try:
-            doc = {
-                "id": candidate.id,
-                "name": candidate.name,
-                "email": candidate.email,
-                "job_title": candidate.job_title,
-                "github": candidate.github,
-                "linkedin": candidate.linkedin,
-                "other_links": candidate.other_links,
-                "country": candidate.country,
-                "nationalities": candidate.nationalities,
-                "date_of_birth": candidate.date_of_birth,
-                "gender": candidate.gender,
-                "marital_status": candidate.marital_status,
-                "created_at": candidate.created_at.isoformat() if candidate.created_at else None,
-                "phone_numbers": [
-                    {
-                        "number": pn.number,
-                        "isd_code": pn.isd_code,
-                        "original_number": pn.original_number,
-                        "formatted_number": pn.formatted_number,
-                        "phone_type": pn.phone_type,
-                        "location": pn.location
-                    } for pn in candidate.phone_numbers
-                ],
-                "languages": [{"name": lang.name} for lang in candidate.languages],
-                "hard_skills": [{"name": skill.name} for skill in candidate.hard_skills],
-                "soft_skills": [{"name": skill.name} for skill in candidate.soft_skills],
-                "degrees": [
-                    {
-                        "degree_name": deg.degree_name,
-                        "normalize_degree": deg.normalize_degree,
-                        "specialization": deg.specialization,
-                        "date": deg.date,
-                        "country_or_institute": deg.country_or_institute
-                    } for deg in candidate.degrees
-                ],
-                "certifications": [
-                    {
-                        "certification_name": cert.certification_name,
-                        "issuing_organization": cert.issuing_organization,
-                        "issue_date": cert.issue_date
-                    } for cert in candidate.certifications
-                ],
-                "experiences": [
-                    {
-                        "job_title": exp.job_title,
-                        "company": exp.company,
-                        "location": exp.location,
-                        "start_date": exp.start_date,
-                        "end_date": exp.end_date,
-                        "duration": exp.duration,
-                        "responsibilities": exp.responsibilities,
-                        "achievements": exp.achievements,
-                        "tools_technologies": exp.tools_technologies,
-                        "team_size": exp.team_size,
-                        "relevance_score": exp.relevance_score
-                    } for exp in candidate.experiences
-                ],
-                "projects": [
-                    {
-                        "project_name": proj.project_name,
-                        "description": proj.description,
-                        "technologies_used": proj.technologies_used,
-                        "role": proj.role,
-                        "period": proj.period,
-                        "url": proj.url
-                    } for proj in candidate.projects
-                ],
-                "awards_publications": [
-                    {
-                        "type": ap.type,
-                        "title": ap.title,
-                        "description": ap.description,
-                        "date": ap.date,
-                        "publisher_issuer": ap.publisher_issuer,
-                        "url": ap.url
-                    } for ap in candidate.awards_publications
-                ],
-                "suggested_jobs": [
-                    {"job_title": job.job_title} for job in candidate.suggested_jobs
-                ]
+            mappings = self.es.indices.get_mapping(index=index)
+            for mapping in mappings.values():
+                hard_skills = mapping.get("mappings", {}).get("properties", {}).get("hard_skills", {})
+                legacy = legacy or hard_skills.get("type") == "nested"
+        except Exception as e:
+            logger.warning(f"Could not read mapping of {index}: {str(e)}")
+        _LEGACY_MAPPING_CACHE[index] = (time.monotonic(), legacy)
+        return legacy
+
+    def build_candidate_document(self, candidate: Candidate, legacy=False) -> dict:
+        """
+        Build the OpenSearch document for a candidate (relationships must be loadable).
+        `legacy` shapes skills and languages for a v1 (nested) index.
+        """
+        document = self._candidate_document(candidate)
+        if legacy:
+            for field in ("languages", "hard_skills", "soft_skills"):
+                document[field] = [{"name": name} for name in document[field]]
+        return document
+
+    def _candidate_document(self, candidate: Candidate) -> dict:
+        return {
+            "id": candidate.id,
+            "name": candidate.name,
+            "email": candidate.email,
+            "job_title": candidate.job_title,
+            "github": candidate.github,
+            "linkedin": candidate.linkedin,
+            "other_links": candidate.other_links,
+            "country": candidate.country,
+            "nationalities": candidate.nationalities,
+            "date_of_birth": candidate.date_of_birth,
+            "gender": candidate.gender,
+            "marital_status": candidate.marital_status,
+            "created_at": candidate.created_at.isoformat() if candidate.created_at else None,
+            "total_experience_years": round(sum(experience_years(exp.duration) for exp in candidate.experiences), 2),
+            "phone_numbers": [
+                {
+                    "number": pn.number,
+                    "isd_code": pn.isd_code,
+                    "original_number": pn.original_number,
+                    "formatted_number": pn.formatted_number,
+                    "phone_type": pn.phone_type,
+                    "location": pn.location
+                } for pn in candidate.phone_numbers
+            ],
+            "is_intern": is_intern_title(candidate.job_title),
+            "languages": [lang.name for lang in candidate.languages if lang.name],
+            "hard_skills": [skill.name for skill in candidate.hard_skills if skill.name],
+            "soft_skills": [skill.name for skill in candidate.soft_skills if skill.name],
+            "degrees": [
+                {
+                    "degree_name": deg.degree_name,
+                    "normalize_degree": deg.normalize_degree,
+                    "specialization": deg.specialization,
+                    "date": deg.date,
+                    "country_or_institute": deg.country_or_institute
+                } for deg in candidate.degrees
+            ],
+            "certifications": [
+                {
+                    "certification_name": cert.certification_name,
+                    "issuing_organization": cert.issuing_organization,
+                    "issue_date": cert.issue_date
+                } for cert in candidate.certifications
+            ],
+            "experiences": [
+                {
+                    "job_title": exp.job_title,
+                    "company": exp.company,
+                    "location": exp.location,
+                    "start_date": exp.start_date,
+                    "end_date": exp.end_date,
+                    "duration": exp.duration,
+                    "responsibilities": exp.responsibilities,
+                    "achievements": exp.achievements,
+                    "tools_technologies": exp.tools_technologies,
+                    "team_size": exp.team_size,
+                    "relevance_score": exp.relevance_score
+                } for exp in candidate.experiences
+            ],
+            "projects": [
+                {
+                    "project_name": proj.project_name,
+                    "description": proj.description,
+                    "technologies_used": proj.technologies_used,
+                    "role": proj.role,
+                    "period": proj.period,
+                    "url": proj.url
+                } for proj in candidate.projects
+            ],
+            "awards_publications": [
+                {
+                    "type": ap.type,
+                    "title": ap.title,
+                    "description": ap.description,
+                    "date": ap.date,
+                    "publisher_issuer": ap.publisher_issuer,
+                    "url": ap.url
+                } for ap in candidate.awards_publications
+            ],
+            "suggested_jobs": [
+                {"job_title": job.job_title} for job in candidate.suggested_jobs
+            ]
+        }
+
+    def candidate_actions(self, candidates, index=None):
+        """Lazily turn candidates into bulk actions for `index` (default: the alias)."""
+        legacy = self.uses_legacy_mapping(index)
+        for candidate in candidates:
+            yield {
+                "_id": candidate.id,
+                "_version": candidate.index_version,
+                "_source": self.build_candidate_document(candidate, legacy=legacy),
             }
+
+    def _resolve_job_fields(self, job_id, job_info=None):
+        """(title, description, competence_phare, stored search profile) from job_info or from the database."""
+        if job_info:
+            return (
+                job_info.get('title') or '',
+                job_info.get('description') or '',
+                job_info.get('competence_phare') or '',
+                job_info.get('search_profile'),
+            )
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if not job:
+                raise ValueError(f"Job with ID {job_id} not found")
+            job_title = job.title if hasattr(job, 'title') and job.title else ""
+            job_description = job.description if hasattr(job, 'description') and job.description else ""
+            competence_phare = job.competence_phare if hasattr(job, 'competence_phare') and job.competence_phare else ""
             
-            for attempt in range(3):
-                try:
-                    result = self.es.index(
-                        index=self.index_name,
-                        id=candidate.id,
-                        body=doc,
-                        refresh=True,
-                        timeout=30
-                    )
-                    logger.info(f"✅ Indexed candidate ID {candidate.id}")
-                    return True
-                    
-                except Exception as e:
-                    if attempt < 2:
-                        logger.warning(f"Attempt {attempt+1} failed for candidate ID {candidate.id}: {str(e)}")
-                        time.sleep(2)
-                    else:
-                        logger.error(f"Failed to index candidate ID {candidate.id} after 3 attempts: {str(e)}")
-                        return False
-                        
-        except Exception as e:
-            logger.error(f"Failed to index candidate ID {candidate.id}: {str(e)}")
-            return False
+            logger.info(f"Job details: ID={job_id}, Title='{job_title}', Competence='{competence_phare}'")
+            return job_title, job_description, competence_phare, job.search_profile
+        finally:
+            db.close()
 
-    def bulk_index_candidates(self, candidates, batch_size=3):
-        if not self.es_available:
-            logger.info("OpenSearch is not available, skipping bulk indexing")
-            return 0, candidates
+    def _job_match_query(self, job_title, competence_phare, search_profile=None):
+        """
+        Query and terms from the job's stored profile when it is current, built on the fly
+        otherwise. Stored profiles target the v2 mapping: a v1 alias gets the v1 clauses.
+        """
+        if self.uses_legacy_mapping():
+            return self.build_job_match_query(job_title, competence_phare, legacy=True)
+        profile = current_search_profile(search_profile, job_title, competence_phare)
+        if profile:
+            return copy.deepcopy(profile["query"]), profile["position_terms"], profile["domain_terms"]
+        return self.build_job_match_query(job_title, competence_phare)
+
+    @staticmethod
+    def build_job_match_query(job_title, competence_phare, legacy=False):
+        """
+        Bool query scoring candidates against a job, plus the extracted position and
+        domain terms. Every should clause is named so hits report which ones matched.
+        `legacy` targets a v1 index (nested skills, no `skills_text` nor `is_intern`).
+        """
+        position_terms, domain_terms = extract_domain_terms(job_title)
+        _, competence_domain_terms = extract_domain_terms(competence_phare)
+        
+        all_domain_terms = list(set(domain_terms + competence_domain_terms))
+        
+        logger.info(f"Position terms: {position_terms}")
+        logger.info(f"Domain terms: {all_domain_terms}")
+
+        bool_query = {
+            "should": [
+                {
+                    "match_phrase": {
+                        "job_title": {
+                            "query": job_title,
+                            "boost": 3.0,
+                            "_name": "title_phrase"
+                        }
+                    }
+                },
+                {
+                    "match": {
+                        "job_title": {
+                            "query": " ".join(all_domain_terms),
+                            "boost": 5.0,
+                            "operator": "or",
+                            "minimum_should_match": "30%",
+                            "_name": "title_domain"
+                        }
+                    }
+                },
+                {
+                    "nested": {
+                        "path": "experiences",
+                        "query": {
+                            "match": {
+                                "experiences.job_title": {
+                                    "query": " ".join(all_domain_terms),
+                                    "boost": 4.0,
+                                    "operator": "or",
+                                    "minimum_should_match": "30%"
+                                }
+                            }
+                        },
+                        "score_mode": "max",
+                        "boost": 2.0,
+                        "_name": "experience_domain",
+                        # Meilleure expérience correspondante, pour l'explication
+                        "inner_hits": {
+                            "name": "experience_domain",
+                            "size": 1,
+                            "_source": ["experiences.job_title", "experiences.duration"],
+                            "highlight": {"fields": {"experiences.job_title": {"number_of_fragments": 0}}}
+                        }
+                    }
+                },
+                {
+                    "multi_match": {
+                        "query": competence_phare,
+                        "fields": ["job_title^1.5", "skills_text^2.0"],
+                        "boost": 2.5,
+                        "type": "best_fields",
+                        "operator": "or",
+                        "minimum_should_match": "30%",
+                        "_name": "competence"
+                    }
+                },
+                {
+                    "terms": {
+                        "hard_skills": all_domain_terms,
+                        "boost": 2.0,
+                        "_name": "skills_domain"
+                    }
+                }
+            ],
+            "minimum_should_match": 1,
+            # Stagiaires / alternants : booléen calculé à l'indexation
+            "must_not": [
+                {"term": {"is_intern": True}}
+            ]
+        }
+        if legacy:
+            competence, skills = bool_query["should"][3], bool_query["should"][4]
+            competence["multi_match"]["fields"] = ["job_title^1.5", "hard_skills.name^2.0"]
+            skills.pop("terms")
+            skills["nested"] = {
+                "path": "hard_skills",
+                "query": {"terms": {"hard_skills.name": all_domain_terms, "boost": 2.0}},
+                "_name": "skills_domain"
+            }
+            bool_query["must_not"] = [
+                {"match": {"job_title": {"query": LEGACY_INTERN_QUERY, "operator": "or"}}}
+            ]
+        return bool_query, position_terms, all_domain_terms
+
+    def _explain_match(self, hit, competence_phare):
+        """
+        Match reason of an OpenSearch hit from the named clauses it matched
+        (`matched_queries`), the highlighted terms and the best matching experience
+        (inner hit), without post-processing the candidate document.
+        """
+        matched = set(hit.get("matched_queries", []))
+        highlight = hit.get("highlight", {})
+        job_title = hit.get("_source", {}).get("job_title")
+        
+        if matched & {"title_phrase", "title_domain"}:
+            terms = highlighted_terms(highlight.get("job_title"))
+            if terms:
+                return f"Domaine similaire: {job_title} (termes: {', '.join(terms[:2])})"
+            return f"Poste similaire: {job_title}"
+        
+        if "skills_domain" in matched:
+            skills = [_strip_highlight(fragment) for fragment in highlight.get("hard_skills", [])]
+            if skills:
+                return f"Compétences en {', '.join(skills[:2])}"
+        
+        if "experience_domain" in matched:
+            inner = hit.get("inner_hits", {}).get("experience_domain", {}).get("hits", {}).get("hits", [])
+            if inner:
+                experience = inner[0].get("_source", {})
+                experience = experience.get("experiences", experience)
+                terms = highlighted_terms(inner[0].get("highlight", {}).get("experiences.job_title"))
+                duration_info = f" (Durée: {experience.get('duration')})" if experience.get("duration") else ""
+                if terms:
+                    return f"Expérience en {', '.join(terms[:2])}: {experience.get('job_title')}{duration_info}"
+                return f"Expérience similaire: {experience.get('job_title')}{duration_info}"
+        
+        if "competence" in matched and competence_phare:
+            return f"Compétence clé: {competence_phare}"
+        
+        if matched:
+            return "Correspondance générale avec le profil"
+        return "Aucune correspondance directe avec l'offre"
+
+    def _describe_match(self, source, position_terms, all_domain_terms, competence_phare):
+        """Human readable reason why a candidate matched the job."""
+        match_reason = "Correspondance générale avec le profil"
+        
+        if source.get("job_title"):
+            job_title_lower = source.get("job_title", "").lower()
+            matching_domain_terms = [term for term in all_domain_terms 
+                                    if term.lower() in job_title_lower]
             
-        success_count = 0
-        failed_candidates = []
+            if matching_domain_terms:
+                match_reason = f"Domaine similaire: {source.get('job_title')} (termes: {', '.join(matching_domain_terms[:2])})"
+            elif any(term.lower() in job_title_lower for term in position_terms):
+                match_reason = f"Poste similaire: {source.get('job_title')}"
         
-        for i in range(0, len(candidates), batch_size):
-            batch = candidates[i:i+batch_size]
-            actions = []
-            candidate_map = {}
+        elif source.get("hard_skills"):
+            hard_skills = [
+                (skill if isinstance(skill, str) else skill.get("name") or "").lower()
+                for skill in source.get("hard_skills", [])
+            ]
+            domain_match = False
             
-            for candidate in batch:
-                doc = {
-                    "id": candidate.id,
-                    "name": candidate.name,
-                    "email": candidate.email,
-                    "job_title": candidate.job_title,
-                    "github": candidate.github,
-                    "linkedin": candidate.linkedin,
-                    "other_links": candidate.other_links,
-                    "country": candidate.country,
-                    "nationalities": candidate.nationalities,
-                    "date_of_birth": candidate.date_of_birth,
-                    "gender": candidate.gender,
-                    "marital_status": candidate.marital_status,
-                    "created_at": candidate.created_at.isoformat() if candidate.created_at else None,
-                    "phone_numbers": [
-                        {
-                            "number": pn.number,
-                            "isd_code": pn.isd_code,
-                            "original_number": pn.original_number,
-                            "formatted_number": pn.formatted_number,
-                            "phone_type": pn.phone_type,
-                            "location": pn.location
-                        } for pn in candidate.phone_numbers
-                    ],
-                    "languages": [{"name": lang.name} for lang in candidate.languages],
-                    "hard_skills": [{"name": skill.name} for skill in candidate.hard_skills],
-                    "soft_skills": [{"name": skill.name} for skill in candidate.soft_skills],
-                    "degrees": [
-                        {
-                            "degree_name": deg.degree_name,
-                            "normalize_degree": deg.normalize_degree,
-                            "specialization": deg.specialization,
-                            "date": deg.date,
-                            "country_or_institute": deg.country_or_institute
-                        } for deg in candidate.degrees
-                    ],
-                    "certifications": [
-                        {
-                            "certification_name": cert.certification_name,
-                            "issuing_organization": cert.issuing_organization,
-                            "issue_date": cert.issue_date
-                        } for cert in candidate.certifications
-                    ],
-                    "experiences": [
-                        {
-                            "job_title": exp.job_title,
-                            "company": exp.company,
-                            "location": exp.location,
-                            "start_date": exp.start_date,
-                            "end_date": exp.end_date,
-                            "duration": exp.duration,
-                            "responsibilities": exp.responsibilities,
-                            "achievements": exp.achievements,
-                            "tools_technologies": exp.tools_technologies,
-                            "team_size": exp.team_size,
-                            "relevance_score": exp.relevance_score
-                        } for exp in candidate.experiences
-                    ],
-                    "projects": [
-                        {
-                            "project_name": proj.project_name,
-                            "description": proj.description,
-                            "technologies_used": proj.technologies_used,
-                            "role": proj.role,
-                            "period": proj.period,
-                            "url": proj.url
-                        } for proj in candidate.projects
-                    ],
-                    "awards_publications": [
-                        {
-                            "type": ap.type,
-                            "title": ap.title,
-                            "description": ap.description,
-                            "date": ap.date,
-                            "publisher_issuer": ap.publisher_issuer,
-                            "url": ap.url
-                        } for ap in candidate.awards_publications
-                    ],
-                    "suggested_jobs": [
-                        {"job_title": job.job_title} for job in candidate.suggested_jobs
-                    ]
-                }
-                
-                action = {
-                    "_index": self.index_name,
-                    "_id": candidate.id,
-                    "_source": doc
-                }
-                actions.append(action)
-                candidate_map[str(candidate.id)] = candidate
+            for term in all_domain_terms:
+                matching_skills = [skill for skill in hard_skills if term.lower() in skill]
+                if matching_skills:
+                    match_reason = f"Compétences en {term}: {matching_skills[0]}"
+                    domain_match = True
+                    break
             
-            if not actions:
-                continue
+            if not domain_match and competence_phare and any(competence_phare.lower() in skill for skill in hard_skills):
+                match_reason = f"Compétence clé: {competence_phare}"
+        
+        elif "experiences" in source and source["experiences"]:
+            for exp in source["experiences"]:
+                exp_title = exp.get("job_title", "").lower()
+                matching_domain_terms = [term for term in all_domain_terms 
+                                    if term.lower() in exp_title]
                 
-            for attempt in range(3):
-                try:
-                    health = self.es.cluster.health(timeout=30)
-                    if health['status'] == 'red':
-                        logger.warning(f"Cluster health is RED before batch {i//batch_size + 1}. Attempting recovery...")
-                        self._attempt_cluster_recovery()
-                        health = self.es.cluster.health(timeout=30)
-                        if health['status'] == 'red':
-                            logger.error("Cluster still unhealthy. Trying individual indexing instead.")
-                            for candidate in batch:
-                                if self.index_candidate_from_model(candidate):
-                                    success_count += 1
-                                else:
-                                    failed_candidates.append(candidate)
-                            break
-                    
-                    # ✅ CORRECTION: timeout numérique pour bulk
-                    success, failed = bulk(
-                        self.es,
-                        actions,
-                        refresh=True,
-                        raise_on_error=False,
-                        stats_only=False,
-                        timeout=30
-                    )
-                    
-                    successful_docs = sum(1 for item in success if 'index' in item and item['index'].get('status') in [200, 201])
-                    failed_ids = [item['index']['_id'] for item in failed if 'index' in item]
-                    
-                    for item in failed:
-                        if 'index' in item:
-                            failed_id = item['index'].get('_id')
-                            error = item['index'].get('error', {})
-                            logger.error(f"Document ID {failed_id} failed: {error.get('type')} - {error.get('reason')}")
-                    
-                    success_count += successful_docs
-                    logger.info(f"Batch {i//batch_size + 1}: Indexed {successful_docs}/{len(batch)} candidates")
-                    
-                    for candidate in batch:
-                        if str(candidate.id) in failed_ids:
-                            failed_candidates.append(candidate)
-                    break
-                    
-                except OSConnectionError as ct:
-                    logger.warning(f"Connection error on batch {i//batch_size + 1}, attempt {attempt+1}/3: {str(ct)}")
-                    if attempt < 2:
-                        time.sleep(5)
-                    else:
-                        logger.error(f"Failed to index batch after 3 attempts")
-                        failed_candidates.extend(batch)
-                        
-                except Exception as e:
-                    logger.error(f"Error in batch {i//batch_size + 1}: {str(e)}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    failed_candidates.extend(batch)
+                if matching_domain_terms:
+                    duration_info = f" (Durée: {exp.get('duration', 'non spécifiée')})" if exp.get("duration") else ""
+                    match_reason = f"Expérience en {', '.join(matching_domain_terms[:2])}: {exp.get('job_title')}{duration_info}"
                     break
-            
-            time.sleep(3)
         
-        return success_count, failed_candidates
+        return match_reason
 
-    def retry_failed_candidates(self, failed_candidates):
-        if not self.es_available:
-            logger.info("OpenSearch is not available, skipping retry")
-            return 0, failed_candidates
+    def use_local_search(self):
+        """Match with the in-process index: SEARCH_BACKEND=local, or OpenSearch down and the index built."""
+        if not local_search_index.ready:
+            return False
+        return settings.SEARCH_BACKEND == "local" or not self.es_available
+
+    def _filter_candidates_locally(self, job_id, limit, min_score, job_info=None):
+        """filter_candidates_by_job on the local BM25 index (results are not cached)."""
+        job_title, _, competence_phare, search_profile = self._resolve_job_fields(job_id, job_info)
+        _, position_terms, all_domain_terms = self._job_match_query(job_title, competence_phare, search_profile)
+        
+        semantic = self._semantic_ranking(job_title, competence_phare, search_profile)
+        pool = max(limit, settings.SEMANTIC_SEARCH_CANDIDATES) if semantic else limit
+        
+        with search_metrics.timed("job_match_local", job_id=job_id, limit=limit) as probe:
+            hits = local_search_index.search(job_title, competence_phare, position_terms, all_domain_terms, limit=pool)
+            probe.hits = len(hits)
+        
+        candidates = []
+        for score, source in hits:
+            candidates.append({
+                "id": source.get("id"),
+                "name": source.get("name") or "Candidat sans nom",
+                "email": source.get("email") or "Email non disponible",
+                "job_title": source.get("job_title") or "Poste non spécifié",
+                "es_score": min(max(score / 8, min_score), 1.0),
+                "match_reason": self._describe_match(source, position_terms, all_domain_terms, competence_phare),
+                "match_score": score
+            })
+        if semantic:
+            def fetch_sources(ids):
+                documents = {candidate_id: local_search_index.documents.get(candidate_id) for candidate_id in ids}
+                return {
+                    candidate_id: document for candidate_id, document in documents.items()
+                    if document and not is_intern_title(document.get("job_title"))
+                }
             
-        success_count = 0
-        still_failed = []
+            candidates = self._fuse_with_semantic(candidates, semantic, fetch_sources, limit, min_score,
+                                                  position_terms, all_domain_terms, competence_phare)
+        logger.info(f"Local search: {len(candidates)} candidates for job ID {job_id}")
+        return {"suggested_candidates": candidates, "search_backend": "local"}
+
+    def _score_candidates_locally(self, job_id, ids, min_score, job_info=None):
+        job_title, _, competence_phare, search_profile = self._resolve_job_fields(job_id, job_info)
+        _, position_terms, all_domain_terms = self._job_match_query(job_title, competence_phare, search_profile)
         
-        for candidate in failed_candidates:
-            if self.index_candidate_from_model(candidate):
-                success_count += 1
-                logger.info(f"Successfully retried candidate ID {candidate.id}")
+        # Pas d'exclusion stagiaire ni de seuil : les candidats sont choisis par le recruteur
+        hits = {
+            source["id"]: (score, source)
+            for score, source in local_search_index.search(job_title, competence_phare, position_terms, all_domain_terms,
+                                                           limit=None, candidate_ids=ids, exclude_interns=False)
+        }
+        scores = {}
+        for candidate_id in ids:
+            if candidate_id in hits:
+                score, source = hits[candidate_id]
+                match_reason = self._describe_match(source, position_terms, all_domain_terms, competence_phare)
+            elif candidate_id in local_search_index.documents:
+                score, match_reason = 0.0, "Aucune correspondance directe avec l'offre"
             else:
-                still_failed.append(candidate)
-            time.sleep(3)
-            
-        return success_count, still_failed
+                continue
+            scores[candidate_id] = {
+                "es_score": min(max(score / 8, min_score), 1.0),
+                "match_reason": match_reason,
+                "match_score": score,
+                "matched_queries": []
+            }
+        return scores
+
+    def _semantic_ranking(self, job_title, competence_phare, search_profile=None):
+        """[(candidate_id, cosine)] closest to the job profile, empty when semantic search is off."""
+        if not vector_index.available:
+            return []
+        try:
+            skills = (search_profile or {}).get("skills")
+            with search_metrics.timed("semantic_search", job_title=job_title) as probe:
+                ranking = vector_index.search(embed_job(job_title, competence_phare, skills), k=settings.SEMANTIC_SEARCH_CANDIDATES)
+                probe.hits = len(ranking)
+            return ranking
+        except Exception as e:
+            logger.warning(f"Semantic retrieval failed, lexical results only: {str(e)}")
+            return []
+
+    def _fuse_with_semantic(self, lexical, semantic, fetch_sources, limit, min_score,
+                            position_terms, all_domain_terms, competence_phare):
+        """
+        Merge the lexical candidates with the semantic ranking by reciprocal rank fusion.
+        `fetch_sources(ids)` returns the documents of semantic-only candidates, without
+        those excluded by the job query (interns...).
+        """
+        similarity = dict(semantic)
+        fused = reciprocal_rank_fusion([
+            [candidate["id"] for candidate in lexical],
+            [candidate_id for candidate_id, _ in semantic],
+        ])
+        by_id = {candidate["id"]: candidate for candidate in lexical}
+        missing = [candidate_id for candidate_id in similarity if candidate_id not in by_id]
+        sources = fetch_sources(missing) if missing else {}
+        
+        candidates = []
+        for candidate_id in sorted(fused, key=lambda cid: (-fused[cid], cid)):
+            if candidate_id in by_id:
+                candidate = by_id[candidate_id]
+            elif candidate_id in sources:
+                source = sources[candidate_id]
+                match_reason = self._describe_match(source, position_terms, all_domain_terms, competence_phare)
+                if match_reason == "Correspondance générale avec le profil":
+                    match_reason = f"Profil proche de l'offre (similarité sémantique {similarity[candidate_id]:.2f})"
+                candidate = {
+                    "id": candidate_id,
+                    "name": source.get("name") or "Candidat sans nom",
+                    "email": source.get("email") or "Email non disponible",
+                    "job_title": source.get("job_title") or "Poste non spécifié",
+                    "es_score": min(max(similarity[candidate_id], min_score), 1.0),
+                    "match_reason": match_reason,
+                    "match_score": 0.0
+                }
+            else:
+                continue
+            candidate["semantic_score"] = similarity.get(candidate_id)
+            candidate["rrf_score"] = round(fused[candidate_id], 6)
+            candidates.append(candidate)
+            if len(candidates) >= limit:
+                break
+        
+        logger.info(f"RRF: {len(lexical)} lexical + {len(semantic)} semantic candidates fused into {len(candidates)}")
+        return candidates
 
     def filter_candidates_by_job(self, job_id, limit=10, min_score=0.2, job_info=None):
         """
         Filter candidates that match a specific job using OpenSearch
         """
+        if self.use_local_search():
+            return self._filter_candidates_locally(job_id, limit, min_score, job_info)
         if not self.es_available:
             logger.info(f"OpenSearch is not available, returning empty results for job {job_id}")
             return {"suggested_candidates": []}
             
         try:
             # Get job information
-            if job_info:
-                job_title = job_info.get('title', '')
-                job_description = job_info.get('description', '')
-                competence_phare = job_info.get('competence_phare', '')
-            else:
-                db = SessionLocal()
-                try:
-                    job = db.query(Job).filter(Job.id == job_id).first()
-                    if not job:
-                        raise ValueError(f"Job with ID {job_id} not found")
-                    job_title = job.title if hasattr(job, 'title') and job.title else ""
-                    job_description = job.description if hasattr(job, 'description') and job.description else ""
-                    competence_phare = job.competence_phare if hasattr(job, 'competence_phare') and job.competence_phare else ""
-                    
-                    logger.info(f"Job details: ID={job_id}, Title='{job_title}', Competence='{competence_phare}'")
-                finally:
-                    db.close()
-
-            # Extract domain and position terms
-            def extract_domain_terms(text):
-                if not text:
-                    return [], []
-                    
-                common_position_terms = [
-                    "senior", "junior", "consultant", "engineer", "manager", "director", 
-                    "lead", "chief", "head", "expert", "specialist", "analyste", "analyst", 
-                    "développeur", "developer", "architecte", "architect"
-                ]
-                
-                words = text.lower().split()
-                position_terms = [w for w in words if w in common_position_terms]
-                
-                domain_terms = []
-                for i in range(len(words)-1):
-                    if words[i] == "en" and i < len(words)-1:
-                        domain_phrase = " ".join(words[i+1:])
-                        domain_terms.append(domain_phrase)
-                        break
-                
-                if not domain_terms:
-                    domain_terms = [w for w in words if w not in common_position_terms and w not in ["en", "de", "du", "des", "et", "a", "le", "la", "les"]]
-                
-                return position_terms, domain_terms
+            job_title, job_description, competence_phare, search_profile = self._resolve_job_fields(job_id, job_info)
 
-            position_terms, domain_terms = extract_domain_terms(job_title)
-            _, competence_domain_terms = extract_domain_terms(competence_phare)
-            
-            all_domain_terms = list(set(domain_terms + competence_domain_terms))
-            
-            logger.info(f"Position terms: {position_terms}")
-            logger.info(f"Domain terms: {all_domain_terms}")
+            # Same job fields, same parameters and unchanged index: reuse the previous result
+            cache_key = None
+            if settings.SEARCH_CACHE_ENABLED:
+                cache_key = search_result_cache.make_key(job_title, job_description, competence_phare, limit, min_score)
+                cached = search_result_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Search cache hit for job ID {job_id}")
+                    return cached
 
             # Build search query
+            bool_query, position_terms, all_domain_terms = self._job_match_query(job_title, competence_phare, search_profile)
+            semantic = self._semantic_ranking(job_title, competence_phare, search_profile)
             query = {
-                "query": {
-                    "bool": {
-                        "should": [
-                            {
-                                "match_phrase": {
-                                    "job_title": {
-                                        "query": job_title,
-                                        "boost": 3.0
-                                    }
-                                }
-                            },
-                            {
-                                "match": {
-                                    "job_title": {
-                                        "query": " ".join(all_domain_terms),
-                                        "boost": 5.0,
-                                        "operator": "or",
-                                        "minimum_should_match": "30%"
-                                    }
-                                }
-                            },
-                            {
-                                "nested": {
-                                    "path": "experiences",
-                                    "query": {
-                                        "match": {
-                                            "experiences.job_title": {
-                                                "query": " ".join(all_domain_terms),
-                                                "boost": 4.0,
-                                                "operator": "or",
-                                                "minimum_should_match": "30%"
-                                            }
-                                        }
-                                    },
-                                    "score_mode": "max",
-                                    "boost": 2.0
-                                }
-                            },
-                            {
-                                "multi_match": {
-                                    "query": competence_phare,
-                                    "fields": ["job_title^1.5", "hard_skills.name^2.0"],
-                                    "boost": 2.5,
-                                    "type": "best_fields",
-                                    "operator": "or",
-                                    "minimum_should_match": "30%"
-                                }
-                            },
-                            {
-                                "nested": {
-                                    "path": "hard_skills",
-                                    "query": {
-                                        "terms": {
-                                            "hard_skills.name": all_domain_terms,
-                                            "boost": 2.0
-                                        }
-                                    }
-                                }
-                            }
-                        ],
-                        "minimum_should_match": 1,
-                        "must_not": [
-                            {
-                                "match": {
-                                    "job_title": {
-                                        "query": "stagiaire stage intern étudiant student alternance alternant Élève",
-                                        "operator": "or"
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                },
-                "size": limit,
-                "_source": ["id", "name", "email", "job_title", "hard_skills", "experiences"]
+                "query": {"bool": bool_query},
+                # Avec la fusion, les deux classements doivent être assez profonds
+                "size": max(limit, settings.SEMANTIC_SEARCH_CANDIDATES) if semantic else limit,
+                "_source": JOB_MATCH_RESULT_SOURCE,
+                "highlight": JOB_MATCH_HIGHLIGHT
             }
 
             # Execute search with timeout
-            search_result = self.es.search(
-                index=self.index_name,
-                body=query,
-                timeout=30
-            )
+            with search_metrics.timed("job_match", body=query, job_id=job_id, limit=limit) as probe:
+                search_result = self.es.search(
+                    index=self.index_name,
+                    body=query,
+                    timeout=30
+                )
+                probe.response = search_result
 
             total_hits = search_result["hits"]["total"]["value"] if "total" in search_result["hits"] else 0
             logger.info(f"Search returned {total_hits} total hits")
@@ -783,43 +1114,8 @@ class ElasticsearchService:
                 # Score normalization
                 normalized_score = min(max(score / 8, min_score), 1.0)
 
-                # Determine match reason
-                match_reason = "Correspondance générale avec le profil"
-                
-                if source.get("job_title"):
-                    job_title_lower = source.get("job_title", "").lower()
-                    matching_domain_terms = [term for term in all_domain_terms 
-                                            if term.lower() in job_title_lower]
-                    
-                    if matching_domain_terms:
-                        match_reason = f"Domaine similaire: {source.get('job_title')} (termes: {', '.join(matching_domain_terms[:2])})"
-                    elif any(term.lower() in job_title_lower for term in position_terms):
-                        match_reason = f"Poste similaire: {source.get('job_title')}"
-                
-                elif source.get("hard_skills"):
-                    hard_skills = [skill.get("name", "").lower() for skill in source.get("hard_skills", [])]
-                    domain_match = False
-                    
-                    for term in all_domain_terms:
-                        matching_skills = [skill for skill in hard_skills if term.lower() in skill]
-                        if matching_skills:
-                            match_reason = f"Compétences en {term}: {matching_skills[0]}"
-                            domain_match = True
-                            break
-                    
-                    if not domain_match and competence_phare and any(competence_phare.lower() in skill for skill in hard_skills):
-                        match_reason = f"Compétence clé: {competence_phare}"
-                
-                elif "experiences" in source and source["experiences"]:
-                    for exp in source["experiences"]:
-                        exp_title = exp.get("job_title", "").lower()
-                        matching_domain_terms = [term for term in all_domain_terms 
-                                            if term.lower() in exp_title]
-                        
-                        if matching_domain_terms:
-                            duration_info = f" (Durée: {exp.get('duration', 'non spécifiée')})" if exp.get("duration") else ""
-                            match_reason = f"Expérience en {', '.join(matching_domain_terms[:2])}: {exp.get('job_title')}{duration_info}"
-                            break
+                # Reason reported by OpenSearch (named clauses, highlights, inner hits)
+                match_reason = self._explain_match(hit, competence_phare)
 
                 candidates.append({
                     "id": source.get("id"),
@@ -828,20 +1124,237 @@ class ElasticsearchService:
                     "job_title": source.get("job_title", "Poste non spécifié"),
                     "es_score": normalized_score,
                     "match_reason": match_reason,
-                    "match_score": score
+                    "match_score": score,
+                    "matched_queries": hit.get("matched_queries", [])
                 })
 
+            if semantic:
+                def fetch_sources(ids):
+                    body = {
+                        "query": {"bool": {
+                            "filter": [{"ids": {"values": [str(candidate_id) for candidate_id in ids]}}],
+                            "must_not": bool_query.get("must_not", [])
+                        }},
+                        "size": len(ids),
+                        "_source": JOB_MATCH_SOURCE
+                    }
+                    with search_metrics.timed("job_match_semantic_fetch", body=body, job_id=job_id) as probe:
+                        response = self.es.search(index=self.index_name, body=body, timeout=30)
+                        probe.response = response
+                    return {int(hit["_id"]): hit["_source"] for hit in response["hits"]["hits"]}
+
+                candidates = self._fuse_with_semantic(candidates, semantic, fetch_sources, limit, min_score,
+                                                      position_terms, all_domain_terms, competence_phare)
+
             if not candidates:
                 logger.warning(f"No candidates found for job ID {job_id}")
             else:
                 logger.info(f"Found {len(candidates)} candidates for job ID {job_id}")
 
-            return {
+            result = {
                 "suggested_candidates": candidates
             }
+            if cache_key:
+                search_result_cache.put(cache_key, result, job_id=job_id)
+            return result
+
+        except OSConnectionError as e:
+            if not local_search_index.ready:
+                raise
+            logger.warning(f"OpenSearch unreachable during search for job {job_id} ({str(e)}), using local index")
+            return self._filter_candidates_locally(job_id, limit, min_score, job_info)
 
         except Exception as e:
             import traceback
             logger.error(f"Error filtering candidates for job {job_id}: {str(e)}")
             logger.error(traceback.format_exc())
             raise
+
+    def score_candidates_for_job(self, job_id, candidate_ids, min_score=0.1, job_info=None):
+        """
+        Relevance of exactly `candidate_ids` for a job, in one search request.
+
+        The job query is scored under an `ids` filter without minimum_should_match, so
+        every requested candidate present in the index comes back with its own score,
+        and `matched_queries` / highlights explain which clauses matched.
+
+        Returns:
+            dict: {candidate_id: {"es_score", "match_reason", "match_score", "matched_queries"}}
+            Candidates missing from the index are absent.
+        """
+        ids = [int(candidate_id) for candidate_id in candidate_ids]
+        if ids and self.use_local_search():
+            return self._score_candidates_locally(job_id, ids, min_score, job_info)
+        if not ids or not self.es_available:
+            return {}
+        
+        try:
+            job_title, _, competence_phare, search_profile = self._resolve_job_fields(job_id, job_info)
+            bool_query, _, _ = self._job_match_query(job_title, competence_phare, search_profile)
+            
+            # Les candidats sont choisis par le recruteur : on les score sans les exclure
+            bool_query.pop("must_not", None)
+            bool_query["minimum_should_match"] = 0
+            bool_query["filter"] = [{"ids": {"values": [str(candidate_id) for candidate_id in ids]}}]
+            
+            body = {
+                "query": {"bool": bool_query},
+                "size": len(ids),
+                "_source": JOB_MATCH_RESULT_SOURCE,
+                "highlight": JOB_MATCH_HIGHLIGHT
+            }
+            with search_metrics.timed("job_score_selected", body=body, job_id=job_id, candidates=len(ids)) as probe:
+                search_result = self.es.search(index=self.index_name, body=body, timeout=30)
+                probe.response = search_result
+            
+            scores = {}
+            for hit in search_result["hits"]["hits"]:
+                score = hit["_score"] or 0.0
+                matched_queries = hit.get("matched_queries", [])
+                
+                match_reason = self._explain_match(hit, competence_phare)
+                
+                scores[int(hit["_id"])] = {
+                    "es_score": min(max(score / 8, min_score), 1.0),
+                    "match_reason": match_reason,
+                    "match_score": score,
+                    "matched_queries": matched_queries
+                }
+            
+            logger.info(f"Scored {len(scores)}/{len(ids)} requested candidates for job ID {job_id} in one query")
+            return scores
+        
+        except Exception as e:
+            logger.error(f"Error scoring candidates {ids} for job {job_id}: {str(e)}")
+            return {}
+
+    def search_candidates(self, q=None, skills=None, languages=None, countries=None, degree=None,
+                          min_experience=None, max_experience=None, sort="relevance",
+                          size=20, cursor=None, with_facets=True):
+        """
+        Filtered candidate listing with facet counts and search_after pagination.
+
+        Filters run in filter context (cached by OpenSearch, not scored); only the free
+        text query is scored. Pages are fetched with a cursor built from the sort values
+        of the last hit, so deep pages cost the same as the first one. The total is
+        counted up to CANDIDATE_SEARCH_TRACK_TOTAL_HITS ("gte" beyond that) and facets
+        are only computed on the first page.
+
+        Raises:
+            ValueError: malformed cursor or unknown sort
+        """
+        size = max(1, min(int(size), settings.CANDIDATE_SEARCH_MAX_PAGE_SIZE))
+        # Un alias encore en v1 : compétences et langues imbriquées
+        legacy = self.uses_legacy_mapping()
+        
+        def keyword_filter(field, value):
+            if legacy:
+                return {"nested": {"path": field, "query": {"term": {f"{field}.name": value}}}}
+            return {"term": {field: value}}
+        
+        filters = []
+        for skill in skills or []:
+            filters.append(keyword_filter("hard_skills", skill))
+        for language in languages or []:
+            filters.append(keyword_filter("languages", language))
+        if countries:
+            filters.append({"terms": {"country": list(countries)}})
+        if degree:
+            filters.append({"nested": {"path": "degrees", "query": {"multi_match": {
+                "query": degree,
+                "fields": ["degrees.normalize_degree", "degrees.degree_name", "degrees.specialization"]
+            }}}})
+        if min_experience is not None or max_experience is not None:
+            experience_range = {}
+            if min_experience is not None:
+                experience_range["gte"] = min_experience
+            if max_experience is not None:
+                experience_range["lte"] = max_experience
+            filters.append({"range": {"total_experience_years": experience_range}})
+        
+        bool_query = {"filter": filters}
+        if q:
+            bool_query["should"] = [
+                {"multi_match": {"query": q, "fields": ["name^3", "job_title^2"]}},
+                {"nested": {"path": "experiences", "query": {"match": {"experiences.job_title": q}}, "score_mode": "max"}},
+                keyword_filter("hard_skills", q) if legacy else {"match": {"skills_text": q}},
+            ]
+            bool_query["minimum_should_match"] = 1
+        
+        # `id` départage les égalités : search_after a besoin d'un ordre total
+        if sort == "relevance":
+            sort_clause = [{"_score": "desc"}, {"id": "desc"}] if q else [{"created_at": "desc"}, {"id": "desc"}]
+        elif sort == "recent":
+            sort_clause = [{"created_at": "desc"}, {"id": "desc"}]
+        elif sort == "experience":
+            sort_clause = [{"total_experience_years": "desc"}, {"id": "desc"}]
+        else:
+            raise ValueError(f"Unknown sort '{sort}'")
+        
+        body = {
+            "query": {"bool": bool_query},
+            "size": size,
+            "sort": sort_clause,
+            "_source": CANDIDATE_SEARCH_SOURCE,
+            "track_total_hits": settings.CANDIDATE_SEARCH_TRACK_TOTAL_HITS,
+        }
+        if cursor:
+            body["search_after"] = decode_search_cursor(cursor)
+        if with_facets and not cursor:
+            facet_size = settings.CANDIDATE_SEARCH_FACET_SIZE
+            body["aggs"] = {
+                "skills": {"terms": {"field": "hard_skills", "size": facet_size}},
+                "languages": {"terms": {"field": "languages", "size": facet_size}},
+                "countries": {"terms": {"field": "country", "size": facet_size}},
+            }
+            if legacy:
+                for name, field in (("skills", "hard_skills"), ("languages", "languages")):
+                    body["aggs"][name] = {
+                        "nested": {"path": field},
+                        "aggs": {"names": {
+                            "terms": {"field": f"{field}.name", "size": facet_size},
+                            "aggs": {"candidates": {"reverse_nested": {}}}
+                        }}
+                    }
+        
+        try:
+            with search_metrics.timed("candidate_search", body=body, q=q, cursor=bool(cursor)) as probe:
+                search_result = self.es.search(index=self.index_name, body=body, timeout=10)
+                probe.response = search_result
+        except RequestError as e:
+            # Typiquement un curseur qui ne correspond pas au tri demandé
+            raise ValueError(f"Invalid search request: {e.error}")
+        
+        hits = search_result["hits"]["hits"]
+        candidates = []
+        for hit in hits:
+            candidate = dict(hit["_source"])
+            if q:
+                candidate["score"] = hit.get("_score")
+            candidates.append(candidate)
+        
+        total = search_result["hits"].get("total", {"value": 0, "relation": "eq"})
+        result = {
+            "candidates": candidates,
+            "total": total["value"],
+            "total_relation": total["relation"],
+            "next_cursor": encode_search_cursor(hits[-1]["sort"]) if len(hits) == size else None,
+            "took_ms": search_result.get("took"),
+        }
+        
+        aggregations = search_result.get("aggregations")
+        if aggregations:
+            result["facets"] = {}
+            for name in ("skills", "languages", "countries"):
+                aggregation = aggregations[name]
+                if "names" in aggregation:
+                    # v1 : agrégation imbriquée, compte des candidats via reverse_nested
+                    result["facets"][name] = [
+                        {"value": bucket["key"], "count": bucket["candidates"]["doc_count"]}
+                        for bucket in aggregation["names"]["buckets"]
+                    ]
+                else:
+                    result["facets"][name] = [
+                        {"value": bucket["key"], "count": bucket["doc_count"]} for bucket in aggregation["buckets"]
+                    ]
+        return result
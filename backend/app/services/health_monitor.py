@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import text
+from app.config.settings import settings
+from app.database.postgresql import engine
+from app.services.opensearch_client import get_cluster_health_monitor
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Dependencies without which the API cannot serve requests
+CRITICAL_CHECKS = ("postgres",)
+
+
+def _result(ok: bool, status: str, **details) -> Dict[str, Any]:
+    return {"ok": ok, "status": status, **details}
+
+
+def check_postgres() -> Dict[str, Any]:
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    pool = engine.pool
+    return _result(True, "up", pool={
+        "size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+    })
+
+
+def check_opensearch() -> Dict[str, Any]:
+    # Rafraîchit aussi le cache utilisé par ElasticsearchService
+    health = get_cluster_health_monitor(settings.ELASTICSEARCH_URL).refresh(
+        request_timeout=settings.HEALTH_CHECK_TIMEOUT
+    )
+    return _result(health["available"], health["status"], error=health["error"],
+                   number_of_nodes=health["number_of_nodes"])
+
+
+async def check_openai() -> Dict[str, Any]:
+    """TCP reachability of the OpenAI API (no request, no tokens spent)."""
+    if not settings.OPENAI_API_KEY:
+        return _result(False, "not_configured")
+    _, writer = await asyncio.open_connection(settings.HEALTH_OPENAI_HOST, 443)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return _result(True, "reachable")
+
+
+def check_zoho() -> Dict[str, Any]:
+    """Token state only: the Zoho API itself is not called."""
+    try:
+        from app.services.zoho_auth_service import zoho_service
+    except ImportError:
+        return _result(True, "not_configured")
+
+    if not zoho_service.client_id:
+        return _result(True, "not_configured")
+    if not zoho_service.access_token:
+        return _result(False, "not_authenticated", has_refresh_token=bool(zoho_service.refresh_token))
+
+    expires_in = None
+    if zoho_service.token_expires_at:
+        expires_in = round((zoho_service.token_expires_at - datetime.now()).total_seconds())
+    if expires_in is not None and expires_in <= 0:
+        return _result(bool(zoho_service.refresh_token), "token_expired",
+                       has_refresh_token=bool(zoho_service.refresh_token))
+    return _result(True, "connected", token_expires_in_seconds=expires_in)
+
+
+class HealthMonitor:
+    """
+    Polls the application dependencies in the background and keeps the last result.
+
+    Probes (/api/health, /api/ready) only read the snapshot, so they never wait on a
+    dependency nor compete with real traffic. Each check runs with a timeout; a check
+    still running from the previous round is reported as timed out instead of being
+    started a second time.
+    """
+
+    def __init__(self, interval: Optional[float] = None, timeout: Optional[float] = None):
+        self.is_running = False
+        self.interval = interval or settings.HEALTH_CHECK_INTERVAL
+        self.timeout = timeout or settings.HEALTH_CHECK_TIMEOUT
+        self.started = False
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.last_round_at: Optional[float] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._registry: Dict[str, Callable] = {
+            "postgres": check_postgres,
+            "opensearch": check_opensearch,
+            "openai": check_openai,
+            "zoho": check_zoho,
+        }
+
+    async def start(self):
+        """Start the background polling loop"""
+        if self.is_running:
+            logger.info("Health monitor already running")
+            return
+
+        self.is_running = True
+        logger.info(f"🚀 Starting health monitor (every {self.interval}s)")
+
+        while self.is_running:
+            try:
+                await self.run_checks()
+            except Exception as e:
+                logger.error(f"❌ Health monitor error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        """Stop the background polling loop"""
+        self.is_running = False
+        logger.info("🛑 Stopping health monitor")
+
+    def mark_started(self):
+        """Startup (lifespan) is complete: the worker may receive traffic."""
+        self.started = True
+
+    async def _run_check(self, name: str, check: Callable) -> Dict[str, Any]:
+        pending = self._pending.get(name)
+        if pending is not None and not pending.done():
+            return _result(False, "timeout", error="previous check still running")
+
+        if asyncio.iscoroutinefunction(check):
+            future = asyncio.ensure_future(check())
+        else:
+            future = asyncio.ensure_future(asyncio.to_thread(check))
+        self._pending[name] = future
+
+        start = time.perf_counter()
+        try:
+            # shield : un check bloqué n'est pas relancé tant qu'il n'a pas rendu la main
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            result = _result(False, "timeout", error=f"no answer within {self.timeout}s")
+        except Exception as e:
+            result = _result(False, "down", error=str(e))
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["checked_at"] = datetime.now().isoformat()
+        return result
+
+    async def run_checks(self) -> Dict[str, Dict[str, Any]]:
+        """Run every check concurrently and store the results."""
+        names = list(self._registry)
+        results = await asyncio.gather(*(self._run_check(name, self._registry[name]) for name in names))
+        for name, result in zip(names, results):
+            previous = self.checks.get(name)
+            if previous is not None and previous["ok"] != result["ok"]:
+                if result["ok"]:
+                    logger.info(f"✅ Health: {name} is back ({result['status']})")
+                else:
+                    logger.warning(f"⚠️ Health: {name} is {result['status']}: {result.get('error')}")
+            self.checks[name] = result
+        self.last_round_at = time.time()
+        return self.checks
+
+    def age_seconds(self) -> Optional[float]:
+        if self.last_round_at is None:
+            return None
+        return round(time.time() - self.last_round_at, 3)
+
+    def overall_status(self) -> str:
+        if not self.checks:
+            return "starting"
+        if any(not self.checks.get(name, {}).get("ok") for name in CRITICAL_CHECKS):
+            return "unhealthy"
+        if any(not check["ok"] for check in self.checks.values()):
+            return "degraded"
+        return "healthy"
+
+    def readiness(self) -> Dict[str, Any]:
+        """Cheap readiness verdict from memory."""
+        age = self.age_seconds()
+        reasons = []
+        if not self.started:
+            reasons.append("startup not complete")
+        if age is None:
+            reasons.append("no health check completed yet")
+        elif age > settings.HEALTH_MAX_AGE:
+            reasons.append(f"health snapshot is stale ({age}s old)")
+        for name in CRITICAL_CHECKS:
+            check = self.checks.get(name)
+            if check is not None and not check["ok"]:
+                reasons.append(f"{name} is {check['status']}")
+        return {"ready": not reasons, "reasons": reasons, "age_seconds": age}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.overall_status(),
+            "checks": self.checks,
+            "age_seconds": self.age_seconds(),
+            "interval_seconds": self.interval,
+        }
+
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.candidate import (
+    Candidate, Resume, PhoneNumber, Degree, Certification, Experience,
+    Project, AwardPublication, SuggestedJob,
+)
+from app.models.index_outbox import IndexOutbox
+from app.services.bulk_indexer import BulkIndexer
+from app.services.elasticsearch_service import ElasticsearchService, candidate_index_load_options, DELETED_DOCUMENT_VERSION
+from app.services.local_search import local_search_index
+from app.services.vector_index import vector_index, embed_candidate
+from app.services.search_cache import bump_index_generation
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Rows that belong to a candidate document
+CANDIDATE_CHILD_MODELS = (
+    Resume, PhoneNumber, Degree, Certification, Experience,
+    Project, AwardPublication, SuggestedJob,
+)
+
+# Session.info flag: outbox rows of this transaction ask for read-your-writes
+WAIT_FOR_REFRESH_KEY = "index_wait_for_refresh"
+# Session.info: candidates changed by the transaction, for the local search index
+CHANGED_CANDIDATES_KEY = "index_changed_candidates"
+
+
+def _candidate_id_of(obj) -> Optional[int]:
+    if isinstance(obj, Candidate):
+        return obj.id
+    if isinstance(obj, CANDIDATE_CHILD_MODELS):
+        return obj.candidate_id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_index_changes(session, flush_context):
+    """
+    Record which candidate documents a flush changed. Runs on the flush connection,
+    so the outbox rows commit (or roll back) together with the data itself. Also
+    bumps `candidates.updated_at` (even when only child rows or collections changed)
+    and `candidates.index_version`, the version of the search document.
+    """
+    changes: Dict[int, str] = {}
+    for obj in session.new:
+        candidate_id = _candidate_id_of(obj)
+        if candidate_id is not None:
+            changes.setdefault(candidate_id, "upsert")
+    for obj in session.dirty:
+        candidate_id = _candidate_id_of(obj)
+        if candidate_id is not None and session.is_modified(obj):
+            changes.setdefault(candidate_id, "upsert")
+    for obj in session.deleted:
+        candidate_id = _candidate_id_of(obj)
+        if candidate_id is not None:
+            changes[candidate_id] = "delete" if isinstance(obj, Candidate) else changes.get(candidate_id, "upsert")
+
+    if not changes:
+        return
+    session.info.setdefault(CHANGED_CANDIDATES_KEY, set()).update(changes)
+
+    connection = session.connection()
+    touched = [candidate_id for candidate_id, operation in changes.items() if operation == "upsert"]
+    if touched:
+        connection.execute(
+            update(Candidate.__table__).where(Candidate.__table__.c.id.in_(touched)).values(
+                updated_at=func.now(), index_version=Candidate.__table__.c.index_version + 1
+            )
+        )
+
+    wait_for_refresh = bool(session.info.get(WAIT_FOR_REFRESH_KEY))
+    connection.execute(
+        insert(IndexOutbox.__table__),
+        [
+            {"candidate_id": candidate_id, "operation": operation, "wait_for_refresh": wait_for_refresh, "attempts": 0}
+            for candidate_id, operation in changes.items()
+        ],
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_local_search(session):
+    changed = session.info.pop(CHANGED_CANDIDATES_KEY, None)
+    if changed:
+        local_search_index.mark_changed(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_local_search_changes(session):
+    session.info.pop(CHANGED_CANDIDATES_KEY, None)
+
+
+def request_index_refresh(db: Session):
+    """Mark the changes of the current transaction as needing read-your-writes indexing."""
+    db.info[WAIT_FOR_REFRESH_KEY] = True
+
+
+def enqueue_candidates(db: Session, candidate_ids: Iterable[int], operation: str = "upsert"):
+    """
+    Explicitly queue candidates for (re)indexing. Needed for changes that bypass the
+    flush, such as `query(...).delete()` or raw SQL; the caller commits.
+    """
+    wait_for_refresh = bool(db.info.get(WAIT_FOR_REFRESH_KEY))
+    candidate_ids = set(candidate_ids)
+    if operation == "upsert" and candidate_ids:
+        db.query(Candidate).filter(Candidate.id.in_(candidate_ids)).update(
+            {Candidate.updated_at: func.now(), Candidate.index_version: Candidate.index_version + 1},
+            synchronize_session=False
+        )
+    db.info.setdefault(CHANGED_CANDIDATES_KEY, set()).update(candidate_ids)
+    for candidate_id in candidate_ids:
+        db.add(IndexOutbox(candidate_id=candidate_id, operation=operation,
+                           wait_for_refresh=wait_for_refresh, attempts=0))
+
+
+class OutboxIndexer:
+    """
+    Ships pending outbox rows to OpenSearch.
+
+    Each batch locks rows with SKIP LOCKED (several workers can run the loop), coalesces
+    them per candidate, rebuilds each document once from the committed state (a missing
+    candidate becomes a delete) and sends everything through the bulk engine. Only
+    candidates whose change asked for it are sent with refresh=wait_for.
+
+    SKIP LOCKED does not order two workers holding different rows of the same
+    candidate, so documents are versioned externally with `candidates.index_version`
+    (deletes with DELETED_DOCUMENT_VERSION): a stale snapshot arriving last is
+    rejected by the cluster.
+    """
+
+    def __init__(self, poll_interval=None, batch_size=None, max_attempts=None):
+        self.is_running = False
+        self.poll_interval = poll_interval or settings.INDEX_OUTBOX_POLL_INTERVAL
+        self.batch_size = batch_size or settings.INDEX_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.INDEX_OUTBOX_MAX_ATTEMPTS
+        self.batches = 0
+        self.rows_processed = 0
+        self.documents_sent = 0
+        self.failures = 0
+        self.last_batch_at = None
+        self.last_lag_seconds = None
+        self.max_lag_seconds = 0.0
+
+    async def start(self):
+        """Start the outbox processing loop"""
+        if self.is_running:
+            logger.info("Outbox indexer already running")
+            return
+
+        self.is_running = True
+        logger.info(f"🚀 Starting index outbox processor (every {self.poll_interval}s, batches of {self.batch_size})")
+
+        while self.is_running:
+            try:
+                processed = await asyncio.to_thread(self.process_batch)
+                # Une batch pleine signifie qu'il reste du travail : on enchaîne
+                if processed < self.batch_size:
+                    await asyncio.sleep(self.poll_interval)
+            except Exception as e:
+                logger.error(f"❌ Outbox indexer error: {e}")
+                await asyncio.sleep(5)
+
+    def stop(self):
+        """Stop the outbox processing loop"""
+        self.is_running = False
+        logger.info("🛑 Stopping index outbox processor")
+
+    def process_batch(self, candidate_ids: Optional[List[int]] = None, wait_for_refresh: bool = False) -> int:
+        """
+        Process one batch of pending rows (optionally only those of `candidate_ids`).
+        Returns the number of outbox rows handled.
+        """
+        es_service = ElasticsearchService()
+        if not es_service.es_available:
+            # Rows stay queued without burning attempts until the cluster is back
+            return 0
+
+        db = SessionLocal()
+        try:
+            query = db.query(IndexOutbox).filter(IndexOutbox.attempts < self.max_attempts)
+            if candidate_ids:
+                query = query.filter(IndexOutbox.candidate_id.in_(candidate_ids))
+            rows = query.order_by(IndexOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            if not rows:
+                db.commit()
+                return 0
+
+            pending: Dict[int, bool] = {}
+            for row in rows:
+                pending[row.candidate_id] = pending.get(row.candidate_id, False) or row.wait_for_refresh or wait_for_refresh
+
+            candidates = {
+                candidate.id: candidate for candidate in
+                db.query(Candidate).options(*candidate_index_load_options())
+                .filter(Candidate.id.in_(list(pending))).all()
+            }
+
+            legacy = es_service.uses_legacy_mapping()
+
+            def actions(ids):
+                for candidate_id in ids:
+                    candidate = candidates.get(candidate_id)
+                    if candidate is None:
+                        yield {"_op_type": "delete", "_id": candidate_id, "_version": DELETED_DOCUMENT_VERSION}
+                    else:
+                        yield {
+                            "_id": candidate_id,
+                            "_version": candidate.index_version,
+                            "_source": es_service.build_candidate_document(candidate, legacy=legacy),
+                        }
+
+            indexer = BulkIndexer(es_service.es, es_service.index_name)
+            failed = set()
+            for refresh in (False, True):
+                ids = [candidate_id for candidate_id, wait_for in pending.items() if wait_for == refresh]
+                if ids:
+                    stats = indexer.index(actions(ids), disable_refresh=False, refresh="wait_for" if refresh else None)
+                    self.documents_sent += stats["indexed"]
+                    failed.update(stats["failed_ids"])
+
+            # Embeddings de la recherche sémantique, depuis le même état committé
+            if vector_index.available:
+                try:
+                    vector_index.upsert({
+                        candidate_id: embed_candidate(candidates[candidate_id]) if candidate_id in candidates else None
+                        for candidate_id in pending
+                    })
+                except Exception as e:
+                    logger.warning(f"Vector index update failed for {len(pending)} candidates: {str(e)}")
+
+            done_ids = []
+            for row in rows:
+                if str(row.candidate_id) in failed:
+                    row.attempts += 1
+                    row.last_error = "bulk indexing failed"
+                    if row.attempts >= self.max_attempts:
+                        logger.error(f"Outbox row {row.id} for candidate {row.candidate_id} parked after {row.attempts} attempts")
+                else:
+                    done_ids.append(row.id)
+            if done_ids:
+                db.query(IndexOutbox).filter(IndexOutbox.id.in_(done_ids)).delete(synchronize_session=False)
+
+            oldest = min(row.created_at for row in rows)
+            db.commit()
+            if len(pending) > len(failed):
+                bump_index_generation()
+
+            self.batches += 1
+            self.rows_processed += len(rows)
+            self.failures += len(failed)
+            self.last_batch_at = datetime.now()
+            if oldest is not None:
+                self.last_lag_seconds = round((datetime.now(timezone.utc) - oldest).total_seconds(), 3)
+                self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+            if len(rows) > len(pending):
+                logger.info(f"Outbox: {len(rows)} changes coalesced into {len(pending)} documents")
+            return len(rows)
+
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def flush_candidate(self, candidate_id: int) -> int:
+        """Index the pending changes of one candidate now, visible to search on return."""
+        return self.process_batch(candidate_ids=[candidate_id], wait_for_refresh=True)
+
+    def metrics(self, db: Session) -> dict:
+        """Queue depth and indexing lag."""
+        pending_count, oldest_pending = db.query(
+            func.count(IndexOutbox.id), func.min(IndexOutbox.created_at)
+        ).filter(IndexOutbox.attempts < self.max_attempts).one()
+        parked_count = db.query(func.count(IndexOutbox.id)).filter(
+            IndexOutbox.attempts >= self.max_attempts
+        ).scalar()
+
+        oldest_pending_age = None
+        if oldest_pending is not None:
+            oldest_pending_age = round((datetime.now(timezone.utc) - oldest_pending).total_seconds(), 3)
+
+        return {
+            "is_running": self.is_running,
+            "pending": pending_count,
+            "parked": parked_count,
+            "oldest_pending_age_seconds": oldest_pending_age,
+            "last_batch_at": self.last_batch_at.isoformat() if self.last_batch_at else None,
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "batches": self.batches,
+            "rows_processed": self.rows_processed,
+            "documents_sent": self.documents_sent,
+            "failures": self.failures,
+            "poll_interval_seconds": self.poll_interval,
+            "batch_size": self.batch_size,
+        }
+
+
+# Global outbox indexer instance
+outbox_indexer = OutboxIndexer()
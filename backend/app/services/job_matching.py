@@ -2,8 +2,8 @@ import json
 import logging
 import traceback
 from typing import List, Dict, Any
-from openai import OpenAI
 from app.config.settings import settings
+from app.services.llm_gateway import llm_gateway
 from requests import Session
 from app.services.elasticsearch_service import ElasticsearchService
 from app.services.analysis_cache_service import AnalysisCacheService
@@ -21,7 +21,6 @@ class JobMatcher:
         self.openai_api_key = openai_api_key or settings.OPENAI_API_KEY 
         if not self.openai_api_key:
             raise ValueError("OpenAI API key is required. Check your settings.py file or provide it directly.")
-        self.openai_client = OpenAI(api_key=self.openai_api_key)
 
     def get_prompt_template(self, job_type: str, cv_content: str = "") -> str:
         """Return the complete prompt for GPT to analyze candidate-job fit"""
@@ -300,7 +299,8 @@ class JobMatcher:
             """
             
             logger.info(f"Calling OpenAI API for candidate {candidate_id}")
-            response = self.openai_client.chat.completions.create(
+            response = llm_gateway.chat(
+                "job_matching",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -417,7 +417,8 @@ def analyze_candidate_cv_with_job(job_id: int, candidate_ids: List[int], current
             "title": job.title,
             "description": job.description,
             "competence_phare": job.competence_phare if hasattr(job, "competence_phare") else None,
-            "job_type_etiquette": job.job_type_etiquette if hasattr(job, "job_type_etiquette") else "technique"
+            "job_type_etiquette": job.job_type_etiquette if hasattr(job, "job_type_etiquette") else "technique",
+            "search_profile": job.search_profile
         }
 
         es_service = ElasticsearchService()
@@ -450,20 +451,13 @@ def analyze_candidate_cv_with_job(job_id: int, candidate_ids: List[int], current
                 }
             logger.info(f"Elasticsearch found {len(candidate_ids)} candidates: {candidate_ids}")
         else:
+            # One ids-filtered query scores exactly the requested candidates
+            es_scores = es_service.score_candidates_for_job(job_id, candidate_ids, min_score=0.1, job_info=job_info)
             for candidate_id in candidate_ids:
-                es_single_result = es_service.filter_candidates_by_job(
-                    job_id, 
-                    min_score=0.1, 
-                    limit=1, 
-                    job_info={"title": job.title, "id": job.id}
-                )
-                if es_single_result and es_single_result.get("suggested_candidates"):
-                    for c in es_single_result.get("suggested_candidates", []):
-                        if int(c["id"]) == int(candidate_id):
-                            es_candidates_map[int(candidate_id)] = {
-                                "match_reason": c.get("match_reason", "Correspondance par Elasticsearch")
-                            }
-                            break
+                if int(candidate_id) in es_scores:
+                    es_candidates_map[int(candidate_id)] = {
+                        "match_reason": es_scores[int(candidate_id)]["match_reason"]
+                    }
                 if int(candidate_id) not in es_candidates_map:
                     es_candidates_map[int(candidate_id)] = {
                         "match_reason": "Candidat spécifié manuellement"
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from app.config.settings import settings
+from app.services.cv_text import estimate_tokens
+from app.services.search_metrics import Histogram
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds (milliseconds) of the LLM latency histogram buckets
+LLM_LATENCY_BUCKETS_MS = (250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000)
+
+# USD per million tokens (input, output), for the cost estimate of the metrics
+MODEL_PRICES_PER_MTOK = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+}
+
+# Completion tokens reserved in the token bucket when the call sets no max_tokens
+DEFAULT_COMPLETION_RESERVATION = 1000
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """
+    Per-minute budget refilled continuously. `reserve` takes the amount right away (the
+    balance may go negative) and returns how long the caller has to wait for it, so
+    sync and async callers share one bucket and sleep in their own way.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            paused = max(0.0, self.paused_until - now)
+            if self.capacity <= 0:  # pas de limite, seulement les pauses après un 429
+                return paused
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            self.available -= min(amount, self.capacity)
+            wait = -self.available / self.rate if self.available < 0 else 0.0
+            return max(wait, paused)
+
+    def pause(self, seconds: float):
+        """Hold every caller back after a 429 (the API asked to wait `seconds`)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class _ModelLimits:
+    def __init__(self, model: str):
+        overrides = settings.LLM_MODEL_LIMITS.get(model, {})
+        self.concurrency = int(overrides.get("concurrency", settings.LLM_MAX_CONCURRENCY))
+        self.requests = TokenBucket(overrides.get("rpm", settings.LLM_REQUESTS_PER_MINUTE))
+        self.tokens = TokenBucket(overrides.get("tpm", settings.LLM_TOKENS_PER_MINUTE))
+        self.thread_slots = threading.BoundedSemaphore(self.concurrency)
+        self.async_slots: Optional[asyncio.Semaphore] = None
+
+    def reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def pause(self, seconds: float):
+        self.requests.pause(seconds)
+
+
+class _CallStats:
+    def __init__(self):
+        self.latency_ms = Histogram(LLM_LATENCY_BUCKETS_MS)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Delay requested by the API (retry-after-ms / retry-after headers), in seconds."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except Exception:
+        return None
+
+
+def _request_tokens(kwargs: Dict[str, Any]) -> int:
+    """Tokens the call counts against the per-minute budget: its messages plus max_tokens."""
+    model = kwargs["model"]
+    prompt = sum(estimate_tokens(str(message.get("content") or ""), model) + 4 for message in kwargs.get("messages", []))
+    return prompt + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_RESERVATION)
+
+
+class LLMGateway:
+    """
+    Single way out to the OpenAI API for the whole backend.
+
+    One sync and one async client per process share their HTTP connection pools.
+    Each model has a concurrency limit and token-bucket rate limits (requests and
+    tokens per minute). Timeouts, 429s, connection errors and 5xx are retried with
+    exponential backoff and jitter, honoring retry-after; a 429 also holds back the
+    other callers of that model. Every call records latency, tokens and estimated
+    cost, tagged by caller.
+    """
+
+    def __init__(self):
+        self._client: Optional[OpenAI] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._limits: Dict[str, _ModelLimits] = {}
+        self._stats: Dict[tuple, _CallStats] = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+
+    # ------------------------------------------------------------------ #
+    # Clients and limits
+    # ------------------------------------------------------------------ #
+    def _http_limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=settings.LLM_MAX_CONNECTIONS,
+                            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS)
+
+    @property
+    def client(self) -> OpenAI:
+        with self._lock:
+            if self._client is None:
+                # Les retries sont faits ici (backoff + quotas partagés), pas par le SDK
+                self._client = OpenAI(
+                    api_key=settings.OPENAI_API_KEY, timeout=settings.LLM_REQUEST_TIMEOUT, max_retries=0,
+                    http_client=httpx.Client(limits=self._http_limits(), timeout=settings.LLM_REQUEST_TIMEOUT),
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = AsyncOpenAI(
+                    api_key=settings.OPENAI_API_KEY, timeout=settings.LLM_REQUEST_TIMEOUT, max_retries=0,
+                    http_client=httpx.AsyncClient(limits=self._http_limits(), timeout=settings.LLM_REQUEST_TIMEOUT),
+                )
+            return self._async_client
+
+    def _model_limits(self, model: str) -> _ModelLimits:
+        with self._lock:
+            if model not in self._limits:
+                self._limits[model] = _ModelLimits(model)
+            return self._limits[model]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, settings.LLM_RETRY_MAX_DELAY)
+        delay = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        # Quota épuisé : réessayer n'y changera rien
+        return isinstance(error, RETRYABLE_ERRORS) and getattr(error, "code", None) != "insufficient_quota"
+
+    # ------------------------------------------------------------------ #
+    # Calls
+    # ------------------------------------------------------------------ #
+    def chat(self, caller: str, **kwargs):
+        """`chat.completions.create(**kwargs)` through the limits and retries; `caller` tags the metrics."""
+        limits = self._model_limits(kwargs["model"])
+        tokens = _request_tokens(kwargs)
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            wait = limits.reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                with limits.thread_slots:
+                    response = self.client.chat.completions.create(**kwargs)
+            except Exception as error:
+                delay = self._on_error(caller, kwargs["model"], limits, attempt, error, start)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._record(caller, kwargs["model"], start, response)
+            return response
+
+    async def achat(self, caller: str, **kwargs):
+        """Same as `chat`, on the async client."""
+        limits = self._model_limits(kwargs["model"])
+        if limits.async_slots is None:
+            # Créé dans la boucle d'événements de l'application
+            limits.async_slots = asyncio.Semaphore(limits.concurrency)
+        tokens = _request_tokens(kwargs)
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            wait = limits.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            try:
+                async with limits.async_slots:
+                    response = await self.async_client.chat.completions.create(**kwargs)
+            except Exception as error:
+                delay = self._on_error(caller, kwargs["model"], limits, attempt, error, start)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._record(caller, kwargs["model"], start, response)
+            return response
+
+    def _on_error(self, caller: str, model: str, limits: _ModelLimits, attempt: int,
+                  error: Exception, start: float) -> Optional[float]:
+        """Record a failed attempt; the delay before the next one, None when it must not be retried."""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rate_limited = isinstance(error, openai.RateLimitError)
+        retry = self._retryable(error) and attempt < settings.LLM_MAX_RETRIES
+        delay = self._backoff(attempt, error) if retry else None
+        if rate_limited and delay:
+            limits.pause(delay)
+        with self._lock:
+            stats = self._stats.setdefault((caller, model), _CallStats())
+            stats.latency_ms.observe(elapsed_ms)
+            stats.rate_limited += rate_limited
+            if retry:
+                stats.retries += 1
+            else:
+                stats.calls += 1
+                stats.errors += 1
+        if retry:
+            logger.warning(f"🔁 {caller} ({model}) attempt {attempt + 1} failed: {type(error).__name__}, "
+                           f"retrying in {delay:.1f}s")
+        else:
+            logger.error(f"{caller} ({model}) failed after {attempt + 1} attempts: {str(error)}")
+        return delay
+
+    def _record(self, caller: str, model: str, start: float, response):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        prices = MODEL_PRICES_PER_MTOK.get(model) or next(
+            (price for name, price in MODEL_PRICES_PER_MTOK.items() if model.startswith(name)), None
+        )
+        cost = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000 if prices else 0.0
+        with self._lock:
+            stats = self._stats.setdefault((caller, model), _CallStats())
+            stats.latency_ms.observe(elapsed_ms)
+            stats.calls += 1
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost_usd += cost
+        logger.info(f"🤖 {caller} ({model}): {elapsed_ms:.0f} ms, {prompt_tokens}+{completion_tokens} tokens, ${cost:.4f}")
+
+    # ------------------------------------------------------------------ #
+    # Metrics
+    # ------------------------------------------------------------------ #
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.started_at.isoformat(),
+                "callers": [
+                    {
+                        "caller": caller,
+                        "model": model,
+                        "calls": stats.calls,
+                        "errors": stats.errors,
+                        "retries": stats.retries,
+                        "rate_limited": stats.rate_limited,
+                        "prompt_tokens": stats.prompt_tokens,
+                        "completion_tokens": stats.completion_tokens,
+                        "cost_usd": round(stats.cost_usd, 4),
+                        "latency_ms": stats.latency_ms.snapshot(),
+                    }
+                    for (caller, model), stats in sorted(self._stats.items())
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started_at = datetime.now()
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition of the per-caller LLM metrics."""
+        lines = []
+        with self._lock:
+            metric = "llm_request_milliseconds"
+            lines.append(f"# HELP {metric} Duration of LLM API calls (each attempt)")
+            lines.append(f"# TYPE {metric} histogram")
+            for (caller, model), stats in sorted(self._stats.items()):
+                labels = f'caller="{caller}",model="{model}"'
+                cumulative = 0
+                for bound, count in zip([str(b) for b in stats.latency_ms.buckets] + ["+Inf"], stats.latency_ms.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{labels}}} {stats.latency_ms.sum:.3f}')
+                lines.append(f'{metric}_count{{{labels}}} {stats.latency_ms.count}')
+            for metric, attribute in (("llm_calls_total", "calls"), ("llm_errors_total", "errors"),
+                                      ("llm_retries_total", "retries"), ("llm_rate_limited_total", "rate_limited"),
+                                      ("llm_prompt_tokens_total", "prompt_tokens"),
+                                      ("llm_completion_tokens_total", "completion_tokens"),
+                                      ("llm_cost_usd_total", "cost_usd")):
+                lines.append(f"# TYPE {metric} counter")
+                for (caller, model), stats in sorted(self._stats.items()):
+                    lines.append(f'{metric}{{caller="{caller}",model="{model}"}} {getattr(stats, attribute)}')
+        return "\n".join(lines) + "\n"
+
+    async def aclose(self):
+        """Close the HTTP pools (application shutdown)."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+# Global gateway instance (limits and metrics are per worker process)
+llm_gateway = LLMGateway()
@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.candidate import Candidate
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# BM25 parameters (OpenSearch defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Titles flagged `is_intern` in the index and excluded from job suggestions
+EXCLUDED_TITLE_TERMS = {"stagiaire", "stage", "intern", "étudiant", "student", "alternance", "alternant", "élève"}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text) -> List[str]:
+    """Lowercased word tokens, like the standard analyzer."""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def is_intern_title(title) -> bool:
+    """Intern / apprentice title, excluded from job suggestions (indexed as `is_intern`)."""
+    return bool(EXCLUDED_TITLE_TERMS & set(tokenize(title)))
+
+
+def _minimum_should_match(term_count: int, ratio: float = 0.3) -> int:
+    return max(1, int(term_count * ratio))
+
+
+class _Field:
+    """Inverted index of one text field: postings with term frequencies and lengths for BM25."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict] = defaultdict(dict)
+        self.lengths: Dict = {}
+        self.terms: Dict = {}
+        self.total_length = 0
+
+    def add(self, key, tokens: List[str]):
+        self.remove(key)
+        if not tokens:
+            return
+        frequencies: Dict[str, int] = defaultdict(int)
+        for token in tokens:
+            frequencies[token] += 1
+        for token, frequency in frequencies.items():
+            self.postings[token][key] = frequency
+        self.terms[key] = list(frequencies)
+        self.lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, key):
+        length = self.lengths.pop(key, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for token in self.terms.pop(key):
+            postings = self.postings[token]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[token]
+
+    def match(self, query_terms: List[str], minimum_should_match: int = 1, keys=None) -> Dict:
+        """BM25 score of every key matching at least `minimum_should_match` distinct query terms."""
+        count = len(self.lengths)
+        if not count or not query_terms:
+            return {}
+        average_length = self.total_length / count
+        scores: Dict = defaultdict(float)
+        matched: Dict = defaultdict(int)
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                if keys is not None and key not in keys:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[key] / average_length)
+                scores[key] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                matched[key] += 1
+        return {key: score for key, score in scores.items() if matched[key] >= minimum_should_match}
+
+
+class LocalSearchIndex:
+    """
+    In-process job → candidates matcher, used when OpenSearch is unreachable (or
+    always with SEARCH_BACKEND=local).
+
+    Indexes candidate titles, experience titles and hard skills from Postgres and
+    scores them with BM25 using the same clauses, boosts and intern/alternance
+    exclusion as `ElasticsearchService.build_job_match_query`. Documents carry the
+    fields `_describe_match` reads, so results have the same shape as OpenSearch hits.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.documents: Dict[int, dict] = {}
+        self.titles = _Field()
+        self.experiences = _Field()  # keys: (candidate_id, position), scored like nested docs
+        self.skills_text = _Field()  # hard + soft skill names, like the skills_text copy_to field
+        self.skills: Dict[str, Set[int]] = defaultdict(set)
+        self.ready = False
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.synced_until = None
+        self._pending: Set[int] = set()
+        self._pending_lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Documents
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def document_from_candidate(candidate: Candidate) -> dict:
+        return {
+            "id": candidate.id,
+            "name": candidate.name,
+            "email": candidate.email,
+            "job_title": candidate.job_title,
+            "hard_skills": [{"name": skill.name} for skill in candidate.hard_skills if skill.name],
+            "soft_skills": [{"name": skill.name} for skill in candidate.soft_skills if skill.name],
+            "experiences": [
+                {"job_title": exp.job_title, "duration": exp.duration}
+                for exp in candidate.experiences
+            ],
+        }
+
+    def upsert(self, document: dict):
+        candidate_id = document["id"]
+        with self._lock:
+            self._remove_locked(candidate_id)
+            self.documents[candidate_id] = document
+            self.titles.add(candidate_id, tokenize(document.get("job_title")))
+            self.skills_text.add(candidate_id, [
+                token for skill in document["hard_skills"] + document["soft_skills"] for token in tokenize(skill["name"])
+            ])
+            for position, experience in enumerate(document["experiences"]):
+                self.experiences.add((candidate_id, position), tokenize(experience.get("job_title")))
+            for skill in document["hard_skills"]:
+                self.skills[skill["name"].lower()].add(candidate_id)
+
+    def remove(self, candidate_id: int):
+        with self._lock:
+            self._remove_locked(candidate_id)
+
+    def _remove_locked(self, candidate_id: int):
+        document = self.documents.pop(candidate_id, None)
+        if document is None:
+            return
+        self.titles.remove(candidate_id)
+        self.skills_text.remove(candidate_id)
+        for position in range(len(document["experiences"])):
+            self.experiences.remove((candidate_id, position))
+        for skill in document["hard_skills"]:
+            holders = self.skills.get(skill["name"].lower())
+            if holders is not None:
+                holders.discard(candidate_id)
+                if not holders:
+                    del self.skills[skill["name"].lower()]
+
+    # ------------------------------------------------------------------ #
+    # Loading from Postgres
+    # ------------------------------------------------------------------ #
+    def _load(self, db, ids=None, since=None, chunk_size=1000):
+        """Yield documents in id order, loading only the matched relationships."""
+        last_id = 0
+        while True:
+            query = db.query(Candidate).options(
+                selectinload(Candidate.hard_skills), selectinload(Candidate.soft_skills),
+                selectinload(Candidate.experiences)
+            )
+            if ids is not None:
+                query = query.filter(Candidate.id.in_(ids))
+            if since is not None:
+                query = query.filter(Candidate.updated_at >= since)
+            chunk = query.filter(Candidate.id > last_id).order_by(Candidate.id).limit(chunk_size).all()
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+            for candidate in chunk:
+                yield self.document_from_candidate(candidate)
+            db.expunge_all()
+
+    def build(self):
+        """Full (re)build from Postgres."""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            synced_until = db.query(func.now()).scalar()
+            fresh = LocalSearchIndex()
+            for document in self._load(db):
+                fresh.upsert(document)
+        finally:
+            db.close()
+
+        with self._lock:
+            self.documents = fresh.documents
+            self.titles = fresh.titles
+            self.experiences = fresh.experiences
+            self.skills_text = fresh.skills_text
+            self.skills = fresh.skills
+            self.synced_until = synced_until
+            self.built_at = time.time()
+            self.build_seconds = round(time.perf_counter() - start, 3)
+            self.ready = True
+        logger.info(f"✅ Local search index built: {len(self.documents)} candidates in {self.build_seconds}s")
+
+    def mark_changed(self, candidate_ids: Iterable[int]):
+        """Candidates written by this worker: re-read on the next poll."""
+        if not self.ready:
+            # Pas encore construit : la synchro par updated_at rattrapera ces écritures
+            return
+        with self._pending_lock:
+            self._pending.update(candidate_ids)
+
+    def refresh_candidates(self, candidate_ids: Iterable[int]) -> int:
+        """Re-read candidates from Postgres; those that no longer exist are dropped."""
+        candidate_ids = set(candidate_ids)
+        if not candidate_ids:
+            return 0
+        db = SessionLocal()
+        try:
+            seen = set()
+            for document in self._load(db, ids=list(candidate_ids)):
+                self.upsert(document)
+                seen.add(document["id"])
+        finally:
+            db.close()
+        for candidate_id in candidate_ids - seen:
+            self.remove(candidate_id)
+        return len(candidate_ids)
+
+    def apply_pending(self) -> int:
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        return self.refresh_candidates(pending)
+
+    def sync_changes(self) -> int:
+        """
+        Catch up with writes made by other workers: candidates whose updated_at moved
+        since the last sync, plus deletions found by comparing the id sets.
+        """
+        db = SessionLocal()
+        try:
+            now = db.query(func.now()).scalar()
+            since = self.synced_until - timedelta(seconds=settings.DELTA_SYNC_OVERLAP_SECONDS)
+            changed = 0
+            for document in self._load(db, since=since):
+                self.upsert(document)
+                changed += 1
+            existing = {row[0] for row in db.query(Candidate.id).all()}
+        finally:
+            db.close()
+
+        with self._lock:
+            deleted = [candidate_id for candidate_id in self.documents if candidate_id not in existing]
+        for candidate_id in deleted:
+            self.remove(candidate_id)
+        self.synced_until = now
+        return changed + len(deleted)
+
+    # ------------------------------------------------------------------ #
+    # Matching
+    # ------------------------------------------------------------------ #
+    def search(self, job_title, competence_phare, position_terms, domain_terms, limit=10,
+               candidate_ids=None, exclude_interns=True):
+        """
+        Score candidates against a job with the clauses of the OpenSearch job query.
+        Returns [(score, document)] sorted by descending score.
+        """
+        keys = set(candidate_ids) if candidate_ids is not None else None
+        domain_tokens = tokenize(" ".join(domain_terms))
+        title_tokens = tokenize(job_title)
+        competence_tokens = tokenize(competence_phare)
+
+        with self._lock:
+            scores: Dict[int, float] = defaultdict(float)
+
+            # title_phrase : tous les termes, dans l'ordre
+            if title_tokens:
+                for candidate_id, score in self.titles.match(title_tokens, len(set(title_tokens)), keys).items():
+                    if self._contains_phrase(tokenize(self.documents[candidate_id].get("job_title")), title_tokens):
+                        scores[candidate_id] += 3.0 * score
+
+            # title_domain
+            if domain_tokens:
+                minimum = _minimum_should_match(len(set(domain_tokens)))
+                for candidate_id, score in self.titles.match(domain_tokens, minimum, keys).items():
+                    scores[candidate_id] += 5.0 * score
+
+                # experience_domain : meilleure expérience (score_mode max)
+                experience_keys = None
+                if keys is not None:
+                    experience_keys = {key for key in self.experiences.lengths if key[0] in keys}
+                best: Dict[int, float] = {}
+                for (candidate_id, _), score in self.experiences.match(domain_tokens, minimum, experience_keys).items():
+                    best[candidate_id] = max(best.get(candidate_id, 0.0), score)
+                for candidate_id, score in best.items():
+                    scores[candidate_id] += 2.0 * 4.0 * score
+
+            # competence : best_fields entre le titre et les compétences
+            if competence_tokens:
+                minimum = _minimum_should_match(len(set(competence_tokens)))
+                best_fields: Dict[int, float] = defaultdict(float)
+                for candidate_id, score in self.titles.match(competence_tokens, minimum, keys).items():
+                    best_fields[candidate_id] = 1.5 * score
+                for candidate_id, score in self.skills_text.match(competence_tokens, minimum, keys).items():
+                    best_fields[candidate_id] = max(best_fields[candidate_id], 2.0 * score)
+                for candidate_id, score in best_fields.items():
+                    scores[candidate_id] += 2.5 * score
+
+            # skills_domain : terme exact (normalisé en minuscules) sur le nom de compétence, score constant
+            skill_holders = set()
+            for term in domain_terms:
+                skill_holders |= self.skills.get(term.lower(), set())
+            for candidate_id in skill_holders:
+                if keys is None or candidate_id in keys:
+                    scores[candidate_id] += 2.0
+
+            results = []
+            for candidate_id, score in scores.items():
+                document = self.documents[candidate_id]
+                if exclude_interns and is_intern_title(document.get("job_title")):
+                    continue
+                results.append((score, document))
+
+        results.sort(key=lambda item: (-item[0], item[1]["id"]))
+        return results[:limit] if limit else results
+
+    @staticmethod
+    def _contains_phrase(tokens: List[str], phrase: List[str]) -> bool:
+        size = len(phrase)
+        return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "ready": self.ready,
+            "candidates": len(self.documents),
+            "title_terms": len(self.titles.postings),
+            "experience_terms": len(self.experiences.postings),
+            "skills": len(self.skills),
+            "pending_updates": pending,
+            "build_seconds": self.build_seconds,
+            "synced_until": self.synced_until.isoformat() if self.synced_until else None,
+        }
+
+
+class LocalSearchUpdater:
+    def __init__(self, index: LocalSearchIndex):
+        self.index = index
+        self.is_running = False
+        self.poll_interval = settings.LOCAL_SEARCH_POLL_INTERVAL
+        self.sync_interval = settings.LOCAL_SEARCH_SYNC_INTERVAL
+        self.last_sync = None
+
+    async def start(self):
+        """Build the local index, then keep it up to date"""
+        if self.is_running:
+            logger.info("Local search updater already running")
+            return
+
+        self.is_running = True
+        logger.info("🚀 Building local search index (fallback for OpenSearch)")
+
+        while self.is_running and not self.index.ready:
+            try:
+                await asyncio.to_thread(self.index.build)
+            except Exception as e:
+                logger.error(f"❌ Local search index build failed: {e}")
+                await asyncio.sleep(60)
+        self.last_sync = time.monotonic()
+
+        while self.is_running:
+            try:
+                await asyncio.sleep(self.poll_interval)
+                await asyncio.to_thread(self.index.apply_pending)
+                if time.monotonic() - self.last_sync >= self.sync_interval:
+                    await asyncio.to_thread(self.index.sync_changes)
+                    self.last_sync = time.monotonic()
+            except Exception as e:
+                logger.error(f"❌ Local search update error: {e}")
+                await asyncio.sleep(10)
+
+    def stop(self):
+        """Stop the local index updates"""
+        self.is_running = False
+        logger.info("🛑 Stopping local search updater")
+
+
+# Global local index (one per worker process)
+local_search_index = LocalSearchIndex()
+local_search_updater = LocalSearchUpdater(local_search_index)
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from opensearchpy import OpenSearch
+from app.config.settings import settings
+from app.services.search_metrics import MeteredConnection
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# One client (and therefore one keep-alive connection pool) per host and per worker process
+_clients: Dict[str, OpenSearch] = {}
+_health_monitors: Dict[str, "ClusterHealthMonitor"] = {}
+_registry_lock = threading.Lock()
+
+
+def _resolve_host(host: Optional[str] = None) -> str:
+    return host or settings.ELASTICSEARCH_URL
+
+
+def _build_client(url: str) -> OpenSearch:
+    """Build an OpenSearch client. No network call is made here."""
+    use_ssl = url.lower().startswith("https")
+    http_auth = None
+    if settings.ELASTICSEARCH_USERNAME:
+        http_auth = (settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD)
+
+    client = OpenSearch(
+        hosts=[url],
+        http_auth=http_auth,
+        timeout=settings.ELASTICSEARCH_TIMEOUT,
+        max_retries=3,
+        retry_on_timeout=True,
+        use_ssl=use_ssl,
+        verify_certs=True,
+        ssl_show_warn=False,
+        pool_maxsize=settings.ELASTICSEARCH_POOL_MAXSIZE,
+        connection_class=MeteredConnection,
+        headers={'Content-Type': 'application/json'},
+    )
+    logger.info(f"OpenSearch client created for {url} (pool size {settings.ELASTICSEARCH_POOL_MAXSIZE})")
+    return client
+
+
+def get_opensearch_client(host: Optional[str] = None) -> OpenSearch:
+    """
+    Return the process-wide OpenSearch client for a host, creating it on first use.
+    """
+    url = _resolve_host(host)
+    client = _clients.get(url)
+    if client is None:
+        with _registry_lock:
+            client = _clients.get(url)
+            if client is None:
+                client = _build_client(url)
+                _clients[url] = client
+    return client
+
+
+class ClusterHealthMonitor:
+    """
+    Cached cluster health for one host.
+
+    The first call probes synchronously (once per process); afterwards callers always
+    get the cached result and a stale entry is refreshed by a background thread.
+    """
+
+    def __init__(self, host: Optional[str] = None, ttl: Optional[int] = None):
+        self.host = _resolve_host(host)
+        self.ttl = ttl if ttl is not None else settings.ELASTICSEARCH_HEALTH_TTL
+        self._last: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self, request_timeout: Optional[int] = None) -> Dict[str, Any]:
+        """Probe the cluster now (blocking) and update the cache."""
+        timeout = request_timeout or settings.ELASTICSEARCH_HEALTH_TIMEOUT
+        start = time.perf_counter()
+        try:
+            health = get_opensearch_client(self.host).cluster.health(request_timeout=timeout)
+            result = {
+                "available": True,
+                "status": health.get("status", "unknown"),
+                "number_of_nodes": health.get("number_of_nodes"),
+                "unassigned_shards": health.get("unassigned_shards"),
+                "error": None,
+            }
+        except Exception as e:
+            result = {
+                "available": False,
+                "status": "unavailable",
+                "number_of_nodes": None,
+                "unassigned_shards": None,
+                "error": str(e),
+            }
+
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["checked_at"] = time.time()
+
+        previous = self._last
+        self._last = result
+        if previous is None or previous["status"] != result["status"]:
+            if result["available"]:
+                logger.info(f"✅ OpenSearch cluster health at {self.host}: {result['status']}")
+            else:
+                logger.error(f"❌ OpenSearch unavailable at {self.host}: {result['error']}")
+        return result
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="opensearch-health", daemon=True).start()
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Last known health without triggering any probe."""
+        return self._last
+
+    def get(self) -> Dict[str, Any]:
+        """Cached health; only the very first call of the process blocks."""
+        last = self._last
+        if last is None:
+            return self.refresh()
+        if time.time() - last["checked_at"] > self.ttl:
+            self._refresh_in_background()
+        return last
+
+    def is_available(self) -> bool:
+        return self.get()["available"]
+
+
+def get_cluster_health_monitor(host: Optional[str] = None) -> ClusterHealthMonitor:
+    url = _resolve_host(host)
+    monitor = _health_monitors.get(url)
+    if monitor is None:
+        with _registry_lock:
+            monitor = _health_monitors.get(url)
+            if monitor is None:
+                monitor = ClusterHealthMonitor(url)
+                _health_monitors[url] = monitor
+    return monitor
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.parse_cache import ParseCacheEntry
+from app.services.contact_extractor import apply_contact_fallback, contact_hints, extract_contacts
+from app.services.cv_parser import (
+    RESUME_PARSER_MODEL, RESUME_PROMPT_VERSION,
+    create_fallback_response, extract_cv_text, process_text_with_openai,
+)
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """
+    Content-addressed cache of CV parsing, stored in Postgres.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes plus the prompt version and
+    model, so re-uploading the same file costs a hash and one primary-key lookup instead
+    of file detection, extraction and the LLM call. When only the prompt or the model
+    changed, the extracted text of the file is reused and only the LLM step runs again.
+    Failed LLM calls keep the extracted text but no JSON, so the next upload retries them.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = settings.PARSE_CACHE_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.text_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    @staticmethod
+    def content_hash(binary_data: bytes) -> str:
+        return hashlib.sha256(binary_data).hexdigest()
+
+    def parse_cv(self, binary_data: bytes) -> Dict[str, Any]:
+        """
+        Parse an uploaded CV, going through the cache first.
+
+        Returns a dict with `parsed_data`, `file_type`, `sha256` and `cache` ("hit", "text_hit", "miss" or "disabled"). Unparseable files give
+        the fallback response, like `parse_cv`.
+        """
+        digest = self.content_hash(binary_data)
+        entry, complete = self.lookup(digest)
+        result = self.cached_result(entry, complete, digest)
+        if complete:
+            return result
+
+        if entry is not None:
+            extracted_text = entry.extracted_text
+        else:
+            try:
+                file_type, extracted_text = extract_cv_text(binary_data)
+            except Exception as extraction_error:
+                logger.error(f"CV extraction failed: {str(extraction_error)}")
+                return {**result, "parsed_data": create_fallback_response()}
+            result["file_type"] = file_type
+
+        contacts = extract_contacts(extracted_text)
+        try:
+            parsed_data = apply_contact_fallback(process_text_with_openai(extracted_text, contact_hints(contacts)), contacts)
+        except ValueError as openai_error:
+            logger.error(f"OpenAI processing failed: {str(openai_error)}")
+            parsed_data = None
+
+        self.store(digest, result["file_type"], extracted_text, parsed_data)
+        return {
+            **result,
+            "parsed_data": parsed_data if parsed_data is not None else apply_contact_fallback(create_fallback_response(), contacts),
+        }
+
+    def lookup(self, digest: str) -> Tuple[Optional[ParseCacheEntry], bool]:
+        """
+        Cached entry of a file and whether it is complete (parsed with the current
+        prompt/model). An incomplete entry still provides the extracted text.
+        """
+        if not self.enabled:
+            return None, False
+        entry, exact = self._lookup(digest)
+        complete = exact and entry.parsed_json is not None
+        if complete:
+            self._count("hits")
+            logger.info(f"♻️ Parse cache hit for {digest[:12]}")
+        elif entry is not None:
+            # Même fichier, autre prompt/modèle (ou LLM en échec) : seule l'extraction est réutilisée
+            self._count("text_hits")
+        else:
+            self._count("misses")
+        return entry, complete
+
+    def cached_result(self, entry: Optional[ParseCacheEntry], complete: bool, digest: str) -> Dict[str, Any]:
+        """
+        Result dict of `parse_cv` filled from a lookup (without `parsed_data` unless
+        complete).
+        """
+        if not self.enabled:
+            status = "disabled"
+        else:
+            status = "hit" if complete else "text_hit" if entry is not None else "miss"
+        result = {"sha256": digest, "file_type": None, "cache": status}
+        if entry is not None:
+            result["file_type"] = entry.file_type
+        if complete:
+            result["parsed_data"] = json.loads(entry.parsed_json)
+        return result
+
+    def _lookup(self, digest: str) -> Tuple[Optional[ParseCacheEntry], bool]:
+        """
+        Entry for the current prompt/model (exact=True), else any entry of the same
+        file, whose extracted text is still valid. One primary-key prefix scan.
+        """
+        try:
+            db = SessionLocal()
+            try:
+                entries = db.query(ParseCacheEntry).filter(ParseCacheEntry.sha256 == digest).all()
+            finally:
+                db.close()
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Parse cache read failed: {str(e)}")
+            return None, False
+        for entry in entries:
+            if entry.prompt_version == RESUME_PROMPT_VERSION and entry.model == RESUME_PARSER_MODEL:
+                return entry, True
+        return (entries[0], False) if entries else (None, False)
+
+    def store(self, digest: str, file_type: str, extracted_text: str, parsed_data: Optional[dict]):
+        """Record the extraction (and the parsed JSON, None when the LLM failed) of a file."""
+        if not self.enabled:
+            return
+        try:
+            db = SessionLocal()
+            try:
+                values = {
+                    "file_type": file_type,
+                    "extracted_text": extracted_text,
+                    "parsed_json": json.dumps(parsed_data, ensure_ascii=False) if parsed_data is not None else None,
+                }
+                db.execute(
+                    pg_insert(ParseCacheEntry.__table__)
+                    .values(sha256=digest, prompt_version=RESUME_PROMPT_VERSION, model=RESUME_PARSER_MODEL, **values)
+                    .on_conflict_do_update(index_elements=["sha256", "prompt_version", "model"], set_=values)
+                )
+                db.commit()
+                self._count("stores")
+            finally:
+                db.close()
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Parse cache write failed for {digest[:12]}: {str(e)}")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.text_hits + self.misses
+        stats = {
+            "enabled": self.enabled,
+            "prompt_version": RESUME_PROMPT_VERSION,
+            "model": RESUME_PARSER_MODEL,
+            "hits": self.hits,
+            "text_hits": self.text_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "extraction_skip_rate": round((self.hits + self.text_hits) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "errors": self.errors,
+            "entries": None,
+        }
+        try:
+            db = SessionLocal()
+            try:
+                stats["entries"] = db.query(ParseCacheEntry).count()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Could not count parse cache entries: {str(e)}")
+        return stats
+
+
+# Global cache instance (counters are per worker process)
+parse_cache = ParseCache()
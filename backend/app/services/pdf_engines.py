@@ -0,0 +1,260 @@
+import asyncio
+import io
+import logging
+import signal
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+from app.config.settings import settings
+from app.services.cv_text import PAGE_BREAK
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # installed with pdfplumber >= 0.10
+    pdfium = None
+
+try:
+    import fitz  # PyMuPDF, optional
+except ImportError:
+    fitz = None
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# PDF content, or path of a spooled upload
+PdfSource = Union[bytes, str]
+
+
+class PdfExtractionTimeout(Exception):
+    pass
+
+
+@contextmanager
+def extraction_deadline(seconds: Optional[float]):
+    """
+    Abort the extraction after `seconds` (SIGALRM, so only in the main thread of a
+    process, which is where the extraction pool runs its tasks; a no-op elsewhere).
+    """
+    if not seconds or seconds <= 0 or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise PdfExtractionTimeout(f"PDF extraction exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class PdfEngine(ABC):
+    """Text extraction backend: page count and plain text of a page range."""
+    name = ""
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def page_count(self, source: PdfSource) -> int:
+        ...
+
+    @abstractmethod
+    def extract_pages(self, source: PdfSource, start: int, stop: int) -> List[str]:
+        ...
+
+
+class PdfiumEngine(PdfEngine):
+    """PDFium text layer: no layout analysis, an order of magnitude faster than pdfplumber."""
+    name = "pdfium"
+
+    @property
+    def available(self) -> bool:
+        return pdfium is not None
+
+    def page_count(self, source: PdfSource) -> int:
+        document = pdfium.PdfDocument(source)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+    def extract_pages(self, source: PdfSource, start: int, stop: int) -> List[str]:
+        document = pdfium.PdfDocument(source)
+        try:
+            pages = []
+            for page_number in range(start, min(stop, len(document))):
+                page = document[page_number]
+                textpage = page.get_textpage()
+                try:
+                    pages.append(textpage.get_text_range())
+                finally:
+                    textpage.close()
+                    page.close()
+            return pages
+        finally:
+            document.close()
+
+
+class PdfplumberEngine(PdfEngine):
+    """pdfplumber (pdfminer layout analysis): slow, kept for files the fast engines read badly."""
+    name = "pdfplumber"
+
+    @staticmethod
+    def _open(source: PdfSource):
+        import pdfplumber
+        return pdfplumber.open(source if isinstance(source, str) else io.BytesIO(source))
+
+    def page_count(self, source: PdfSource) -> int:
+        with self._open(source) as pdf:
+            return len(pdf.pages)
+
+    def extract_pages(self, source: PdfSource, start: int, stop: int) -> List[str]:
+        pages = []
+        with self._open(source) as pdf:
+            for page_number, page in enumerate(pdf.pages[start:stop], start=start):
+                try:
+                    pages.append(page.extract_text() or "")
+                except Exception as page_error:
+                    logger.warning(f"Failed to extract text from page {page_number + 1}: {str(page_error)}")
+                    pages.append("")
+                finally:
+                    page.close()  # libère le cache de layout de la page
+        return pages
+
+
+class PymupdfEngine(PdfEngine):
+    """PyMuPDF, when installed."""
+    name = "pymupdf"
+
+    @property
+    def available(self) -> bool:
+        return fitz is not None
+
+    @staticmethod
+    def _open(source: PdfSource):
+        return fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+
+    def page_count(self, source: PdfSource) -> int:
+        with self._open(source) as document:
+            return document.page_count
+
+    def extract_pages(self, source: PdfSource, start: int, stop: int) -> List[str]:
+        with self._open(source) as document:
+            return [document[page_number].get_text() for page_number in range(start, min(stop, document.page_count))]
+
+
+PDF_ENGINES: Dict[str, PdfEngine] = {
+    engine.name: engine for engine in (PdfiumEngine(), PdfplumberEngine(), PymupdfEngine())
+}
+
+
+def get_pdf_engine(name: Optional[str] = None) -> PdfEngine:
+    """Configured engine (CV_PDF_ENGINE), falling back to pdfplumber when it is not installed."""
+    engine = PDF_ENGINES.get(name or settings.CV_PDF_ENGINE)
+    if engine is None:
+        raise ValueError(f"Unknown PDF engine: {name or settings.CV_PDF_ENGINE}")
+    if not engine.available:
+        logger.warning(f"PDF engine {engine.name} is not installed, using pdfplumber")
+        return PDF_ENGINES["pdfplumber"]
+    return engine
+
+
+def needs_fallback(text: str, pages: int) -> bool:
+    """Too little text for the number of pages: scanned pages, or a text layer the fast engine misreads."""
+    return len(text.strip()) < settings.CV_PDF_MIN_CHARS_PER_PAGE * max(1, pages)
+
+
+def page_limit(page_count: int, max_pages: Optional[int]) -> int:
+    max_pages = settings.CV_PDF_MAX_PAGES if max_pages is None else max_pages
+    return min(page_count, max_pages) if max_pages and max_pages > 0 else page_count
+
+
+def extract_pdf_pages(source: PdfSource, start: int, stop: int, engine_name: Optional[str] = None,
+                      timeout: Optional[float] = None) -> str:
+    """Text of pages [start, stop) with one engine (a unit of work of the extraction pool)."""
+    engine = get_pdf_engine(engine_name)
+    with extraction_deadline(timeout):
+        return PAGE_BREAK.join(page.strip() for page in engine.extract_pages(source, start, stop) if page and page.strip())
+
+
+def pdf_page_count(source: PdfSource) -> int:
+    return get_pdf_engine().page_count(source)
+
+
+def extract_pdf_text(source: PdfSource, engine_name: Optional[str] = None, max_pages: Optional[int] = None,
+                     timeout: Optional[float] = None) -> str:
+    """
+    Text of the first CV_PDF_MAX_PAGES pages (separated by PAGE_BREAK) with the configured
+    engine, retried with the fallback engine when the result looks incomplete. Runs in
+    the calling process.
+    """
+    timeout = settings.CV_PDF_EXTRACTION_TIMEOUT if timeout is None else timeout
+    engine = get_pdf_engine(engine_name)
+    start = time.perf_counter()
+    with extraction_deadline(timeout):
+        pages = page_limit(engine.page_count(source), max_pages)
+        text = ""
+        try:
+            text = PAGE_BREAK.join(page.strip() for page in engine.extract_pages(source, 0, pages) if page and page.strip())
+        except PdfExtractionTimeout:
+            raise
+        except Exception as e:
+            logger.warning(f"PDF engine {engine.name} failed: {str(e)}")
+
+        fallback = PDF_ENGINES.get(settings.CV_PDF_FALLBACK_ENGINE)
+        if fallback is not None and fallback is not engine and fallback.available and needs_fallback(text, pages):
+            logger.info(f"PDF text from {engine.name} looks incomplete ({len(text)} chars for {pages} pages), "
+                        f"retrying with {fallback.name}")
+            fallback_text = PAGE_BREAK.join(page.strip() for page in fallback.extract_pages(source, 0, pages) if page and page.strip())
+            if len(fallback_text) > len(text):
+                text = fallback_text
+    logger.info(f"Extracted {len(text)} characters from {pages} PDF pages in {time.perf_counter() - start:.3f}s")
+    return text
+
+
+async def extract_pdf_text_parallel(source: PdfSource, executor, page_count: int,
+                                    max_pages: Optional[int] = None) -> str:
+    """
+    Same as `extract_pdf_text` for long documents: page ranges of CV_PDF_PAGES_PER_TASK
+    pages are extracted concurrently by the processes of `executor`. The document
+    timeout applies to each range (they run in parallel) and to the whole document.
+    """
+    loop = asyncio.get_running_loop()
+    timeout = settings.CV_PDF_EXTRACTION_TIMEOUT
+    pages = page_limit(page_count, max_pages)
+    per_task = max(1, settings.CV_PDF_PAGES_PER_TASK)
+    ranges = [(start, min(start + per_task, pages)) for start in range(0, pages, per_task)]
+
+    async def run(engine_name):
+        parts = await asyncio.wait_for(
+            asyncio.gather(*(
+                loop.run_in_executor(executor, extract_pdf_pages, source, start, stop, engine_name, timeout)
+                for start, stop in ranges
+            )),
+            timeout=timeout + 1 if timeout else None,
+        )
+        return PAGE_BREAK.join(part for part in parts if part)
+
+    engine = get_pdf_engine()
+    text = ""
+    try:
+        text = await run(engine.name)
+    except (PdfExtractionTimeout, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        logger.warning(f"PDF engine {engine.name} failed: {str(e)}")
+
+    fallback = PDF_ENGINES.get(settings.CV_PDF_FALLBACK_ENGINE)
+    if fallback is not None and fallback is not engine and fallback.available and needs_fallback(text, pages):
+        logger.info(f"PDF text from {engine.name} looks incomplete, retrying {pages} pages with {fallback.name}")
+        fallback_text = await run(fallback.name)
+        if len(fallback_text) > len(text):
+            text = fallback_text
+    return text
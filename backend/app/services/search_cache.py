@@ -0,0 +1,229 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.search_cache import SearchCacheEntry, SearchIndexGeneration
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Generation counter of the candidates index
+CANDIDATES_GENERATION = "candidates"
+
+
+class SearchResultCache:
+    """
+    Bounded LRU + TTL cache of job → candidates search results.
+
+    Keys hash the query inputs together with an index generation counter, so every
+    change shipped to the index makes older entries unreachable (they age out of the
+    LRU). In shared mode the generation lives in Postgres and results are also stored
+    in a Postgres table, so all workers see the same generation and reuse each other's
+    results; the in-process LRU stays in front as the first level.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[int] = None, shared: Optional[bool] = None):
+        self.max_entries = max_entries or settings.SEARCH_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.SEARCH_CACHE_TTL
+        self.shared = settings.SEARCH_CACHE_SHARED if shared is None else shared
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, job_id, value)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generation_checked_at = 0.0
+        self._puts = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------ #
+    # Index generation
+    # ------------------------------------------------------------------ #
+    def generation(self) -> int:
+        if not self.shared:
+            return self._generation
+        # Relu au plus une fois par intervalle pour garder les hits sous la milliseconde
+        if time.monotonic() - self._generation_checked_at > settings.SEARCH_CACHE_GENERATION_POLL:
+            try:
+                db = SessionLocal()
+                try:
+                    value = db.query(SearchIndexGeneration.generation).filter(
+                        SearchIndexGeneration.name == CANDIDATES_GENERATION
+                    ).scalar()
+                finally:
+                    db.close()
+                self._generation = value or 0
+                self._generation_checked_at = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Could not read shared index generation: {str(e)}")
+        return self._generation
+
+    def bump_generation(self):
+        """Called whenever candidate documents are written to the index."""
+        with self._lock:
+            self._generation += 1
+        if not self.shared:
+            return
+        try:
+            db = SessionLocal()
+            try:
+                table = SearchIndexGeneration.__table__
+                db.execute(
+                    pg_insert(table)
+                    .values(name=CANDIDATES_GENERATION, generation=1)
+                    .on_conflict_do_update(index_elements=["name"], set_={"generation": table.c.generation + 1})
+                )
+                db.commit()
+            finally:
+                db.close()
+            self._generation_checked_at = 0.0
+        except Exception as e:
+            logger.warning(f"Could not bump shared index generation: {str(e)}")
+
+    # ------------------------------------------------------------------ #
+    # Lookups
+    # ------------------------------------------------------------------ #
+    def make_key(self, job_title: str, job_description: str, competence_phare: str, limit: int, min_score: float) -> str:
+        payload = json.dumps(
+            [job_title or "", job_description or "", competence_phare or "", limit, min_score, self.generation()],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared:
+            value = self._get_shared(key)
+            if value is not None:
+                self.shared_hits += 1
+                self._store_local(key, value[0], value[1])
+                return copy.deepcopy(value[1])
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any], job_id: Optional[int] = None):
+        self._store_local(key, job_id, copy.deepcopy(value))
+        if self.shared:
+            self._put_shared(key, value, job_id)
+
+    def _store_local(self, key: str, job_id: Optional[int], value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, job_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_shared(self, key: str):
+        try:
+            db = SessionLocal()
+            try:
+                entry = db.query(SearchCacheEntry).filter(
+                    SearchCacheEntry.key == key,
+                    SearchCacheEntry.expires_at > datetime.now(timezone.utc)
+                ).first()
+                return (entry.job_id, json.loads(entry.result_json)) if entry else None
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Shared search cache read failed: {str(e)}")
+            return None
+
+    def _put_shared(self, key: str, value: Dict[str, Any], job_id: Optional[int]):
+        try:
+            db = SessionLocal()
+            try:
+                table = SearchCacheEntry.__table__
+                expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+                result_json = json.dumps(value, ensure_ascii=False, default=str)
+                db.execute(
+                    pg_insert(table)
+                    .values(key=key, job_id=job_id, result_json=result_json, expires_at=expires_at)
+                    .on_conflict_do_update(index_elements=["key"], set_={"result_json": result_json, "expires_at": expires_at})
+                )
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    db.query(SearchCacheEntry).filter(
+                        SearchCacheEntry.expires_at <= datetime.now(timezone.utc)
+                    ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Shared search cache write failed: {str(e)}")
+
+    # ------------------------------------------------------------------ #
+    # Invalidation / stats
+    # ------------------------------------------------------------------ #
+    def invalidate_job(self, job_id: int) -> int:
+        """Drop every cached result computed for a job (called when the job is edited)."""
+        with self._lock:
+            keys = [key for key, (_, entry_job_id, _) in self._entries.items() if entry_job_id == job_id]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        if self.shared:
+            try:
+                db = SessionLocal()
+                try:
+                    db.query(SearchCacheEntry).filter(SearchCacheEntry.job_id == job_id).delete(synchronize_session=False)
+                    db.commit()
+                finally:
+                    db.close()
+            except Exception as e:
+                logger.warning(f"Shared search cache invalidation failed for job {job_id}: {str(e)}")
+        if keys:
+            logger.info(f"Search cache: {len(keys)} entries invalidated for job {job_id}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "shared": self.shared,
+            "generation": self._generation,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Global cache instance (one per worker process)
+search_result_cache = SearchResultCache()
+
+
+def bump_index_generation():
+    """Mark the candidates index as changed: cached search results stop matching."""
+    search_result_cache.bump_generation()
@@ -0,0 +1,237 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from opensearchpy import Urllib3HttpConnection
+from app.config.settings import settings
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Bytes of the last OpenSearch request/response of the current thread
+_last_exchange = threading.local()
+
+
+class MeteredConnection(Urllib3HttpConnection):
+    """OpenSearch connection that remembers the request and response sizes of each call."""
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        status, response_headers, data = super().perform_request(
+            method, url, params=params, body=body, timeout=timeout, ignore=ignore, headers=headers
+        )
+        _last_exchange.request_bytes = len(body) if body else 0
+        _last_exchange.response_bytes = len(data.encode("utf-8") if isinstance(data, str) else data or b"")
+        return status, response_headers, data
+
+
+def _take_exchange_sizes():
+    sizes = (getattr(_last_exchange, "request_bytes", None), getattr(_last_exchange, "response_bytes", None))
+    _last_exchange.request_bytes = None
+    _last_exchange.response_bytes = None
+    return sizes
+
+
+class Histogram:
+    """
+    Bucketed histogram with exact count/sum/max. `counts` (and `snapshot()["buckets"]`)
+    hold the observations of each bucket alone; `prometheus()` accumulates them into
+    the cumulative `le` buckets of the text format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class _OperationStats:
+    def __init__(self):
+        self.wall_ms = Histogram()
+        self.took_ms = Histogram()
+        self.errors = 0
+        self.hits = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+class _Probe:
+    """Filled by the caller inside `search_metrics.timed(...)`."""
+
+    def __init__(self):
+        self.response: Optional[dict] = None
+        self.hits: Optional[int] = None
+        self.context: Dict[str, Any] = {}
+
+
+class SearchMetrics:
+    """
+    Per-operation latency histograms (client wall time and server `took`), hit and
+    byte counters, and a ring buffer of the slowest calls (above SLOW_QUERY_THRESHOLD_MS)
+    with their query body, for the admin endpoints and the Prometheus export.
+    """
+
+    def __init__(self, threshold_ms: Optional[float] = None, log_size: Optional[int] = None):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else settings.SLOW_QUERY_THRESHOLD_MS
+        self.slow_queries = deque(maxlen=log_size or settings.SLOW_QUERY_LOG_SIZE)
+        self.operations: Dict[str, _OperationStats] = {}
+        self.started_at = datetime.now()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, operation: str, body: Optional[dict] = None, **context):
+        """
+        Time one operation. Set `probe.response` to the OpenSearch response (for
+        `took`, hits and errors) or `probe.hits` for non-OpenSearch backends.
+        """
+        probe = _Probe()
+        probe.context.update(context)
+        _take_exchange_sizes()
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield probe
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall_ms = (time.perf_counter() - start) * 1000
+            request_bytes, response_bytes = _take_exchange_sizes()
+            self.record(operation, wall_ms, probe, request_bytes, response_bytes, body, failed)
+
+    def record(self, operation, wall_ms, probe, request_bytes=None, response_bytes=None, body=None, failed=False):
+        response = probe.response or {}
+        took_ms = response.get("took")
+        hits = probe.hits
+        if hits is None and isinstance(response.get("hits"), dict):
+            total = response["hits"].get("total")
+            hits = total.get("value") if isinstance(total, dict) else total
+        if hits is None and "items" in response:
+            hits = len(response["items"])
+
+        with self._lock:
+            stats = self.operations.setdefault(operation, _OperationStats())
+            stats.wall_ms.observe(wall_ms)
+            if took_ms is not None:
+                stats.took_ms.observe(took_ms)
+            if failed or response.get("errors") is True:
+                stats.errors += 1
+            stats.hits += hits or 0
+            stats.request_bytes += request_bytes or 0
+            stats.response_bytes += response_bytes or 0
+
+            if wall_ms >= self.threshold_ms:
+                self.slow_queries.append({
+                    "at": datetime.now().isoformat(),
+                    "operation": operation,
+                    "wall_ms": round(wall_ms, 2),
+                    "took_ms": took_ms,
+                    "hits": hits,
+                    "request_bytes": request_bytes,
+                    "response_bytes": response_bytes,
+                    "failed": failed,
+                    "context": probe.context,
+                    "query": body,
+                })
+        if wall_ms >= self.threshold_ms:
+            logger.warning(f"🐢 Slow {operation}: {wall_ms:.0f} ms (took {took_ms} ms) {json.dumps(probe.context, default=str)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.started_at.isoformat(),
+                "slow_query_threshold_ms": self.threshold_ms,
+                "operations": {
+                    name: {
+                        "wall_ms": stats.wall_ms.snapshot(),
+                        "took_ms": stats.took_ms.snapshot(),
+                        "errors": stats.errors,
+                        "hits": stats.hits,
+                        "request_bytes": stats.request_bytes,
+                        "response_bytes": stats.response_bytes,
+                    }
+                    for name, stats in sorted(self.operations.items())
+                },
+            }
+
+    def slow_query_log(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent first."""
+        with self._lock:
+            entries = list(self.slow_queries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        with self._lock:
+            self.operations.clear()
+            self.slow_queries.clear()
+            self.started_at = datetime.now()
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition of the histograms and counters."""
+        lines = []
+        with self._lock:
+            for metric, attribute, help_text in (
+                ("search_wall_milliseconds", "wall_ms", "Client-side duration of search and indexing operations"),
+                ("search_took_milliseconds", "took_ms", "Server-side took reported by OpenSearch"),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, stats in sorted(self.operations.items()):
+                    histogram = getattr(stats, attribute)
+                    cumulative = 0
+                    for bound, count in zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{operation="{name}"}} {histogram.sum:.3f}')
+                    lines.append(f'{metric}_count{{operation="{name}"}} {histogram.count}')
+            for metric, attribute in (("search_errors_total", "errors"), ("search_hits_total", "hits"),
+                                      ("search_request_bytes_total", "request_bytes"),
+                                      ("search_response_bytes_total", "response_bytes")):
+                lines.append(f"# TYPE {metric} counter")
+                for name, stats in sorted(self.operations.items()):
+                    lines.append(f'{metric}{{operation="{name}"}} {getattr(stats, attribute)}')
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics (one per worker process)
+search_metrics = SearchMetrics()
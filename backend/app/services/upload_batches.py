@@ -0,0 +1,457 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.database.postgresql import SessionLocal
+from app.models.index_outbox import IndexOutbox
+from app.models.upload_batch import UploadBatch, UploadBatchFile
+from app.services.cv_ingestion import CandidatePersister, parse_upload
+from app.services.upload_stream import close_uploads, SpooledUpload
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# File states that end the progress of a file ("persisted" also does once the index wait is over)
+FINAL_FILE_STATUSES = {"indexed", "duplicate", "failed"}
+FINAL_BATCH_STATUSES = {"completed", "interrupted"}
+ACTIVE_BATCH_STATUSES = ("queued", "processing")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _heartbeat_age(status: Dict[str, Any]) -> float:
+    """Seconds since the worker of a batch last refreshed its heartbeat."""
+    value = status.get("heartbeat_at") or status.get("created_at")
+    if not value:
+        return 0.0
+    heartbeat = datetime.fromisoformat(value)
+    if heartbeat.tzinfo is None:
+        heartbeat = heartbeat.replace(tzinfo=timezone.utc)
+    return (_now() - heartbeat).total_seconds()
+
+
+def batch_status(db: Session, batch_id: str) -> Optional[Dict[str, Any]]:
+    """Batch state with per-file status and counts, as stored in Postgres."""
+    batch = db.query(UploadBatch).filter(UploadBatch.id == batch_id).first()
+    if batch is None:
+        return None
+    files = [
+        {
+            "file_index": f.file_index,
+            "status": f.status,
+            "file_type": f.file_type,
+            "parse_cache": f.parse_cache,
+            "candidate_id": f.candidate_id,
+            "error": f.error,
+            "updated_at": f.updated_at.isoformat() if f.updated_at else None,
+        }
+        for f in batch.files
+    ]
+    counts: Dict[str, int] = {}
+    for f in files:
+        counts[f["status"]] = counts.get(f["status"], 0) + 1
+    return {
+        "batch_id": batch.id,
+        "user_id": batch.user_id,
+        "status": batch.status,
+        "total_files": batch.total_files,
+        "counts": counts,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "started_at": batch.started_at.isoformat() if batch.started_at else None,
+        "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+        "heartbeat_at": batch.heartbeat_at.isoformat() if batch.heartbeat_at else None,
+        "files": files,
+    }
+
+
+class UploadBatchManager:
+    """
+    Runs CV upload batches in the background of the worker that received them.
+
+    Each batch goes through the ingestion pipeline (parse cache, extraction pool,
+    bounded LLM calls, batched persistence) and then waits for its candidates to
+    leave the index outbox. File progress is kept in memory, published to the
+    event streams of this worker as it happens, and written to Postgres by a single
+    flusher every CV_BATCH_FLUSH_INTERVAL, so the status endpoint and the streams
+    served by other workers see it too. The flusher also refreshes the batch
+    heartbeat: a batch left without one for CV_BATCH_STALE_AFTER (crashed or killed
+    worker) is marked interrupted at startup or by the streams following it.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._history: Dict[str, List[dict]] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._files: Dict[str, Dict[int, dict]] = {}
+        self._dirty: Dict[str, set] = {}
+
+    # ------------------------------------------------------------------ #
+    # Creation
+    # ------------------------------------------------------------------ #
+    def create_batch(self, db: Session, user_id: int, total_files: int,
+                     idempotency_key: Optional[str] = None) -> Tuple[UploadBatch, bool]:
+        """Create a queued batch, or return the existing one for the same Idempotency-Key."""
+        if idempotency_key:
+            existing = db.query(UploadBatch).filter(
+                UploadBatch.user_id == user_id, UploadBatch.idempotency_key == idempotency_key
+            ).first()
+            if existing is not None:
+                return existing, False
+
+        batch = UploadBatch(id=uuid.uuid4().hex, user_id=user_id, status="queued",
+                            idempotency_key=idempotency_key, total_files=total_files)
+        batch.files = [UploadBatchFile(file_index=idx, status="queued") for idx in range(total_files)]
+        db.add(batch)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Requête rejouée en parallèle avec la même clé
+            db.rollback()
+            existing = db.query(UploadBatch).filter(
+                UploadBatch.user_id == user_id, UploadBatch.idempotency_key == idempotency_key
+            ).first()
+            if existing is None:
+                raise
+            return existing, False
+        return batch, True
+
+    def start(self, batch_id: str, files: List[Union[str, SpooledUpload]], user_id: int, check_duplicates: bool = True):
+        """
+        Process the files (base64 strings or SpooledUploads, closed when done) in the background.
+        With `check_duplicates`, files whose email belongs to a known candidate skip the LLM.
+        """
+        self._history[batch_id] = []
+        self._subscribers.setdefault(batch_id, [])
+        self._files[batch_id] = {idx: {"status": "queued"} for idx in range(len(files))}
+        self._dirty[batch_id] = set()
+        task = asyncio.create_task(self._run(batch_id, files, user_id, check_duplicates))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    @staticmethod
+    def interrupt_stale_batches(batch_id: Optional[str] = None) -> int:
+        """
+        Mark interrupted the unfinished batches (or `batch_id`) whose worker stopped
+        sending heartbeats. Returns the number of batches marked.
+        """
+        cutoff = datetime.fromtimestamp(time.time() - settings.CV_BATCH_STALE_AFTER, timezone.utc)
+        db = SessionLocal()
+        try:
+            query = db.query(UploadBatch).filter(
+                UploadBatch.status.in_(ACTIVE_BATCH_STATUSES),
+                func.coalesce(UploadBatch.heartbeat_at, UploadBatch.created_at) < cutoff,
+            )
+            if batch_id is not None:
+                query = query.filter(UploadBatch.id == batch_id)
+            count = query.update({UploadBatch.status: "interrupted", UploadBatch.finished_at: _now()},
+                                 synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if count:
+            logger.warning(f"⚠️ {count} upload batches lost with their worker marked interrupted")
+        return count
+
+    def stop(self):
+        """Cancel the batches of this worker; they are marked interrupted."""
+        if not self._tasks:
+            return
+        logger.info(f"🛑 Interrupting {len(self._tasks)} upload batches")
+        batch_ids = list(self._tasks)
+        for task in list(self._tasks.values()):
+            task.cancel()
+        db = SessionLocal()
+        try:
+            db.query(UploadBatch).filter(UploadBatch.id.in_(batch_ids)).update(
+                {UploadBatch.status: "interrupted", UploadBatch.finished_at: _now()}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            logger.error(f"Could not mark upload batches as interrupted: {str(e)}")
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------ #
+    # Processing
+    # ------------------------------------------------------------------ #
+    async def _run(self, batch_id: str, files: List[Union[str, SpooledUpload]], user_id: int, check_duplicates: bool):
+        start = time.perf_counter()
+        flusher = asyncio.create_task(self._flush_loop(batch_id))
+        db = SessionLocal()
+        parsers = None
+        try:
+            await asyncio.to_thread(self._set_batch, batch_id, status="processing", started_at=_now(), heartbeat_at=_now())
+            persister = CandidatePersister(db, user_id)
+            parsed_queue: asyncio.Queue = asyncio.Queue()
+
+            async def parse_one(idx, upload):
+                # Chaque fichier doit produire un élément, sinon la boucle ci-dessous attend indéfiniment
+                try:
+                    item = await parse_upload(
+                        idx, upload,
+                        on_extracted=lambda partial: self._update(batch_id, idx, "extracted", file_type=partial["file_type"],
+                                                                  parse_cache=partial["cache"], sha256=partial["sha256"]),
+                        check_duplicates=check_duplicates
+                    )
+                    if item["status"] == "parsed":
+                        self._update(batch_id, idx, "parsed", file_type=item["file_type"],
+                                     parse_cache=item["cache"], sha256=item["sha256"])
+                    elif item["status"] == "duplicate":
+                        self._update(batch_id, idx, "duplicate", file_type=item["file_type"], parse_cache=item["cache"],
+                                     sha256=item["sha256"], candidate_id=item["duplicate"]["candidate_id"])
+                    else:
+                        self._update(batch_id, idx, "failed", error=item["error"])
+                except Exception as e:
+                    logger.error(f"Upload batch {batch_id}: file {idx} failed: {type(e).__name__}: {str(e)}")
+                    item = {"file_index": idx, "status": "failed", "error": f"Processing error: {str(e)}"}
+                    self._update(batch_id, idx, "failed", error=item["error"])
+                await parsed_queue.put(item)
+
+            parsers = asyncio.gather(*(parse_one(idx, upload) for idx, upload in enumerate(files)))
+
+            async def next_item():
+                # Attend aussi les parseurs : une erreur remonte au lieu de bloquer sur la file
+                getter = asyncio.ensure_future(parsed_queue.get())
+                done, _ = await asyncio.wait({getter, parsers}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    return getter.result()
+                if parsers.exception() is not None:
+                    getter.cancel()
+                    raise parsers.exception()
+                return await getter
+
+            # Persistance au fil de l'eau : tout ce qui est prêt part dans la même transaction
+            persisted_ids: Dict[int, int] = {}
+            received = 0
+            while received < len(files):
+                items = [await next_item()]
+                while len(items) < persister.batch_size and not parsed_queue.empty():
+                    items.append(parsed_queue.get_nowait())
+                received += len(items)
+                ready = [item for item in items if item["status"] == "parsed"]
+                if not ready:
+                    continue
+                outcomes = await asyncio.to_thread(persister.persist, ready)
+                for idx, outcome in outcomes.items():
+                    if outcome["status"] == "success":
+                        persisted_ids[outcome["candidate_id"]] = idx
+                        self._update(batch_id, idx, "persisted", candidate_id=outcome["candidate_id"])
+                    elif outcome["status"] == "duplicate":
+                        self._update(batch_id, idx, "duplicate")
+                    else:
+                        self._update(batch_id, idx, "failed", error=outcome.get("error"))
+            await parsers
+
+            await self._wait_for_index(batch_id, persisted_ids)
+
+            await asyncio.to_thread(self._flush, batch_id)
+            await asyncio.to_thread(self._set_batch, batch_id, status="completed", finished_at=_now())
+            counts: Dict[str, int] = {}
+            for state in self._files[batch_id].values():
+                counts[state["status"]] = counts.get(state["status"], 0) + 1
+            elapsed = round(time.perf_counter() - start, 3)
+            logger.info(f"✅ Upload batch {batch_id}: {len(files)} files in {elapsed}s {counts}")
+            self._publish(batch_id, {"event": "batch", "batch_id": batch_id, "status": "completed",
+                                     "counts": counts, "elapsed_seconds": elapsed})
+        except asyncio.CancelledError:
+            self._publish(batch_id, {"event": "batch", "batch_id": batch_id, "status": "interrupted"})
+            raise
+        except Exception as e:
+            logger.error(f"❌ Upload batch {batch_id} failed: {str(e)}")
+            try:
+                for idx, state in self._files[batch_id].items():
+                    if state["status"] not in FINAL_FILE_STATUSES | {"persisted"}:
+                        self._update(batch_id, idx, "failed", error=f"Batch error: {str(e)}")
+                await asyncio.to_thread(self._flush, batch_id)
+                await asyncio.to_thread(self._set_batch, batch_id, status="completed", finished_at=_now())
+            except Exception as flush_error:
+                logger.error(f"Could not record failure of upload batch {batch_id}: {str(flush_error)}")
+            self._publish(batch_id, {"event": "batch", "batch_id": batch_id, "status": "completed", "error": str(e)})
+        finally:
+            flusher.cancel()
+            if parsers is not None and not parsers.done():
+                parsers.cancel()
+            db.close()
+            close_uploads([f for f in files if isinstance(f, SpooledUpload)])
+            for queue in self._subscribers.pop(batch_id, []):
+                queue.put_nowait(None)
+            self._history.pop(batch_id, None)
+            self._files.pop(batch_id, None)
+            self._dirty.pop(batch_id, None)
+
+    async def _wait_for_index(self, batch_id: str, persisted_ids: Dict[int, int]):
+        """Mark files indexed as their candidates leave the outbox (up to CV_BATCH_INDEX_WAIT)."""
+        pending = dict(persisted_ids)
+        deadline = time.monotonic() + settings.CV_BATCH_INDEX_WAIT
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(settings.CV_BATCH_FLUSH_INTERVAL)
+            queued = await asyncio.to_thread(self._queued_candidates, list(pending))
+            for candidate_id in [candidate_id for candidate_id in pending if candidate_id not in queued]:
+                self._update(batch_id, pending.pop(candidate_id), "indexed", candidate_id=candidate_id)
+        if pending:
+            logger.warning(f"Upload batch {batch_id}: {len(pending)} candidates still waiting for indexing")
+
+    @staticmethod
+    def _queued_candidates(candidate_ids: List[int]) -> set:
+        db = SessionLocal()
+        try:
+            return {
+                candidate_id for (candidate_id,) in
+                db.query(IndexOutbox.candidate_id).filter(IndexOutbox.candidate_id.in_(candidate_ids)).distinct()
+            }
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------ #
+    # Progress
+    # ------------------------------------------------------------------ #
+    def _update(self, batch_id: str, idx: int, status: str, **fields):
+        state = self._files[batch_id][idx]
+        state.update({key: value for key, value in fields.items() if value is not None}, status=status)
+        self._dirty[batch_id].add(idx)
+        self._publish(batch_id, {"event": "file", "batch_id": batch_id, "file_index": idx, **state})
+
+    def _publish(self, batch_id: str, event: dict):
+        event = {**event, "at": _now().isoformat()}
+        if batch_id in self._history:
+            self._history[batch_id].append(event)
+        for queue in self._subscribers.get(batch_id, []):
+            queue.put_nowait(event)
+
+    async def _flush_loop(self, batch_id: str):
+        last_heartbeat = time.monotonic()
+        while True:
+            await asyncio.sleep(settings.CV_BATCH_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self._flush, batch_id)
+                if time.monotonic() - last_heartbeat >= settings.CV_BATCH_HEARTBEAT_INTERVAL:
+                    await asyncio.to_thread(self._set_batch, batch_id, heartbeat_at=_now())
+                    last_heartbeat = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Upload batch {batch_id}: progress flush failed: {str(e)}")
+
+    def _flush(self, batch_id: str):
+        """Write the files whose state changed since the last flush, in one transaction."""
+        dirty = self._dirty.get(batch_id)
+        if not dirty:
+            return
+        changes = {idx: dict(self._files[batch_id][idx]) for idx in list(dirty)}
+        dirty.difference_update(changes)
+        db = SessionLocal()
+        try:
+            rows = db.query(UploadBatchFile).filter(
+                UploadBatchFile.batch_id == batch_id, UploadBatchFile.file_index.in_(list(changes))
+            ).all()
+            for row in rows:
+                for key, value in changes[row.file_index].items():
+                    setattr(row, key, value)
+            db.commit()
+        except Exception:
+            db.rollback()
+            dirty.update(changes)
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _set_batch(batch_id: str, **values):
+        db = SessionLocal()
+        try:
+            db.query(UploadBatch).filter(UploadBatch.id == batch_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------ #
+    # Streaming
+    # ------------------------------------------------------------------ #
+    async def events(self, batch_id: str) -> AsyncIterator[dict]:
+        """
+        Progress events of a batch until it finishes. Batches running in this worker
+        are streamed live (history first); others are followed through Postgres.
+        """
+        if batch_id in self._tasks:
+            queue: asyncio.Queue = asyncio.Queue()
+            history = list(self._history.get(batch_id, []))
+            self._subscribers.setdefault(batch_id, []).append(queue)
+            try:
+                for event in history:
+                    yield event
+                    if event["event"] == "batch":
+                        return
+                while True:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=settings.CV_BATCH_HEARTBEAT_INTERVAL)
+                    except asyncio.TimeoutError:
+                        yield {"event": "heartbeat", "batch_id": batch_id, "at": _now().isoformat()}
+                        continue
+                    if event is None:
+                        return
+                    yield event
+                    if event["event"] == "batch":
+                        return
+            finally:
+                subscribers = self._subscribers.get(batch_id)
+                if subscribers and queue in subscribers:
+                    subscribers.remove(queue)
+            return
+
+        # Lot traité par un autre worker (ou terminé) : on suit l'état en base
+        seen: Dict[int, tuple] = {}
+        last_event_at = time.monotonic()
+        while True:
+            status = await asyncio.to_thread(self._load_status, batch_id)
+            if status is None:
+                return
+            for f in status["files"]:
+                key = (f["status"], f["candidate_id"], f["error"])
+                if seen.get(f["file_index"]) != key:
+                    seen[f["file_index"]] = key
+                    last_event_at = time.monotonic()
+                    yield {"event": "file", "batch_id": batch_id, **{k: v for k, v in f.items() if v is not None}}
+            if status["status"] not in FINAL_BATCH_STATUSES and _heartbeat_age(status) > settings.CV_BATCH_STALE_AFTER:
+                # Le worker qui traitait le lot a disparu sans le clore
+                await asyncio.to_thread(self.interrupt_stale_batches, batch_id)
+                status = await asyncio.to_thread(self._load_status, batch_id)
+                if status is None:
+                    return
+            if status["status"] in FINAL_BATCH_STATUSES:
+                yield {"event": "batch", "batch_id": batch_id, "status": status["status"], "counts": status["counts"],
+                       "at": _now().isoformat()}
+                return
+            if time.monotonic() - last_event_at >= settings.CV_BATCH_HEARTBEAT_INTERVAL:
+                last_event_at = time.monotonic()
+                yield {"event": "heartbeat", "batch_id": batch_id, "at": _now().isoformat()}
+            await asyncio.sleep(settings.CV_BATCH_FLUSH_INTERVAL)
+
+    @staticmethod
+    def _load_status(batch_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return batch_status(db, batch_id)
+        finally:
+            db.close()
+
+    def running(self) -> List[str]:
+        return list(self._tasks)
+
+
+def format_event(event: dict, sse: bool) -> str:
+    """One NDJSON line, or one Server-Sent Events message."""
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    if sse:
+        return f"event: {event.get('event', 'message')}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+# Global manager instance (batches run in the worker that accepted them)
+upload_batch_manager = UploadBatchManager()
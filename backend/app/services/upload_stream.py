@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from typing import List, Optional
+from fastapi import HTTPException, Request
+from app.config.settings import settings
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+class SpooledUpload:
+    """
+    One uploaded file, hashed while it is received. Kept in memory up to the spool
+    threshold, then moved to a named temporary file so the extraction processes can
+    open it by path instead of receiving its bytes.
+    """
+
+    def __init__(self, file_index: int, filename: Optional[str], content_type: Optional[str]):
+        self.file_index = file_index
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+        self._hash = hashlib.sha256()
+        self.sha256: Optional[str] = None
+
+    @property
+    def in_memory_size(self) -> int:
+        return self.size if self._buffer is not None else 0
+
+    def write(self, data: bytes):
+        self._hash.update(data)
+        self.size += len(data)
+        (self._buffer if self._buffer is not None else self._file).write(data)
+
+    def rollover(self):
+        """Move the content received so far to disk."""
+        if self._buffer is None:
+            return
+        self._file = tempfile.NamedTemporaryFile(prefix="cv-upload-", suffix=".upload", dir=settings.CV_UPLOAD_TMP_DIR or None,
+                                                 delete=False)
+        self.path = self._file.name
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def finish(self):
+        self.sha256 = self._hash.hexdigest()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def source(self):
+        """What the parser receives: the path when spooled to disk, else the (small) content."""
+        return self.path if self.path is not None else self._buffer.getvalue()
+
+    def read_bytes(self) -> bytes:
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.read()
+        return self._buffer.getvalue()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._buffer = None
+
+
+def close_uploads(uploads: List[SpooledUpload]):
+    for upload in uploads:
+        upload.close()
+
+
+async def receive_cv_files(request: Request, field: str = "files") -> List[SpooledUpload]:
+    """
+    Stream a multipart/form-data body into SpooledUploads, one per part of `field`.
+
+    Each part is hashed as it arrives and capped at CV_UPLOAD_MAX_FILE_SIZE (413).
+    Parts stay in memory below CV_UPLOAD_SPOOL_SIZE, and as long as all in-memory
+    parts of the request fit in CV_UPLOAD_MEMORY_BUDGET; beyond that they go to disk,
+    so the memory used by an upload does not grow with the number of files.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    uploads: List[SpooledUpload] = []
+    state = {"headers": {}, "header_field": b"", "header_value": b"", "current": None, "error": None}
+    pending: List[tuple] = []
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        filename = disposition.get(b"filename")
+        if name != field or filename is None:
+            state["current"] = None  # autres champs du formulaire ignorés
+            return
+        if len(uploads) >= settings.CV_UPLOAD_MAX_FILES:
+            state["error"] = HTTPException(status_code=413, detail=f"Too many files (max {settings.CV_UPLOAD_MAX_FILES})")
+            return
+        upload = SpooledUpload(len(uploads), filename.decode("utf-8", "replace"),
+                               state["headers"].get(b"content-type", b"").decode("latin-1") or None)
+        uploads.append(upload)
+        state["current"] = upload
+
+    def on_part_data(data, start, end):
+        if state["current"] is not None:
+            pending.append((state["current"], data[start:end]))
+
+    def on_part_end():
+        if state["current"] is not None:
+            pending.append((state["current"], None))
+        state["current"] = None
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    in_memory = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if state["error"] is not None:
+                raise state["error"]
+            for upload, data in pending:
+                if data is None:
+                    upload.finish()
+                    continue
+                if upload.size + len(data) > settings.CV_UPLOAD_MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File {upload.filename or upload.file_index} exceeds {settings.CV_UPLOAD_MAX_FILE_SIZE} bytes"
+                    )
+                if upload.path is None and (
+                    upload.size + len(data) > settings.CV_UPLOAD_SPOOL_SIZE
+                    or in_memory + len(data) > settings.CV_UPLOAD_MEMORY_BUDGET
+                ):
+                    in_memory -= upload.in_memory_size
+                    await asyncio.to_thread(upload.rollover)
+                if upload.path is None:
+                    upload.write(data)
+                    in_memory += len(data)
+                else:
+                    await asyncio.to_thread(upload.write, data)
+            pending.clear()
+        parser.finalize()
+    except Exception:
+        close_uploads(uploads)
+        raise
+
+    unfinished = [upload for upload in uploads if upload.sha256 is None]
+    if unfinished:
+        close_uploads(uploads)
+        raise HTTPException(status_code=400, detail="Incomplete multipart body")
+    logger.info(f"Received {len(uploads)} files ({sum(u.size for u in uploads)} bytes, "
+                f"{sum(1 for u in uploads if u.path)} spooled to disk)")
+    return uploads
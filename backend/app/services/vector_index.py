@@ -0,0 +1,385 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.config.settings import settings
+
+# numpy est optionnel : sans lui la recherche reste purement lexicale
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+# Bump when the embedding function changes: the stored matrix must then be rebuilt
+EMBEDDING_VERSION = 1
+
+# French → English vocabulary of job titles and skills, so "Ingénieur Data" and
+# "Data Engineer" produce the same features. Multi-word entries are replaced first.
+SYNONYMS = {
+    "chef de projet": "project manager",
+    "science des donnees": "data science",
+    "analyse de donnees": "data analysis",
+    "apprentissage automatique": "machine learning",
+    "intelligence artificielle": "ai",
+    "ressources humaines": "hr",
+    "base de donnees": "database",
+    "bases de donnees": "database",
+    "ingenieur": "engineer",
+    "ingenieure": "engineer",
+    "developpeur": "developer",
+    "developpeuse": "developer",
+    "developpement": "development",
+    "donnees": "data",
+    "analyste": "analyst",
+    "architecte": "architect",
+    "securite": "security",
+    "cybersecurite": "cybersecurity",
+    "reseau": "network",
+    "reseaux": "network",
+    "informatique": "it",
+    "logiciel": "software",
+    "logiciels": "software",
+    "gestionnaire": "manager",
+    "responsable": "manager",
+    "directeur": "director",
+    "directrice": "director",
+    "technicien": "technician",
+    "technicienne": "technician",
+    "administrateur": "administrator",
+    "administratrice": "administrator",
+    "systeme": "system",
+    "systemes": "system",
+    "commercial": "sales",
+    "commerciale": "sales",
+    "comptable": "accountant",
+    "comptabilite": "accounting",
+    "finance": "finance",
+    "chercheur": "researcher",
+    "formateur": "trainer",
+    "concepteur": "designer",
+    "conceptrice": "designer",
+    "qualite": "quality",
+    "essais": "testing",
+    "tests": "testing",
+}
+
+STOP_WORDS = {"de", "du", "des", "en", "et", "la", "le", "les", "a", "d", "l", "un", "une", "au", "aux",
+              "of", "the", "and", "in", "for", "on", "with", "to"}
+
+_PHRASE_SYNONYMS = sorted((k for k in SYNONYMS if " " in k), key=len, reverse=True)
+_WORD_RE = re.compile(r"[a-z0-9+#.]+")
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_tokens(text) -> List[str]:
+    """Lowercase, accent-free, FR→EN normalized word tokens without stop words."""
+    if not text:
+        return []
+    text = _strip_accents(str(text).lower())
+    for phrase in _PHRASE_SYNONYMS:
+        if phrase in text:
+            text = text.replace(phrase, SYNONYMS[phrase])
+    tokens = []
+    for token in _WORD_RE.findall(text):
+        token = token.strip(".")
+        if not token or token in STOP_WORDS:
+            continue
+        tokens.append(SYNONYMS.get(token, token))
+    return tokens
+
+
+def _feature(key: str, dim: int) -> Tuple[int, float]:
+    """Stable (process independent) hashed bucket and sign of a feature."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, (1.0 if (value >> 63) & 1 else -1.0)
+
+
+def embed_fields(fields: Iterable[Tuple[str, float]], dim: Optional[int] = None):
+    """
+    Hashing-trick embedding of weighted text fields: word features plus character
+    trigrams (robust to plurals and typos), L2-normalized float32. Returns None when
+    there is nothing to embed.
+    """
+    dim = dim or settings.VECTOR_INDEX_DIM
+    vector = np.zeros(dim, dtype=np.float32)
+    for text, weight in fields:
+        for token in normalize_tokens(text):
+            bucket, sign = _feature("w:" + token, dim)
+            vector[bucket] += sign * weight
+            if len(token) >= 4:
+                padded = f"#{token}#"
+                for i in range(len(padded) - 2):
+                    bucket, sign = _feature("c:" + padded[i:i + 3], dim)
+                    vector[bucket] += sign * weight * 0.25
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        return None
+    return vector / norm
+
+
+def embed_candidate(candidate) -> Optional["np.ndarray"]:
+    """Profile of a candidate: current title, experience titles and hard skills."""
+    fields = [(candidate.job_title, 2.0)]
+    fields.extend((exp.job_title, 1.0) for exp in candidate.experiences)
+    fields.extend((skill.name, 1.0) for skill in candidate.hard_skills)
+    return embed_fields(fields)
+
+
+def embed_job(job_title, competence_phare, skills=None) -> Optional["np.ndarray"]:
+    """Profile of a job: title, key competence and the skills of its search profile."""
+    fields = [(job_title, 2.0), (competence_phare, 1.5)]
+    fields.extend((skill, 1.0) for skill in skills or [])
+    return embed_fields(fields)
+
+
+class VectorIndex:
+    """
+    On-disk candidate embeddings: a float32 matrix and an aligned int64 id array,
+    both memory-mapped, plus a small meta.json.
+
+    Every worker maps the same files. Writers take an exclusive file lock and bump
+    the generation in meta.json; readers compare its mtime before each query and
+    remap when another process wrote. Top-k is a brute force dot product (vectors
+    are normalized, so this is the cosine), which stays in the tens of milliseconds
+    for 100k profiles on one core.
+    """
+
+    def __init__(self, path: Optional[str] = None, dim: Optional[int] = None):
+        self.path = path or settings.VECTOR_INDEX_PATH
+        self.dim = dim or settings.VECTOR_INDEX_DIM
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self.capacity = 0
+        self.count = 0
+        self.generation = 0
+        self.vectors = None
+        self.ids = None
+        self.id_to_row: Dict[int, int] = {}
+        self.free_rows: List[int] = []
+
+    @property
+    def available(self) -> bool:
+        return NUMPY_AVAILABLE and settings.SEMANTIC_SEARCH_ENABLED
+
+    # ------------------------------------------------------------------ #
+    # Files
+    # ------------------------------------------------------------------ #
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            with open(self._file("lock"), "a+") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload_if_changed()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        self.generation += 1
+        meta = {
+            "version": EMBEDDING_VERSION,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "count": self.count,
+            "generation": self.generation,
+        }
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        meta = self._read_meta()
+        if meta.get("version") != EMBEDDING_VERSION or meta.get("dim") != self.dim:
+            logger.warning(f"Vector index at {self.path} was built with another embedding, rebuild it")
+            self._meta_mtime = mtime
+            self.capacity = self.count = 0
+            self.vectors = self.ids = None
+            self.id_to_row, self.free_rows = {}, []
+            return
+
+        self.capacity = meta["capacity"]
+        self.count = meta["count"]
+        self.generation = meta["generation"]
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self.ids = np.memmap(self._file("ids.i64"), dtype=np.int64, mode="r+", shape=(self.capacity,))
+        used = self.ids[:self.count]
+        rows = np.nonzero(used >= 0)[0]
+        self.id_to_row = dict(zip(used[rows].tolist(), rows.tolist()))
+        self.free_rows = np.nonzero(used < 0)[0].tolist()
+        self._meta_mtime = mtime
+
+    def _grow(self, needed: int):
+        capacity = max(1024, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        vectors = np.memmap(self._file("vectors.f32.tmp"), dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        ids = np.memmap(self._file("ids.i64.tmp"), dtype=np.int64, mode="w+", shape=(capacity,))
+        ids[:] = -1
+        if self.capacity:
+            vectors[:self.capacity] = self.vectors
+            ids[:self.capacity] = self.ids
+        vectors.flush()
+        ids.flush()
+        os.replace(self._file("vectors.f32.tmp"), self._file("vectors.f32"))
+        os.replace(self._file("ids.i64.tmp"), self._file("ids.i64"))
+        self.vectors, self.ids, self.capacity = vectors, ids, capacity
+
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    def upsert(self, embeddings: Dict[int, Optional["np.ndarray"]]) -> int:
+        """Store candidate embeddings (None removes the candidate)."""
+        if not self.available or not embeddings:
+            return 0
+        with self._write_lock():
+            removed = [candidate_id for candidate_id, vector in embeddings.items() if vector is None]
+            self._delete_locked(removed)
+            new_ids = [cid for cid, vector in embeddings.items() if vector is not None and cid not in self.id_to_row]
+            appended = max(0, len(new_ids) - len(self.free_rows))
+            self._grow(self.count + appended)
+
+            for candidate_id, vector in embeddings.items():
+                if vector is None:
+                    continue
+                row = self.id_to_row.get(candidate_id)
+                if row is None:
+                    if self.free_rows:
+                        row = self.free_rows.pop()
+                    else:
+                        row = self.count
+                        self.count += 1
+                    self.id_to_row[candidate_id] = row
+                    self.ids[row] = candidate_id
+                self.vectors[row] = vector
+            self.vectors.flush()
+            self.ids.flush()
+            self._write_meta()
+        return len(embeddings)
+
+    def delete(self, candidate_ids: Iterable[int]):
+        if not self.available:
+            return
+        with self._write_lock():
+            self._delete_locked(candidate_ids)
+            if self.ids is not None:
+                self.vectors.flush()
+                self.ids.flush()
+                self._write_meta()
+
+    def _delete_locked(self, candidate_ids: Iterable[int]):
+        for candidate_id in candidate_ids:
+            row = self.id_to_row.pop(candidate_id, None)
+            if row is not None:
+                self.ids[row] = -1
+                self.vectors[row] = 0.0
+                self.free_rows.append(row)
+
+    def reset(self):
+        """Drop every vector (before a full rebuild)."""
+        with self._write_lock():
+            if self.ids is not None:
+                self.ids[:] = -1
+                self.vectors[:] = 0.0
+            self.count = 0
+            self.id_to_row, self.free_rows = {}, []
+            if self.ids is not None:
+                self._write_meta()
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def search(self, query_vector, k: int = 50, candidate_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k candidates by cosine similarity: [(candidate_id, similarity)]."""
+        if not self.available or query_vector is None:
+            return []
+        with self._lock:
+            self._reload_if_changed()
+            if not self.count:
+                return []
+            if candidate_ids is not None:
+                rows = [self.id_to_row[cid] for cid in candidate_ids if cid in self.id_to_row]
+                if not rows:
+                    return []
+                rows = np.asarray(rows)
+                scores = self.vectors[rows] @ query_vector
+                ids = self.ids[rows]
+            else:
+                scores = np.asarray(self.vectors[:self.count] @ query_vector)
+                ids = self.ids[:self.count]
+                scores[ids < 0] = -np.inf
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._reload_if_changed()
+            return {
+                "available": self.available,
+                "numpy_available": NUMPY_AVAILABLE,
+                "path": self.path,
+                "dim": self.dim,
+                "vectors": len(self.id_to_row),
+                "capacity": self.capacity,
+                "generation": self.generation,
+                "size_bytes": self.capacity * self.dim * 4,
+            }
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: Optional[int] = None) -> Dict[int, float]:
+    """RRF: each ranking adds 1 / (k + rank) to the ids it contains."""
+    k = k or settings.RRF_K
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, candidate_id in enumerate(ranking, start=1):
+            fused[candidate_id] = fused.get(candidate_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+# Global vector index (the files are shared by every worker)
+vector_index = VectorIndex()
@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from app.schemas.user import TokenData
 from app.models.user import User
 from app.database.postgresql import get_db
+from app.config.settings import settings
+import hmac
 import os
 import logging
 
@@ -197,6 +199,12 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+def get_metrics_reader(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    """Prometheus scrapes with METRICS_SCRAPE_TOKEN as bearer token; anyone else must be admin"""
+    if settings.METRICS_SCRAPE_TOKEN and hmac.compare_digest(token, settings.METRICS_SCRAPE_TOKEN):
+        return None
+    return get_admin_user(get_current_user(db=db, token=token))
+
 def get_recruiter_user(current_user: User = Depends(get_current_user)):
     # Instead of checking for specific roles, allow all roles
     # This effectively allows any authenticated user to access recruiter endpoints
@@ -1,7 +1,7 @@
 import json
 from typing import Any, Dict, List, Optional, Tuple
-from openai import OpenAI
 from app.config.settings import settings
+from app.services.llm_gateway import llm_gateway
 import logging
 import re
 
@@ -100,8 +100,6 @@ def extract_basic_job_fields(description: str) -> Dict[str, Any]:
         Dict[str, Any]: A dictionary containing basic job fields
     """
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
         # Use a more detailed prompt to improve extraction accuracy
         prompt = (
             "Analyze the following job description and extract:\n"
@@ -120,7 +118,8 @@ def extract_basic_job_fields(description: str) -> Dict[str, Any]:
         )
 
         # Make the API call
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "extract_basic_job_fields",
             model="gpt-3.5-turbo",  # Can be upgraded to "gpt-4" for better accuracy if needed
             messages=[
                 {"role": "system", "content": "You are a specialized job description analyzer that extracts key information accurately."},
@@ -201,8 +200,6 @@ def extract_job_skills(description: str) -> Dict[str, List[str]]:
         Dict[str, List[str]]: A dictionary containing lists of identified skills
     """
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
         prompt = (
             "You are given a job description (in any language). Extract and organize all relevant skills into the following categories:\n\n"
             "1. **Technical Skills (Hard Skills)** – Include all tools, technologies, programming languages, domain-specific methodologies, certifications, or systems mentioned.\n"
@@ -213,7 +210,8 @@ def extract_job_skills(description: str) -> Dict[str, List[str]]:
             f"Job Description:\n{description}"
         )
 
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "extract_job_skills",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a specialized skill extractor for job descriptions in any language."},
@@ -258,8 +256,6 @@ def extract_french_contract_details(description: str) -> Dict[str, Any]:
         Dict[str, Any]: A dictionary of French contract details
     """
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
         prompt = (
             "From the following French job description, extract these specific contract details:\n\n"
             "1. contract_type: Type of contract (CDI, CDD, stage, alternance, etc.)\n"
@@ -275,7 +271,8 @@ def extract_french_contract_details(description: str) -> Dict[str, Any]:
             f"Description:\n{description}"
         )
 
-        response = client.chat.completions.create(
+        response = llm_gateway.chat(
+            "extract_french_contract_details",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a specialized French job contract analyzer."},
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import create_engine, BigInteger
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+
+# Types PostgreSQL rendus en SQLite pour les tests qui ont besoin d'une base
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(ARRAY, "sqlite")
+def _array_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_on_sqlite(type_, compiler, **kw):
+    # INTEGER PRIMARY KEY : auto-incrément SQLite
+    return "INTEGER"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a file SQLite database with every model table (one connection per session)."""
+    import app.models.user, app.models.job, app.models.candidate  # noqa: F401 (mappers)
+    from app.database.postgresql import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
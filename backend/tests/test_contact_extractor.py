@@ -0,0 +1,86 @@
+from app.services.contact_extractor import extract_contacts, contact_hints, apply_contact_fallback
+
+
+def empty_result():
+    return {"CandidateInfo": {"FullName": "Marie Curie", "Email": "Not Provided", "PhoneNumber": {}}}
+
+
+def test_extract_contacts_reads_the_header_fields():
+    contacts = extract_contacts(
+        "Marie CURIE\n"
+        "Tél : +33 (0)6 12 34 56 78 / 01.23.45.67.89\n"
+        "Marie.Curie@Example.com\n"
+        "linkedin.com/in/marie-curie-123/  github.com/mcurie\n"
+    )
+
+    assert contacts["emails"] == ["marie.curie@example.com"]
+    assert [phone["FormattedNumber"] for phone in contacts["phones"]] == ["+33 612345678", "0123456789"]
+    assert contacts["linkedin"] == "https://www.linkedin.com/in/marie-curie-123"
+    assert contacts["github"] == "https://github.com/mcurie"
+
+
+def test_extract_contacts_international_prefixes():
+    phones = extract_contacts("Mobile: +216 22 333 444\nFixe: 0033 1 44 55 66 77")["phones"]
+
+    assert [(phone["ISDCode"], phone["Number"]) for phone in phones] == [("+216", "22333444"), ("+33", "144556677")]
+
+
+def test_extract_contacts_ignores_identifiers_and_dates():
+    contacts = extract_contacts(
+        "Jean Dupont\n"
+        "SIRET 123 456 789 00012\n"
+        "N° étudiant 21804567\n"
+        "12/05/2020\n"
+        "2018 - 2021 Acme\n"
+    )
+
+    assert contacts["phones"] == []
+
+
+def test_extract_contacts_skips_reserved_github_paths():
+    contacts = extract_contacts("https://github.com/features https://github.com/jdupont")
+
+    assert contacts["github"] == "https://github.com/jdupont"
+
+
+def test_contact_hints():
+    assert contact_hints(extract_contacts("Aucun contact")) == ""
+    hints = contact_hints(extract_contacts("jean@acme.fr 06 12 34 56 78"))
+    assert "Email: jean@acme.fr" in hints
+    assert "Phone: 0612345678" in hints
+
+
+def test_apply_contact_fallback_fills_missing_fields():
+    contacts = extract_contacts("jean.dupont@acme.fr\n06 12 34 56 78\nlinkedin.com/in/jdupont")
+
+    info = apply_contact_fallback(empty_result(), contacts)["CandidateInfo"]
+
+    assert info["Email"] == "jean.dupont@acme.fr"
+    assert info["PhoneNumber"]["Number"] == "0612345678"
+    assert info["Linkedin"] == "https://www.linkedin.com/in/jdupont"
+    assert "Github" not in info
+
+
+def test_apply_contact_fallback_keeps_parsed_values():
+    parsed = empty_result()
+    parsed["CandidateInfo"]["Email"] = "marie@curie.fr"
+    parsed["CandidateInfo"]["PhoneNumber"] = {"Number": "0700000000"}
+
+    info = apply_contact_fallback(parsed, extract_contacts("jean@acme.fr 06 12 34 56 78"))["CandidateInfo"]
+
+    assert info["Email"] == "marie@curie.fr"
+    assert info["PhoneNumber"] == {"Number": "0700000000"}
+
+
+def test_apply_contact_fallback_never_stores_an_identifier_as_phone():
+    contacts = extract_contacts("Jean Dupont\nSIRET 123 456 789 00012")
+
+    info = apply_contact_fallback(empty_result(), contacts)["CandidateInfo"]
+
+    assert info["PhoneNumber"] == {}
+
+
+def test_apply_contact_fallback_without_contacts():
+    parsed = empty_result()
+
+    assert apply_contact_fallback(parsed, None) is parsed
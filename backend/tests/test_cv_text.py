@@ -0,0 +1,62 @@
+from app.services.cv_text import PAGE_BREAK, estimate_tokens, normalize_cv_text, fit_to_budget
+
+MODEL = "gpt-3.5-turbo"
+
+
+def test_normalize_removes_running_headers_and_page_numbers():
+    header = "Jean Dupont - Développeur Java"
+    pages = [
+        [header, "Expérience", "Acme 2020-2023", "Java, Spring", "Kafka", "Page 1/2"],
+        [header, "Formation", "Master informatique", "Université de Lyon", "Langues", "Page 2/2"],
+    ]
+
+    text = normalize_cv_text(PAGE_BREAK.join("\n".join(page) for page in pages))
+
+    lines = text.split("\n")
+    assert lines.count(header) == 1
+    assert not any(line.startswith("Page") for line in lines)
+    assert "Acme 2020-2023" in lines and "Université de Lyon" in lines
+
+
+def test_normalize_keeps_content_lines_repeated_on_short_pages():
+    text = normalize_cv_text(PAGE_BREAK.join(["Python\nSQL", "Python\nDocker"]))
+
+    assert text.split("\n") == ["Python", "SQL", "Python", "Docker"]
+
+
+def test_normalize_cleans_lines():
+    text = normalize_cv_text(
+        "Curriculum Vitae\n"
+        "•   Java​   Spring\n"
+        "Java | Java | Kafka\n"
+        "Java | Java | Kafka\n"
+        "(cid:12)Docker\n"
+        "Références disponibles sur demande\n"
+    )
+
+    assert text.split("\n") == ["- Java Spring", "Java | Kafka", "Docker"]
+
+
+def test_fit_to_budget_keeps_text_under_budget():
+    text = "Jean Dupont\nCompétences\nJava"
+
+    assert fit_to_budget(text, 1000, MODEL) == (text, False)
+    assert fit_to_budget(text, 0, MODEL) == (text, False)
+
+
+def test_fit_to_budget_cuts_least_useful_sections_first():
+    experience = [f"Mission {i} chez Acme : développement Java et Spring" for i in range(5)]
+    interests = [f"Loisir numéro {i} : randonnée et photographie" for i in range(20)]
+    head = ["Jean Dupont", "jean@acme.fr", "Expérience"] + experience
+    text = "\n".join(head + ["Centres d'intérêt"] + interests)
+    # Coût compté ligne par ligne, +1 pour chaque saut de ligne
+    budget = sum(estimate_tokens(line, MODEL) + 1 for line in head) + 10
+
+    condensed, truncated = fit_to_budget(text, budget, MODEL)
+
+    assert truncated
+    lines = condensed.split("\n")
+    assert lines[:2] == ["Jean Dupont", "jean@acme.fr"]
+    assert all(line in lines for line in experience)
+    assert len([line for line in lines if line.startswith("Loisir")]) < len(interests)
+    assert estimate_tokens(condensed, MODEL) <= budget
@@ -0,0 +1,103 @@
+import json
+
+from app.models.candidate import Candidate
+from app.models.index_outbox import IndexOutbox
+from app.services.bulk_indexer import BulkIndexer
+from app.services.elasticsearch_service import ElasticsearchService
+from app.services.index_outbox import DELETED_DOCUMENT_VERSION
+
+
+class FakeCluster:
+    """`_bulk` endpoint keeping one document per id with OpenSearch's external_gte rule."""
+
+    class transport:
+        class serializer:
+            dumps = staticmethod(json.dumps)
+
+    def __init__(self):
+        self.documents = {}
+
+    def bulk(self, body, **params):
+        lines = [json.loads(line) for line in body.splitlines()]
+        items = []
+        while lines:
+            (op_type, meta), = lines.pop(0).items()
+            source = lines.pop(0) if op_type != "delete" else None
+            current = self.documents.get(meta["_id"])
+            if current is not None and meta["version"] < current[0]:
+                items.append({op_type: {"status": 409, "error": {"type": "version_conflict_engine_exception"}}})
+                continue
+            self.documents[meta["_id"]] = (meta["version"], source)
+            items.append({op_type: {"status": 201 if source is not None else 200}})
+        return {"items": items}
+
+
+def document_actions(session_factory, candidate_id):
+    """Actions of the committed state, as an outbox worker builds them."""
+    es_service = ElasticsearchService.__new__(ElasticsearchService)
+    es_service.uses_legacy_mapping = lambda index=None: False
+    db = session_factory()
+    try:
+        return list(es_service.candidate_actions([db.get(Candidate, candidate_id)]))
+    finally:
+        db.close()
+
+
+def create_candidate(session_factory):
+    db = session_factory()
+    candidate = Candidate(name="Jean Dupont", email="jean@acme.fr", job_title="Développeur")
+    db.add(candidate)
+    db.commit()
+    candidate_id = candidate.id
+    db.close()
+    return candidate_id
+
+
+def test_every_change_bumps_the_version_and_queues_the_candidate(session_factory):
+    candidate_id = create_candidate(session_factory)
+    db = session_factory()
+    first = db.get(Candidate, candidate_id).index_version
+
+    db.get(Candidate, candidate_id).job_title = "Architecte"
+    db.commit()
+
+    assert db.get(Candidate, candidate_id).index_version == first + 1
+    assert db.query(IndexOutbox).filter(IndexOutbox.candidate_id == candidate_id).count() == 2
+    db.close()
+
+
+def test_transaction_started_first_and_committed_last_wins(session_factory):
+    candidate_id = create_candidate(session_factory)
+
+    # T1 commence (lecture + modification en mémoire), T2 modifie et commit avant lui
+    first = session_factory()
+    first.get(Candidate, candidate_id).job_title = "Architecte"
+    second = session_factory()
+    second.get(Candidate, candidate_id).name = "Jean-Pierre Dupont"
+    second.commit()
+    stale = document_actions(session_factory, candidate_id)
+    first.commit()
+    latest = document_actions(session_factory, candidate_id)
+    first.close()
+    second.close()
+
+    assert latest[0]["_version"] > stale[0]["_version"]
+    for order in ([latest, stale], [stale, latest]):
+        cluster = FakeCluster()
+        indexer = BulkIndexer(cluster, "candidates", max_retries=0)
+        for actions in order:
+            assert indexer.index(actions)["failed"] == 0
+        source = cluster.documents[str(candidate_id)][1]
+        assert (source["name"], source["job_title"]) == ("Jean-Pierre Dupont", "Architecte")
+
+
+def test_delete_outranks_a_stale_document(session_factory):
+    candidate_id = create_candidate(session_factory)
+    stale = document_actions(session_factory, candidate_id)
+    cluster = FakeCluster()
+    indexer = BulkIndexer(cluster, "candidates", max_retries=0)
+
+    indexer.index([{"_op_type": "delete", "_id": candidate_id, "_version": DELETED_DOCUMENT_VERSION}])
+    indexer.index(stale)
+
+    assert cluster.documents[str(candidate_id)][1] is None
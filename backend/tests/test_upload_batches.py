@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.upload_batch import UploadBatch, UploadBatchFile
+from app.services import upload_batches
+from app.services.upload_batches import UploadBatchManager
+
+
+@pytest.fixture
+def manager(session_factory, monkeypatch):
+    monkeypatch.setattr(upload_batches, "SessionLocal", session_factory)
+    return UploadBatchManager()
+
+
+def add_batch(session_factory, batch_id, status, heartbeat_age):
+    db = session_factory()
+    try:
+        heartbeat = datetime.now(timezone.utc) - timedelta(seconds=heartbeat_age)
+        db.add(UploadBatch(id=batch_id, user_id=1, status=status, total_files=1, heartbeat_at=heartbeat,
+                           files=[UploadBatchFile(file_index=0, status="queued")]))
+        db.commit()
+    finally:
+        db.close()
+
+
+def stored_status(session_factory, batch_id):
+    db = session_factory()
+    try:
+        return db.get(UploadBatch, batch_id).status
+    finally:
+        db.close()
+
+
+def test_interrupt_stale_batches_only_touches_lost_batches(session_factory, manager):
+    stale_after = upload_batches.settings.CV_BATCH_STALE_AFTER
+    add_batch(session_factory, "lost", "processing", stale_after + 60)
+    add_batch(session_factory, "queued-lost", "queued", stale_after + 60)
+    add_batch(session_factory, "alive", "processing", 1)
+    add_batch(session_factory, "done", "completed", stale_after + 60)
+
+    assert manager.interrupt_stale_batches() == 2
+
+    assert stored_status(session_factory, "lost") == "interrupted"
+    assert stored_status(session_factory, "queued-lost") == "interrupted"
+    assert stored_status(session_factory, "alive") == "processing"
+    assert stored_status(session_factory, "done") == "completed"
+
+
+def test_events_end_a_batch_whose_worker_died(session_factory, manager):
+    add_batch(session_factory, "lost", "processing", upload_batches.settings.CV_BATCH_STALE_AFTER + 60)
+
+    async def collect():
+        return [event async for event in manager.events("lost")]
+
+    events = asyncio.run(asyncio.wait_for(collect(), timeout=10))
+
+    assert events[-1]["event"] == "batch"
+    assert events[-1]["status"] == "interrupted"
+    assert stored_status(session_factory, "lost") == "interrupted"